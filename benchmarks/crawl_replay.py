@@ -0,0 +1,326 @@
+"""
+실제 언론사 대신 로컬 replay 서버가 주는 feed 로 crawling 처리량을 잰다.
+feed 마다 jobs.crawling 을 그대로 실행하고, 단계별 시간과 feeds/s, items/s 를 출력한다.
+
+    fetch    crawl.fetcher.fetch (replay 서버의 지연 포함)
+    decode   crawl.response_to_text
+    fix      crawl.rss_fixer.fix_text 의 정규식 처리
+    parse    feedparser.parse
+    date     pub_date_to_dt.parse_date
+    db       item 중복 확인, 저장, 응답/yield/health 기록
+
+단계 시간은 각 thread 에서 걸린 시간의 합이고, 다른 단계 안에서 불린 시간은 빼고 센다.
+
+    # response_records 의 최근 응답을 corpus 로 내보내고
+    python benchmarks/crawl_replay.py --export-from mysql+pymysql://... --corpus ./corpus --export 200
+    # corpus 와 합성 feed 로 측정한다.
+    python benchmarks/crawl_replay.py --corpus ./corpus --synthetic 100 --entries 100 --rounds 3 \\
+        --latency 0.05 --error-rate 0.05 --encodings utf-8,euc-kr,utf-8-sig
+    # 회귀 확인: 기준을 저장해 두고 비교한다. 처리량이 --tolerance 이상 떨어지면 1 로 끝난다.
+    python benchmarks/crawl_replay.py --synthetic 100 --save-baseline crawl_baseline.json
+    python benchmarks/crawl_replay.py --synthetic 100 --baseline crawl_baseline.json --tolerance 0.2
+
+합성 feed 는 요청할 때마다 --new-entries 개의 새 item 이 앞에 붙는다. corpus feed 는 매번 같은 본문이다.
+DB_PATH 가 없으면 임시 SQLite 파일을 만들어 사용한다.
+"""
+import os
+import sys
+import json
+import glob
+import time
+import random
+import argparse
+import datetime
+import tempfile
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import format_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from xml.sax.saxutils import escape
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DB_PATH", f"sqlite:///{tempfile.mkdtemp()}/crawl_replay.db")
+# 같은 feed 를 라운드마다 다시 가져오도록 결과 공유를 끈다.
+os.environ.setdefault("CRAWL_RESULT_TTL", "0")
+os.environ.setdefault("NO_PROXY", "127.0.0.1,localhost")
+
+import feedparser
+from sqlalchemy import create_engine, func, insert, select, update
+
+from crawling_news_server import crawl, crud, jobs, models
+from crawling_news_server.crawl import pub_date_to_dt
+from crawling_news_server.database import Base, SessionLocal, engine
+from crawling_news_server.logics import health
+
+STAGES = ("fetch", "decode", "fix", "parse", "date", "db")
+
+
+class StageTimer:
+    """함수를 감싸 단계별 시간을 센다. 감싼 함수 안에서 다른 단계가 불리면 그 시간은 뺀다."""
+
+    def __init__(self):
+        self.seconds: dict[str, float] = defaultdict(float)
+        self.calls: dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def wrap(self, owner, name: str, stage: str) -> None:
+        func = getattr(owner, name)
+
+        def timed(*args, **kwargs):
+            stack = self._local.__dict__.setdefault("stack", [])
+            stack.append(0.0)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                nested = stack.pop()
+                if stack:
+                    stack[-1] += elapsed
+                with self._lock:
+                    self.seconds[stage] += elapsed - nested
+                    self.calls[stage] += 1
+
+        setattr(owner, name, timed)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.seconds.clear()
+            self.calls.clear()
+
+
+def instrument(timer: StageTimer) -> None:
+    timer.wrap(crawl.fetcher, "fetch", "fetch")
+    timer.wrap(crawl.response_to_text, "response_to_text", "decode")
+    timer.wrap(crawl.rss_fixer, "fix_text", "fix")
+    timer.wrap(feedparser, "parse", "parse")
+    timer.wrap(pub_date_to_dt, "parse_date", "date")
+    for name in ("get_rss_item_by_rss_id_and_link", "create_rss_item", "update_rss_from_rss_dict",
+                 "create_rss_response_record", "update_rss_yield"):
+        timer.wrap(crud, name, "db")
+    for name in ("record_success", "record_failure"):
+        timer.wrap(health, name, "db")
+
+
+class Feed:
+    def __init__(self, body: str | None = None, entries: int = 0, new_entries: int = 0, encoding: str = "utf-8"):
+        self.body = body
+        self.entries = entries
+        self.new_entries = new_entries
+        self.encoding = encoding
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def render(self, feed_id: int) -> str:
+        if self.body is not None:
+            return self.body
+        with self.lock:
+            self.requests += 1
+            offset = self.requests * self.new_entries
+        now = datetime.datetime.now(datetime.timezone(datetime.timedelta(hours=9)))
+        items = []
+        for n in range(offset + self.entries, offset, -1):
+            published = now - datetime.timedelta(minutes=(offset + self.entries - n) * 7)
+            items.append(
+                f"<item><title>{escape(f'[속보] {feed_id}번 언론사 {n}번째 기사, 정부 새 정책 발표')}</title>"
+                f"<link>https://replay.example.com/{feed_id}/articles/{n}?utm_source=rss</link>"
+                f"<description>{escape('<p>' + '기사 본문 요약입니다. 자세한 내용은 링크를 참고하세요. ' * 8 + '</p>')}"
+                f"</description><author>기자 {n % 13}</author><category>정치</category>"
+                f"<pubDate>{format_datetime(published)}</pubDate></item>")
+        return (f'<?xml version="1.0" encoding="{self.encoding.replace("-sig", "")}"?>'
+                f'<rss version="2.0"><channel><title>replay {feed_id}</title>'
+                f'<link>https://replay.example.com/{feed_id}</link><description>합성 feed {feed_id}</description>'
+                f'{"".join(items)}</channel></rss>')
+
+
+class ReplayServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, feeds: list[Feed], latency: float, error_rate: float):
+        super().__init__(("127.0.0.1", 0), ReplayHandler)
+        self.feeds = feeds
+        self.latency = latency
+        self.error_rate = error_rate
+        self.served = defaultdict(int)
+
+    def url(self, feed_id: int) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/feed/{feed_id}"
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server: ReplayServer = self.server
+        try:
+            feed_id = int(self.path.rsplit("/", 1)[-1])
+            feed = server.feeds[feed_id - 1]
+        except (ValueError, IndexError):
+            self.send_error(404)
+            return
+
+        if server.latency:
+            time.sleep(random.uniform(server.latency / 2, server.latency * 1.5))
+        if random.random() < server.error_rate:
+            if random.random() < 0.5:
+                server.served["503"] += 1
+                self.send_error(503)
+            else:
+                # 응답 없이 연결을 끊는다.
+                server.served["reset"] += 1
+                self.close_connection = True
+                self.connection.close()
+            return
+
+        body = feed.render(feed_id).encode(feed.encoding)
+        self.send_response(200)
+        if feed.encoding == "utf-8-sig":
+            # charset 없이 BOM 만 있는 경우
+            self.send_header("Content-Type", "application/rss+xml")
+        else:
+            self.send_header("Content-Type", f"application/rss+xml; charset={feed.encoding}")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        server.served["200"] += 1
+
+
+def export_corpus(source_url: str, corpus: str, limit: int) -> int:
+    """rss 별로 가장 최근의 정상 응답 하나씩"""
+    os.makedirs(corpus, exist_ok=True)
+    source = create_engine(source_url)
+    record = models.ResponseRecord
+    with source.connect() as conn:
+        ids = list(conn.scalars(
+            select(func.max(record.id)).where(record.status_code < 400, ~record.body.startswith("<!--"))
+            .group_by(record.rss_id).order_by(func.max(record.id).desc()).limit(limit)))
+        for row in conn.execute(select(record.id, record.rss_id, record.body).where(record.id.in_(ids))):
+            with open(os.path.join(corpus, f"{row.rss_id}-{row.id}.xml"), "w", encoding="utf-8") as f:
+                f.write(row.body)
+    return len(ids)
+
+
+def load_feeds(args) -> list[Feed]:
+    encodings = args.encodings.split(",")
+    feeds = []
+    if args.corpus:
+        for path in sorted(glob.glob(os.path.join(args.corpus, "*.xml"))):
+            with open(path, encoding="utf-8") as f:
+                feeds.append(Feed(body=f.read()))
+    for n in range(args.synthetic):
+        feeds.append(Feed(entries=args.entries, new_entries=args.new_entries, encoding=encodings[n % len(encodings)]))
+    return feeds
+
+
+def seed(server: ReplayServer, feed_count: int) -> list[int]:
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(models.RSS), [{
+            "name": f"replay {feed_id}", "url": server.url(feed_id), "title": f"replay {feed_id}",
+            "description": "", "link": server.url(feed_id), "delay": 600,
+        } for feed_id in range(1, feed_count + 1)])
+        rss_ids = list(conn.scalars(select(models.RSS.id).order_by(models.RSS.id)))
+    with SessionLocal() as db:
+        # crawling 이 reschedule/remove 하는 job 을 등록만 하고 scheduler 는 시작하지 않는다.
+        for db_rss in crud.get_rss_all(db):
+            jobs.add_job_rss_crawling(db_rss)
+    return rss_ids
+
+
+def run_round(rss_ids: list[int], server: ReplayServer, concurrency: int) -> tuple[float, int]:
+    with engine.begin() as conn:
+        # 오래된 feed, 연속 실패로 꺼진 rss 도 매 라운드 다시 가져온다.
+        conn.execute(update(models.RSS).values(is_active=True))
+        before = conn.scalar(select(func.count(models.RSSItem.id)))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        for feed_id, rss_id in enumerate(rss_ids, start=1):
+            pool.submit(jobs.crawling, rss_id, server.url(feed_id))
+    elapsed = time.perf_counter() - started
+
+    with engine.connect() as conn:
+        after = conn.scalar(select(func.count(models.RSSItem.id)))
+    return elapsed, after - before
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", help="directory of recorded feed bodies (*.xml)")
+    parser.add_argument("--export-from", help="DB url to export response_records into --corpus")
+    parser.add_argument("--export", type=int, default=200, help="number of feeds to export")
+    parser.add_argument("--synthetic", type=int, default=50)
+    parser.add_argument("--entries", type=int, default=50, help="entries per synthetic feed")
+    parser.add_argument("--new-entries", type=int, default=10, help="new entries per request of a synthetic feed")
+    parser.add_argument("--encodings", default="utf-8,euc-kr,utf-8-sig")
+    parser.add_argument("--latency", type=float, default=0.05, help="mean response latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.02)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--save-baseline")
+    parser.add_argument("--baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    if args.export_from:
+        if not args.corpus:
+            parser.error("--export-from requires --corpus")
+        print(f"exported {export_corpus(args.export_from, args.corpus, args.export)} feeds to {args.corpus}")
+
+    feeds = load_feeds(args)
+    if not feeds:
+        parser.error("no feeds, use --corpus or --synthetic")
+    server = ReplayServer(feeds, args.latency, args.error_rate)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    rss_ids = seed(server, len(feeds))
+
+    timer = StageTimer()
+    instrument(timer)
+    wall = 0.0
+    polls = 0
+    items = 0
+    for n in range(1, args.rounds + 1):
+        elapsed, added = run_round(rss_ids, server, args.concurrency)
+        wall += elapsed
+        polls += len(rss_ids)
+        items += added
+        print(f"round {n}: {len(rss_ids)} feeds, +{added} items, {elapsed:.2f}s")
+    server.shutdown()
+
+    total = sum(timer.seconds.values()) or 1
+    print(f"\n{'stage':<8}{'calls':>8}{'total(s)':>10}{'per call(ms)':>14}{'share':>8}")
+    for stage in STAGES:
+        seconds, calls = timer.seconds.get(stage, 0.0), timer.calls.get(stage, 0)
+        print(f"{stage:<8}{calls:>8}{seconds:>10.2f}{seconds / max(calls, 1) * 1000:>14.2f}{seconds / total:>8.1%}")
+    print(f"\nresponses: {dict(server.served)}")
+    result = {"feeds_per_sec": polls / wall, "items_per_sec": items / wall, "feeds": len(rss_ids),
+              "rounds": args.rounds, "items": items, "seconds": wall,
+              "stages": {stage: timer.seconds.get(stage, 0.0) for stage in STAGES}}
+    print(f"{result['feeds_per_sec']:.1f} feeds/s, {result['items_per_sec']:.1f} items/s ({wall:.2f}s)")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        failed = False
+        for key in ("feeds_per_sec", "items_per_sec"):
+            ratio = result[key] / baseline[key] if baseline[key] else 1.0
+            status = "ok"
+            if ratio < 1 - args.tolerance:
+                status = "REGRESSION"
+                failed = True
+            print(f"{key}: {result[key]:.1f} vs baseline {baseline[key]:.1f} ({ratio:.0%}) {status}")
+        return 1 if failed else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,213 @@
+"""
+부하 테스트용 rss, rss_items, response_records 를 만든다.
+
+    python benchmarks/generate_dataset.py --rss 500 --items 3000000 --responses 100000 --years 3
+
+* title 은 한국어 단어 조합이고, 같은 기사를 여러 rss 가 싣는 경우(--syndication)도 만든다.
+* rss 별 item 수는 Zipf 분포(--skew)로 몇몇 rss 에 몰린다.
+* publish_datetime 은 최근 --years 년에 걸쳐 id 순서로 늘어나며, 일부(--late)는 수집보다 한참 이른 날짜를 갖는다.
+* 다 넣은 뒤 rss_item_rollups, rss_item_id_ranges 를 다시 만든다.
+
+DB_PATH 가 없으면 임시 SQLite 파일을 만들어 사용한다. 이미 item 이 있으면 멈춘다.
+"""
+import os
+import sys
+import time
+import random
+import bisect
+import argparse
+import datetime
+import tempfile
+from email.utils import format_datetime
+from xml.sax.saxutils import escape
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DB_PATH", f"sqlite:///{tempfile.mkdtemp()}/dataset.db")
+
+from sqlalchemy import func, insert, select
+
+from crawling_news_server import models
+from crawling_news_server.commands import rebuild_rollups
+from crawling_news_server.crawl.canonical_link import link_hash
+from crawling_news_server.crawl.html_text import html_to_text, make_snippet
+from crawling_news_server.database import Base, engine
+
+KST = datetime.timezone(datetime.timedelta(hours=9))
+
+# load 의 검색어도 여기서 고른다.
+SUBJECTS = ["정부", "대통령", "국회", "서울시", "한국은행", "삼성전자", "현대차", "검찰", "법원", "교육부",
+            "기상청", "경찰", "여당", "야당", "국방부", "보건당국", "금융위", "카카오", "네이버", "LG"]
+TOPICS = ["부동산", "금리", "반도체", "수출", "물가", "선거", "의료", "저출생", "인공지능", "전기차",
+          "태풍", "미세먼지", "환율", "주가", "일자리", "관광", "축구", "야구", "배터리", "원전"]
+ACTIONS = ["대책 발표", "전망 내놔", "논란 확산", "협상 타결", "규제 강화", "지원 확대", "조사 착수",
+           "역대 최대", "하락세 지속", "반등 기대", "합의 불발", "긴급 점검", "개편 추진", "첫 공개"]
+PREFIXES = ["", "", "", "[속보] ", "[단독] ", "[종합] ", "[포토] "]
+CATEGORIES = ["정치", "경제", "사회", "국제", "IT", "문화", "스포츠", "오피니언"]
+SEARCH_WORDS = SUBJECTS + TOPICS
+
+
+def make_title(rnd: random.Random) -> str:
+    return (f"{rnd.choice(PREFIXES)}{rnd.choice(SUBJECTS)}, {rnd.choice(TOPICS)} "
+            f"{rnd.choice(ACTIONS)}…{rnd.choice(TOPICS)} {rnd.choice(ACTIONS)}")
+
+
+def make_description(rnd: random.Random, title: str) -> str:
+    sentences = "".join(f"<p>{rnd.choice(SUBJECTS)}은 {rnd.choice(TOPICS)} 관련 {rnd.choice(ACTIONS)} 방침을 밝혔다.</p>"
+                        for _ in range(rnd.randint(2, 8)))
+    return f'<div><img src="https://img.example.com/{rnd.randint(1, 10 ** 6)}.jpg"/><h3>{title}</h3>{sentences}</div>'
+
+
+def zipf_weights(count: int, skew: float) -> list[float]:
+    """누적 가중치. rss 순서는 섞어서 id 와 item 수가 상관없게 한다."""
+    weights = [1 / (rank ** skew) for rank in range(1, count + 1)]
+    random.shuffle(weights)
+    cumulative, total = [], 0.0
+    for weight in weights:
+        total += weight
+        cumulative.append(total)
+    return cumulative
+
+
+def pick(rnd: random.Random, cumulative: list[float]) -> int:
+    """0 부터 시작하는 index"""
+    return bisect.bisect_left(cumulative, rnd.random() * cumulative[-1])
+
+
+def seed_rss(rss_count: int) -> list[int]:
+    with engine.begin() as conn:
+        rows = []
+        for n in range(1, rss_count + 1):
+            category = CATEGORIES[n % len(CATEGORIES)]
+            rows.append({
+                "name": f"뉴스{n} {category}", "url": f"https://news{n}.example.com/rss/{n}.xml",
+                "title": f"뉴스{n} - {category}", "description": f"뉴스{n} {category} 최신 기사",
+                "link": f"https://news{n}.example.com", "delay": 600, "language": "ko",
+            })
+        conn.execute(insert(models.RSS), rows)
+        return list(conn.scalars(select(models.RSS.id).order_by(models.RSS.id)))
+
+
+def seed_items(rss_ids: list[int], item_count: int, years: float, skew: float, syndication: float,
+               late: float, batch_size: int, rnd: random.Random) -> None:
+    cumulative = zipf_weights(len(rss_ids), skew)
+    end = datetime.datetime.now().replace(microsecond=0)
+    start = end - datetime.timedelta(days=365 * years)
+    step = (end - start) / max(item_count, 1)
+    recent_links: list[tuple[str, str, str]] = []
+
+    batch = []
+    started = time.perf_counter()
+    for n in range(item_count):
+        created_at = start + step * n
+        rss_id = rss_ids[pick(rnd, cumulative)]
+        if recent_links and rnd.random() < syndication:
+            # 다른 rss 가 먼저 실은 기사 (distinct 로 묶인다)
+            link, title, description = rnd.choice(recent_links)
+        else:
+            link = f"https://news{rss_id}.example.com/article/{n}"
+            title = make_title(rnd)
+            description = make_description(rnd, title)
+            recent_links.append((link, title, description))
+            if len(recent_links) > 1000:
+                recent_links = recent_links[-500:]
+
+        publish_datetime = created_at - datetime.timedelta(minutes=rnd.randint(0, 30))
+        if rnd.random() < late:
+            publish_datetime -= datetime.timedelta(days=rnd.randint(3, 60))
+        body_text = html_to_text(description)
+        batch.append({
+            "rss_id": rss_id, "title": title, "description": description, "body_text": body_text,
+            "snippet": make_snippet(body_text), "link": link, "link_hash": link_hash(link), "guid": link,
+            "author": f"{rnd.choice('김이박최정강조윤장임')}기자", "category": rnd.choice(CATEGORIES),
+            "pub_date": format_datetime(publish_datetime.replace(tzinfo=KST)),
+            "publish_date": publish_datetime.date().isoformat(),
+            "publish_time": publish_datetime.time().isoformat(),
+            "publish_datetime": publish_datetime, "created_at": created_at,
+        })
+        if len(batch) == batch_size:
+            insert_items(batch)
+            batch = []
+            elapsed = time.perf_counter() - started
+            print(f"items {n + 1:,}/{item_count:,} ({(n + 1) / elapsed:,.0f}/s)", file=sys.stderr)
+    if batch:
+        insert_items(batch)
+
+
+def insert_items(batch: list[dict]) -> None:
+    with engine.begin() as conn:
+        # 같은 rss 에 같은 link 가 두 번 들어가지 않게 한다.
+        conn.execute(insert(models.RSSItem).prefix_with(
+            "OR IGNORE" if engine.dialect.name == "sqlite" else "IGNORE"), batch)
+
+
+def seed_responses(rss_ids: list[int], response_count: int, years: float, batch_size: int,
+                   rnd: random.Random) -> None:
+    end = datetime.datetime.now()
+    start = end - datetime.timedelta(days=365 * years)
+    batch = []
+    for n in range(response_count):
+        rss_id = rnd.choice(rss_ids)
+        created_at = start + (end - start) * (n / max(response_count, 1))
+        status_code = rnd.choices([200, 404, 500, 503], weights=[94, 2, 2, 2])[0]
+        if status_code == 200:
+            items = "".join(
+                f"<item><title>{escape(make_title(rnd))}</title>"
+                f"<link>https://news{rss_id}.example.com/article/r{n}-{i}</link>"
+                f"<description>{escape(make_description(rnd, ''))}</description>"
+                f"<pubDate>{format_datetime((created_at - datetime.timedelta(minutes=i * 5)).replace(tzinfo=KST))}"
+                f"</pubDate></item>" for i in range(rnd.randint(5, 30)))
+            body = (f'<?xml version="1.0" encoding="utf-8"?><rss version="2.0"><channel>'
+                    f'<title>뉴스{rss_id}</title><link>https://news{rss_id}.example.com</link>'
+                    f'<description>뉴스{rss_id}</description>{items}</channel></rss>')
+        else:
+            body = f"<html><body>{status_code}</body></html>"
+        batch.append({"rss_id": rss_id, "link": f"https://news{rss_id}.example.com/rss",
+                      "status_code": status_code, "body": body, "created_at": created_at})
+        if len(batch) == batch_size:
+            with engine.begin() as conn:
+                conn.execute(insert(models.ResponseRecord), batch)
+            batch = []
+    if batch:
+        with engine.begin() as conn:
+            conn.execute(insert(models.ResponseRecord), batch)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rss", type=int, default=500)
+    parser.add_argument("--items", type=int, default=1000000)
+    parser.add_argument("--responses", type=int, default=50000)
+    parser.add_argument("--years", type=float, default=3)
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent of items per rss")
+    parser.add_argument("--syndication", type=float, default=0.08, help="ratio of items sharing a link")
+    parser.add_argument("--late", type=float, default=0.01, help="ratio of items published long before crawl")
+    parser.add_argument("--batch-size", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    random.seed(args.seed)
+    Base.metadata.create_all(engine)
+    models.create_missing_indexes(engine)
+    with engine.connect() as conn:
+        if conn.scalar(select(func.count()).select_from(select(models.RSSItem.id).limit(1).subquery())):
+            print(f"{engine.url} already has rss_items", file=sys.stderr)
+            return 1
+
+    started = time.perf_counter()
+    rss_ids = seed_rss(args.rss)
+    seed_items(rss_ids, args.items, args.years, args.skew, args.syndication, args.late, args.batch_size, rnd)
+    seed_responses(rss_ids, args.responses, args.years, args.batch_size, rnd)
+    rollup_count = rebuild_rollups.rebuild(engine, None, None)
+    range_count, late_count = rebuild_rollups.rebuild_id_ranges(engine)
+
+    with engine.connect() as conn:
+        item_count = conn.scalar(select(func.count(models.RSSItem.id)))
+    print(f"{engine.url}: rss {len(rss_ids):,}, items {item_count:,}, responses {args.responses:,}, "
+          f"rollups {rollup_count:,}, id ranges {range_count:,}, late {late_count:,}, "
+          f"{time.perf_counter() - started:.1f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
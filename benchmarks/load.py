@@ -0,0 +1,203 @@
+"""
+검색/목록 API 부하 테스트. 시나리오별 처리량과 p50/p95/p99 지연시간을 출력한다.
+
+    # generate_dataset.py 로 만든 DB 로 서버를 띄운 뒤
+    python benchmarks/load.py --base-url http://127.0.0.1:8000 --concurrency 32 --duration 60
+    # --base-url 이 없으면 같은 프로세스의 main.app 을 직접 호출한다(DB_PATH 필요).
+    python benchmarks/load.py --duration 30 --scenarios latest,date,white,deep
+
+시나리오:
+    latest      /api/v2/items 앞쪽 page
+    q           /api/v2/items?q= (MySQL FULLTEXT, SQLite 에서는 실패한다)
+    q_date      q + start_dt/end_dt
+    date        start_dt/end_dt (1~7일)
+    white       white_rss_id (rss 3개)
+    black       black_rss_id (rss 3개)
+    deep        offset 200~2000 page
+    no_distinct distinct=false
+    facets      facets=rss_id,publish_date + 날짜 조건
+    rss_search  /api/v2/rss?q=
+
+--json 으로 결과를 파일에 남겨 이전 결과와 비교할 수 있다.
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+import datetime
+import statistics
+from collections import defaultdict
+from typing import Callable
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# generate_dataset 이 DB_PATH 기본값을 임시 파일로 채우기 전에 확인한다.
+HAS_DB_PATH = bool(os.environ.get("DB_PATH"))
+
+import httpx
+
+from generate_dataset import SEARCH_WORDS
+
+
+class Dataset:
+    """요청 parameter 를 고르는 데 필요한 rss id 와 날짜 범위"""
+
+    def __init__(self, rss_ids: list[int], newest: datetime.datetime, years: float):
+        self.rss_ids = rss_ids
+        self.newest = newest
+        self.oldest = newest - datetime.timedelta(days=365 * years)
+
+    @classmethod
+    async def load(cls, client: httpx.AsyncClient, years: float) -> "Dataset":
+        rss_ids = []
+        offset = 1
+        while True:
+            response = await client.get("/api/v2/rss/", params={"offset": offset, "limit": 500})
+            response.raise_for_status()
+            data = response.json()["data"]
+            rss_ids += [rss["id"] for rss in data]
+            if len(data) < 500:
+                break
+            offset += 1
+        response = await client.get("/api/v2/items/", params={"limit": 1})
+        response.raise_for_status()
+        items = response.json()["data"]
+        newest = datetime.datetime.fromisoformat(items[0]["publish_datetime"]).replace(tzinfo=None) \
+            if items else datetime.datetime.now()
+        return cls(rss_ids, newest, years)
+
+    def date_range(self) -> dict[str, str]:
+        span = (self.newest - self.oldest).total_seconds()
+        start = self.oldest + datetime.timedelta(seconds=random.uniform(0, span))
+        end = start + datetime.timedelta(days=random.randint(1, 7))
+        return {"start_dt": start.isoformat(timespec="seconds"), "end_dt": end.isoformat(timespec="seconds")}
+
+    def rss_id_list(self, count: int = 3) -> str:
+        return ",".join(map(str, random.sample(self.rss_ids, min(count, len(self.rss_ids)))))
+
+
+def scenarios(dataset: Dataset) -> dict[str, Callable[[], tuple[str, dict]]]:
+    items = "/api/v2/items/"
+    return {
+        "latest": lambda: (items, {"offset": random.randint(1, 5)}),
+        "q": lambda: (items, {"q": random.choice(SEARCH_WORDS), "offset": random.randint(1, 3)}),
+        "q_date": lambda: (items, {"q": random.choice(SEARCH_WORDS), **dataset.date_range()}),
+        "date": lambda: (items, {**dataset.date_range(), "offset": random.randint(1, 3)}),
+        "white": lambda: (items, {"white_rss_id": dataset.rss_id_list(), "offset": random.randint(1, 5)}),
+        "black": lambda: (items, {"black_rss_id": dataset.rss_id_list(), "offset": random.randint(1, 5)}),
+        "deep": lambda: (items, {"offset": random.randint(200, 2000)}),
+        "no_distinct": lambda: (items, {"distinct": "false", "offset": random.randint(1, 20)}),
+        "facets": lambda: (items, {"facets": "rss_id,publish_date", **dataset.date_range()}),
+        "rss_search": lambda: ("/api/v2/rss/", {"q": random.choice(SEARCH_WORDS + ["뉴스", "경제", "IT"])}),
+    }
+
+
+def percentile(values: list[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+async def run(client: httpx.AsyncClient, requests: dict[str, Callable[[], tuple[str, dict]]],
+              concurrency: int, duration: float, warmup: float) -> tuple[dict, dict, float]:
+    latencies: dict[str, list[float]] = defaultdict(list)
+    errors: dict[str, dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    names = list(requests)
+    loop = asyncio.get_running_loop()
+    measure_from = loop.time() + warmup
+    stop_at = measure_from + duration
+
+    async def worker():
+        while (now := loop.time()) < stop_at:
+            name = random.choice(names)
+            path, params = requests[name]()
+            started = time.perf_counter()
+            try:
+                response = await client.get(path, params=params)
+                error = None if response.status_code < 400 else str(response.status_code)
+            except httpx.HTTPError as e:
+                error = type(e).__name__
+            elapsed = time.perf_counter() - started
+            if now < measure_from:
+                continue
+            if error:
+                errors[name][error] += 1
+            else:
+                latencies[name].append(elapsed)
+
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    # 마지막 요청들이 끝날 때까지 기다린 시간도 포함한다.
+    return latencies, errors, loop.time() - measure_from
+
+
+def report(latencies: dict, errors: dict, duration: float) -> dict:
+    result = {}
+    print(f"{'scenario':<12}{'count':>8}{'errors':>8}{'req/s':>9}"
+          f"{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'max(ms)':>10}")
+    for name in sorted(set(latencies) | set(errors)):
+        values = latencies.get(name, [])
+        error_count = sum(errors.get(name, {}).values())
+        row = {"count": len(values), "errors": dict(errors.get(name, {})), "rps": len(values) / duration}
+        if values:
+            row.update({f"p{p}": percentile(values, p) * 1000 for p in (50, 95, 99)})
+            row["max"] = max(values) * 1000
+            row["mean"] = statistics.mean(values) * 1000
+        result[name] = row
+        print(f"{name:<12}{len(values):>8}{error_count:>8}{row['rps']:>9.1f}"
+              f"{row.get('p50', 0):>10.1f}{row.get('p95', 0):>10.1f}{row.get('p99', 0):>10.1f}{row.get('max', 0):>10.1f}")
+    total = sum(len(values) for values in latencies.values())
+    print(f"total {total} requests, {total / duration:.1f} req/s")
+    for name, by_error in sorted(errors.items()):
+        print(f"errors {name}: {dict(by_error)}")
+    return result
+
+
+async def main_async(args) -> dict:
+    if args.base_url:
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout,
+                                   limits=httpx.Limits(max_connections=args.concurrency))
+    else:
+        from main import app
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app, raise_app_exceptions=False), base_url="http://load-test",
+                                   timeout=args.timeout)
+    async with client:
+        dataset = await Dataset.load(client, args.years)
+        all_requests = scenarios(dataset)
+        names = args.scenarios.split(",") if args.scenarios else list(all_requests)
+        if unknown := set(names) - set(all_requests):
+            raise SystemExit(f"unknown scenarios: {','.join(sorted(unknown))}")
+        print(f"{len(dataset.rss_ids)} rss, {dataset.oldest:%Y-%m-%d} ~ {dataset.newest:%Y-%m-%d}, "
+              f"concurrency {args.concurrency}, {args.duration}s")
+        latencies, errors, duration = await run(
+            client, {name: all_requests[name] for name in names}, args.concurrency, args.duration, args.warmup)
+    return report(latencies, errors, duration)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base-url", help="running server, e.g. http://127.0.0.1:8000")
+    parser.add_argument("--scenarios", help="comma separated, default all")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--warmup", type=float, default=3)
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--years", type=float, default=3, help="date range of the dataset")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--json", help="write the result to this file")
+    args = parser.parse_args()
+    if not args.base_url and not HAS_DB_PATH:
+        parser.error("--base-url or DB_PATH is required")
+
+    random.seed(args.seed)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    result = asyncio.run(main_async(args))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "scenarios": result}, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
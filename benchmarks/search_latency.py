@@ -0,0 +1,125 @@
+"""
+async 핸들러 안에서 동기 세션을 쓰던 방식(before)과 AsyncSession(after)의
+병렬 검색 부하 시 지연시간(p50/p95/p99)을 비교한다.
+
+    python benchmarks/search_latency.py --items 200000 --concurrency 32 --requests 400
+
+DB_PATH 가 없으면 임시 SQLite 파일을 만들어 사용한다.
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import datetime
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DB_PATH", f"sqlite:///{tempfile.mkdtemp()}/search_latency.db")
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from crawling_news_server import crud, crud_async, models, schemas
+from crawling_news_server.database import Base, engine, get_async_db, get_db
+
+
+def seed(rss_count: int, item_count: int) -> None:
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        if conn.execute(models.RSSItem.__table__.select().limit(1)).first():
+            return
+        conn.execute(insert(models.RSS), [{
+            "id": rss_id, "name": f"rss {rss_id}", "url": f"https://example.com/{rss_id}/rss",
+            "title": f"rss {rss_id}", "description": "", "link": f"https://example.com/{rss_id}",
+        } for rss_id in range(1, rss_count + 1)])
+
+        start = datetime.datetime(2020, 1, 1)
+        batch = []
+        for item_id in range(1, item_count + 1):
+            batch.append({
+                "rss_id": random.randint(1, rss_count), "title": f"title {item_id}", "description": "",
+                "link": f"https://example.com/item/{item_id % (item_count // 2 or 1)}",
+                "publish_datetime": start + datetime.timedelta(minutes=item_id),
+            })
+            if len(batch) == 10000:
+                conn.execute(insert(models.RSSItem), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(models.RSSItem), batch)
+
+
+def create_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/before/items", response_model=schemas.RssItemListResponse)
+    async def before_items(offset: int = 1, db: Session = Depends(get_db)):
+        return crud.find_rss_item_by_title(db, "", offset, 50, True)
+
+    @app.get("/after/items", response_model=schemas.RssItemListResponse)
+    async def after_items(offset: int = 1, db: AsyncSession = Depends(get_async_db)):
+        return await crud_async.find_rss_item_by_title(db, "", offset, 50, True)
+
+    @app.get("/before/rss/{rss_id}")
+    async def before_rss(rss_id: int, db: Session = Depends(get_db)):
+        return {"id": crud.get_rss(db, rss_id).id}
+
+    @app.get("/after/rss/{rss_id}")
+    async def after_rss(rss_id: int, db: AsyncSession = Depends(get_async_db)):
+        return {"id": (await crud_async.get_rss(db, rss_id)).id}
+
+    return app
+
+
+def percentile(values: list[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+async def run(app: FastAPI, mode: str, concurrency: int, requests: int, rss_count: int) -> dict[str, list[float]]:
+    latencies: dict[str, list[float]] = {"search": [], "lookup": []}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(client: httpx.AsyncClient, i: int):
+        kind = "search" if i % 2 == 0 else "lookup"
+        path = f"/{mode}/items?offset={random.randint(1, 20)}" if kind == "search" \
+            else f"/{mode}/rss/{random.randint(1, rss_count)}"
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.get(path)
+            response.raise_for_status()
+            latencies[kind].append(time.perf_counter() - started)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await asyncio.gather(*[one(client, i) for i in range(requests)])
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rss", type=int, default=200)
+    parser.add_argument("--items", type=int, default=100000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    seed(args.rss, args.items)
+    app = create_app()
+
+    print(f"{'mode':<8}{'kind':<8}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'mean(ms)':>10}")
+    for mode in ("before", "after"):
+        latencies = asyncio.run(run(app, mode, args.concurrency, args.requests, args.rss))
+        for kind, values in latencies.items():
+            print(f"{mode:<8}{kind:<8}"
+                  f"{percentile(values, 50) * 1000:>10.1f}{percentile(values, 95) * 1000:>10.1f}"
+                  f"{percentile(values, 99) * 1000:>10.1f}{statistics.mean(values) * 1000:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
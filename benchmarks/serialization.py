@@ -0,0 +1,153 @@
+"""
+목록 page(item 50개) 하나를 응답 body 로 만드는 시간을 비교한다.
+DB 조회 시간은 빼고 직렬화만 잰다.
+
+    fastapi   response_model 검증 + jsonable 변환 + json.dumps (기존 방식)
+    orjson    response_model 검증 + orjson.dumps
+    cold      item JSON cache 가 비어 있을 때 item_json.items_json (목록 기본, snippet 만)
+    warm      item JSON cache 에 모두 있을 때 item_json.items_json (목록 기본, snippet 만)
+    warm-full warm 과 같지만 description 포함(description=true)
+
+bytes 는 page 하나의 응답 크기다.
+
+    python benchmarks/serialization.py --items 20000 --pages 200
+
+DB_PATH 가 없으면 임시 SQLite 파일을 만들어 사용한다.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import datetime
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DB_PATH", f"sqlite:///{tempfile.mkdtemp()}/serialization.db")
+
+from sqlalchemy import insert, select
+from sqlalchemy.orm import selectinload
+
+from crawling_news_server import models, schemas
+from crawling_news_server.crawl.html_text import html_to_text, make_snippet
+from crawling_news_server.database import Base, SessionLocal, engine
+from crawling_news_server.logics import item_json
+
+
+def seed(rss_count: int, item_count: int) -> None:
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        if conn.execute(models.RSSItem.__table__.select().limit(1)).first():
+            return
+        conn.execute(insert(models.RSS), [{
+            "id": rss_id, "name": f"rss {rss_id}", "url": f"https://example.com/{rss_id}/rss",
+            "title": f"언론사 {rss_id}", "description": "최신 뉴스 " * 10, "link": f"https://example.com/{rss_id}",
+        } for rss_id in range(1, rss_count + 1)])
+
+        start = datetime.datetime(2020, 1, 1)
+        description = ('<div><img src="https://example.com/image.jpg" alt="사진"/>'
+                       + "<p>기사 본문 요약입니다. 자세한 내용은 링크를 참고하세요.</p>" * 20
+                       + "<table><tr><td>항목</td><td>값</td></tr></table></div>")
+        body_text = html_to_text(description)
+        batch = []
+        for item_id in range(1, item_count + 1):
+            publish_datetime = start + datetime.timedelta(minutes=item_id)
+            batch.append({
+                "rss_id": random.randint(1, rss_count), "title": f"속보 {item_id} 정부, 새 정책 발표",
+                "description": description, "body_text": body_text, "snippet": make_snippet(body_text),
+                "link": f"https://example.com/item/{item_id}", "author": "기자",
+                "pub_date": publish_datetime.strftime("%a, %d %b %Y %H:%M:%S +0900"),
+                "publish_date": publish_datetime.date().isoformat(),
+                "publish_time": publish_datetime.time().isoformat(),
+                "publish_datetime": publish_datetime,
+            })
+            if len(batch) == 10000:
+                conn.execute(insert(models.RSSItem), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(models.RSSItem), batch)
+
+
+def load_pages(page_count: int, page_limit: int) -> list[list[models.RSSItem]]:
+    with SessionLocal() as db:
+        db_rss_items = db.scalars(
+            select(models.RSSItem).options(selectinload(models.RSSItem.rss))
+            .order_by(models.RSSItem.id.desc()).limit(page_count * page_limit)).all()
+        db.expunge_all()
+    return [db_rss_items[i:i + page_limit] for i in range(0, len(db_rss_items), page_limit)]
+
+
+def by_fastapi(page: list[models.RSSItem]) -> bytes:
+    found = schemas.RssItemListResponse.model_validate({"total_count": 1000, "data": page}, from_attributes=True)
+    return json.dumps(found.model_dump(mode="json"), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def by_orjson(page: list[models.RSSItem]) -> bytes:
+    found = schemas.RssItemListResponse.model_validate({"total_count": 1000, "data": page}, from_attributes=True)
+    return item_json.dumps(found.model_dump(mode="json"))
+
+
+def by_cache(page: list[models.RSSItem], full: bool = False) -> bytes:
+    return b'{"total_count":1000,"data":[' + b",".join(item_json.items_json(page, full=full)) + b"]}"
+
+
+def by_cache_full(page: list[models.RSSItem]) -> bytes:
+    return by_cache(page, full=True)
+
+
+def measure(pages: list[list[models.RSSItem]], serialize, before=None) -> tuple[list[float], int]:
+    timings = []
+    size = 0
+    for page in pages:
+        if before:
+            before()
+        started = time.perf_counter()
+        body = serialize(page)
+        timings.append(time.perf_counter() - started)
+        size += len(body)
+    return timings, size // len(pages)
+
+
+def percentile(values: list[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rss", type=int, default=100)
+    parser.add_argument("--items", type=int, default=20000)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=50)
+    args = parser.parse_args()
+
+    seed(args.rss, args.items)
+    pages = load_pages(args.pages, args.limit)
+    if item_json.orjson is None:
+        print("orjson is not installed, json is used instead")
+
+    # 결과가 같은지 먼저 확인한다.
+    assert json.loads(by_fastapi(pages[0])) == json.loads(by_cache_full(pages[0]))
+    item_json.cache.clear()
+
+    results = {
+        "fastapi": measure(pages, by_fastapi),
+        "orjson": measure(pages, by_orjson),
+        "cold": measure(pages, by_cache, item_json.cache.clear),
+    }
+    item_json.cache.clear()
+    measure(pages, by_cache)
+    results["warm"] = measure(pages, by_cache)
+    measure(pages, by_cache_full)
+    results["warm-full"] = measure(pages, by_cache_full)
+
+    print(f"{'mode':<10}{'p50(ms)':>10}{'p95(ms)':>10}{'mean(ms)':>10}{'bytes':>10}")
+    for mode, (timings, size) in results.items():
+        print(f"{mode:<10}{percentile(timings, 50) * 1000:>10.2f}{percentile(timings, 95) * 1000:>10.2f}"
+              f"{statistics.mean(timings) * 1000:>10.2f}{size:>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+"""
+수집한 지 ARCHIVE_AFTER_DAYS 일이 지난 rss_items 를 월별 segment 파일(ARCHIVE_DIR)로 옮긴다.
+
+    python -m crawling_news_server.commands.archive_items --older-than-days 365
+
+이전 archive 이후, 기준 시각 전에 수집된 마지막 item 까지를 publish_datetime 의 월별로 나눠
+segment 를 쓰고 archive_segments 에 등록한 뒤 rss_items 에서 지운다.
+item 에 딸린 saved_search_matches, late_rss_items, rss_item_json 도 함께 지운다.
+등록할 때 모든 segment 의 rss 별 item 수와 distinct 수(archive.segment_counts)를 다시 센다.
+rss_item_rollups, rss_item_id_ranges 는 그대로 둔다.
+"""
+import sys
+import time
+import json
+import argparse
+import datetime
+
+from sqlalchemy import bindparam, delete, func, select, update
+
+from crawling_news_server import models
+from crawling_news_server.database import Base, engine
+from crawling_news_server.logics import archive
+
+RSSItem = models.RSSItem
+
+# item 과 함께 지우는 테이블
+DEPENDENT_TABLES = (models.SavedSearchMatch, models.LateRSSItem, models.RSSItemJson)
+
+
+def month_of(row) -> str:
+    return (row.publish_datetime or row.created_at).strftime("%Y-%m")
+
+
+def purge(floor_id: int, batch_size: int) -> int:
+    """archive 에 등록된 id(floor_id 이하)를 rss_items 에서 지운다. 중간에 멈춘 이전 실행도 마무리한다."""
+    deleted = 0
+    while True:
+        with engine.begin() as conn:
+            ids = list(conn.scalars(
+                select(RSSItem.id).where(RSSItem.id <= floor_id).order_by(RSSItem.id).limit(batch_size)))
+            if not ids:
+                return deleted
+            for model in DEPENDENT_TABLES:
+                conn.execute(delete(model).where(model.rss_item_id.in_(ids)))
+            conn.execute(delete(RSSItem).where(RSSItem.id.in_(ids)))
+            deleted += len(ids)
+
+
+def register(segments: list[models.ArchiveSegment]) -> None:
+    """새 segment 를 등록하고 이미 있는 segment 의 수도 같은 transaction 에서 고친다."""
+    table = models.ArchiveSegment.__table__
+    with engine.begin() as conn:
+        existing = conn.execute(select(table.c.id, table.c.path)).all()
+        counts = archive.segment_counts([row.path for row in existing] + [segment.path for segment in segments])
+        if existing:
+            conn.execute(
+                update(table).where(table.c.id == bindparam("segment_id"))
+                .values(rss_counts=bindparam("rss_counts"), distinct_count=bindparam("distinct_count")),
+                [{"segment_id": row.id, "rss_counts": json.dumps(counts[row.path][0]),
+                  "distinct_count": counts[row.path][1]} for row in existing])
+        if segments:
+            conn.execute(table.insert(), [{
+                "month": segment.month, "path": segment.path, "item_count": segment.item_count,
+                "min_id": segment.min_id, "max_id": segment.max_id,
+                "min_publish_datetime": segment.min_publish_datetime,
+                "max_publish_datetime": segment.max_publish_datetime,
+                "rss_counts": json.dumps(counts[segment.path][0]),
+                "distinct_count": counts[segment.path][1],
+            } for segment in segments])
+
+
+def archive_items(older_than_days: int, batch_size: int, dry_run: bool = False) -> dict:
+    stat = {"archived": 0, "segments": 0, "raw_bytes": 0, "compressed_bytes": 0, "deleted": 0, "months": {}}
+    cutoff = datetime.datetime.now() - datetime.timedelta(days=older_than_days)
+    with engine.connect() as conn:
+        floor_id = conn.scalar(select(func.max(models.ArchiveSegment.max_id))) or 0
+        target_id = conn.scalar(select(func.max(RSSItem.id)).where(RSSItem.created_at < cutoff)) or 0
+
+    if not dry_run and floor_id:
+        stat["deleted"] += purge(floor_id, batch_size)
+        with engine.connect() as conn:
+            uncounted = conn.scalar(select(func.count()).select_from(models.ArchiveSegment)
+                                    .where(models.ArchiveSegment.distinct_count.is_(None)))
+        if uncounted:
+            # 수를 저장하기 전에 만든 segment
+            register([])
+    if target_id <= floor_id:
+        return stat
+
+    writers: dict[str, archive.SegmentWriter] = {}
+    last_id = target_id + 1
+    while True:
+        with engine.connect() as conn:
+            rows = conn.execute(
+                select(RSSItem.__table__)
+                .where(RSSItem.id < last_id, RSSItem.id > floor_id)
+                .order_by(RSSItem.id.desc())
+                .limit(batch_size)
+            ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        for row in rows:
+            month = month_of(row)
+            stat["months"][month] = stat["months"].get(month, 0) + 1
+            if dry_run:
+                continue
+            if month not in writers:
+                writers[month] = archive.SegmentWriter(month)
+            writers[month].add(dict(row._mapping))
+        stat["archived"] += len(rows)
+
+    if dry_run:
+        return stat
+
+    segments = []
+    for writer in writers.values():
+        if (segment := writer.close()) is not None:
+            segments.append(segment)
+        stat["raw_bytes"] += writer.raw_bytes
+        stat["compressed_bytes"] += writer.compressed_bytes
+
+    # 등록하는 순간부터 floor_id 이하는 archive 에서 읽으므로, 지우기 전이라도 중복되지 않는다.
+    register(segments)
+    stat["segments"] = len(segments)
+    stat["deleted"] += purge(target_id, batch_size)
+    return stat
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="archive old rss_items into monthly segments")
+    parser.add_argument("--older-than-days", type=int, default=archive.ARCHIVE_AFTER_DAYS)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args(argv)
+
+    Base.metadata.create_all(engine)
+    models.create_missing_columns(engine)
+    started_at = time.perf_counter()
+    stat = archive_items(args.older_than_days, args.batch_size, args.dry_run)
+
+    for month, count in sorted(stat["months"].items()):
+        print(f"{month}: {count}")
+    print(f"archived: {stat['archived']}, segments: {stat['segments']}, deleted: {stat['deleted']}, "
+          f"{time.perf_counter() - started_at:.1f}s")
+    if stat["raw_bytes"]:
+        print(f"raw: {stat['raw_bytes']:,} bytes, compressed: {stat['compressed_bytes']:,} bytes "
+              f"({stat['compressed_bytes'] / stat['raw_bytes']:.1%})")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,79 @@
+"""
+snippet 이 비어 있는 rss_items 의 body_text, snippet 을 채운다.
+
+    python -m crawling_news_server.commands.backfill_body_text --batch-size 2000
+
+이전 형태로 저장된 rss_item_json 은 지워서 다음 조회 때 다시 만들게 한다.
+실행 중인 서버는 rss_item_json_invalidations 를 보고 item JSON cache 에서 뺀다.
+"""
+import sys
+import time
+import argparse
+
+from sqlalchemy import bindparam, select, update
+
+from crawling_news_server import models
+from crawling_news_server.logics import item_json
+from crawling_news_server.crawl.html_text import html_to_text, make_snippet
+from crawling_news_server.database import engine
+
+RSSItem = models.RSSItem
+
+
+def backfill(batch_size: int, dry_run: bool = False) -> dict[str, int]:
+    """description, body_text, snippet 의 UTF-8 byte 합계도 함께 센다."""
+    stat = {"updated": 0, "description_bytes": 0, "body_text_bytes": 0, "snippet_bytes": 0}
+    last_id = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                select(RSSItem.id, RSSItem.description)
+                .where(RSSItem.id > last_id, RSSItem.snippet.is_(None))
+                .order_by(RSSItem.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                return stat
+            last_id = rows[-1].id
+
+            params = []
+            for row in rows:
+                body_text = html_to_text(row.description)
+                snippet = make_snippet(body_text)
+                params.append({"item_id": row.id, "body_text": body_text, "snippet": snippet})
+                stat["description_bytes"] += len((row.description or "").encode("utf-8"))
+                stat["body_text_bytes"] += len(body_text.encode("utf-8"))
+                stat["snippet_bytes"] += len(snippet.encode("utf-8"))
+
+            if not dry_run:
+                table = RSSItem.__table__
+                conn.execute(
+                    update(table).where(table.c.id == bindparam("item_id"))
+                    .values(body_text=bindparam("body_text"), snippet=bindparam("snippet")),
+                    params)
+                item_json.invalidate_items(conn, [row.id for row in rows])
+            stat["updated"] += len(params)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="rss_items.body_text, snippet backfill")
+    parser.add_argument("--batch-size", type=int, default=2000)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args(argv)
+
+    models.Base.metadata.create_all(engine)
+    models.create_missing_columns(engine)
+    started_at = time.perf_counter()
+    stat = backfill(args.batch_size, args.dry_run)
+
+    print(f"updated: {stat['updated']}, {time.perf_counter() - started_at:.1f}s")
+    if stat["updated"]:
+        print(f"description: {stat['description_bytes']:,} bytes, "
+              f"body_text: {stat['body_text_bytes']:,} bytes, "
+              f"snippet: {stat['snippet_bytes']:,} bytes "
+              f"({stat['snippet_bytes'] / max(stat['description_bytes'], 1):.1%} of description)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
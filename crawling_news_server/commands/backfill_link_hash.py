@@ -0,0 +1,78 @@
+"""
+link_hash 가 비어 있는 rss_items 를 채운다.
+
+    python -m crawling_news_server.commands.backfill_link_hash --batch-size 5000
+
+같은 rss 안에서 정규화한 link 가 이미 있는 item(추적용 query 만 다른 중복 등)은
+unique index 때문에 link_hash 를 비워 두고 개수만 알려준다.
+"""
+import sys
+import time
+import argparse
+
+from sqlalchemy import bindparam, select, update
+
+from crawling_news_server import models
+from crawling_news_server.crawl.canonical_link import link_hash
+from crawling_news_server.database import engine
+
+RSSItem = models.RSSItem
+
+
+def backfill(batch_size: int, dry_run: bool = False) -> dict[str, int]:
+    stat = {"updated": 0, "duplicated": 0}
+    last_id = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                select(RSSItem.id, RSSItem.rss_id, RSSItem.link)
+                .where(RSSItem.id > last_id, RSSItem.link_hash.is_(None))
+                .order_by(RSSItem.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                return stat
+            last_id = rows[-1].id
+
+            hashes = {row.id: link_hash(row.link) for row in rows}
+            seen = set(conn.execute(
+                select(RSSItem.rss_id, RSSItem.link_hash)
+                .where(RSSItem.rss_id.in_({row.rss_id for row in rows}),
+                       RSSItem.link_hash.in_(set(hashes.values())))
+            ).tuples())
+
+            params = []
+            for row in rows:
+                key = (row.rss_id, hashes[row.id])
+                if key in seen:
+                    stat["duplicated"] += 1
+                    continue
+                seen.add(key)
+                params.append({"item_id": row.id, "value": hashes[row.id]})
+
+            if params and not dry_run:
+                table = RSSItem.__table__
+                conn.execute(
+                    update(table).where(table.c.id == bindparam("item_id")).values(link_hash=bindparam("value")),
+                    params)
+            stat["updated"] += len(params)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="rss_items.link_hash backfill")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args(argv)
+
+    models.create_missing_columns(engine)
+    started_at = time.perf_counter()
+    stat = backfill(args.batch_size, args.dry_run)
+    models.create_missing_indexes(engine)
+
+    print(f"updated: {stat['updated']}, duplicated(left empty): {stat['duplicated']}, "
+          f"{time.perf_counter() - started_at:.1f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,120 @@
+"""
+rss_items 로부터 rss_item_rollups 와 rss_item_id_ranges/late_rss_items 를 다시 만든다.
+
+    python -m crawling_news_server.commands.rebuild_rollups
+    python -m crawling_news_server.commands.rebuild_rollups --start 2024-01-01 --end 2024-02-01
+
+범위를 주면 그 범위(시간 단위로 맞춤)의 rollup 만 지우고 다시 집계한다.
+id 범위는 항상 전체를 다시 만든다.
+"""
+import sys
+import time
+import logging
+import argparse
+import datetime
+from typing import Optional
+
+from sqlalchemy import Engine, delete, func, insert, literal_column, select
+
+from crawling_news_server import models
+from crawling_news_server.constants import LATE_PUBLISH_SECONDS
+from crawling_news_server.crud import hour_bucket
+from crawling_news_server.database import Base, engine
+
+logger = logging.getLogger(__name__)
+
+
+def hour_bucket_expr(engine: Engine):
+    """publish_datetime 을 시간 단위로 자르는 SQL 식"""
+    column = models.RSSItem.publish_datetime
+    if engine.dialect.name in ("mysql", "mariadb"):
+        return func.date_format(column, literal_column("'%Y-%m-%d %H:00:00'"))
+    # SQLite 는 문자열로 비교하므로 SQLAlchemy 가 저장하는 형식과 맞춘다.
+    return func.strftime("%Y-%m-%d %H:00:00.000000", column)
+
+
+def rebuild(engine: Engine, start: Optional[datetime.datetime], end: Optional[datetime.datetime]) -> int:
+    rollup = models.RSSItemRollup
+    item = models.RSSItem
+    bucket = hour_bucket_expr(engine)
+
+    delete_query = delete(rollup)
+    select_query = (select(item.rss_id, bucket, func.count())
+                    .where(item.publish_datetime.is_not(None))
+                    .group_by(item.rss_id, bucket))
+    if start:
+        delete_query = delete_query.where(rollup.bucket >= start)
+        select_query = select_query.where(item.publish_datetime >= start)
+    if end:
+        delete_query = delete_query.where(rollup.bucket < end)
+        select_query = select_query.where(item.publish_datetime < end)
+
+    with engine.begin() as conn:
+        conn.execute(delete_query)
+        result = conn.execute(insert(rollup).from_select(["rss_id", "bucket", "count"], select_query))
+        return result.rowcount
+
+
+def publish_gap_expr(engine: Engine):
+    """수집 시각(created_at)과 publish_datetime 차이(초)의 절대값"""
+    item = models.RSSItem
+    if engine.dialect.name in ("mysql", "mariadb"):
+        return func.abs(func.timestampdiff(literal_column("SECOND"), item.publish_datetime, item.created_at))
+    return func.abs((func.julianday(item.created_at) - func.julianday(item.publish_datetime)) * 86400)
+
+
+def rebuild_id_ranges(engine: Engine) -> tuple[int, int]:
+    """(시간 범위 수, 늦게 발행된 item 수)"""
+    item = models.RSSItem
+    id_range = models.RSSItemIdRange
+    late = models.LateRSSItem
+    bucket = hour_bucket_expr(engine)
+    is_late = publish_gap_expr(engine) > LATE_PUBLISH_SECONDS
+
+    with engine.begin() as conn:
+        conn.execute(delete(late))
+        conn.execute(delete(id_range))
+        late_count = conn.execute(insert(late).from_select(
+            ["rss_item_id", "publish_datetime"],
+            select(item.id, item.publish_datetime).where(item.publish_datetime.is_not(None), is_late),
+        )).rowcount
+        range_count = conn.execute(insert(id_range).from_select(
+            ["bucket", "min_id", "max_id"],
+            select(bucket, func.min(item.id), func.max(item.id))
+            .where(item.publish_datetime.is_not(None), ~is_late)
+            .group_by(bucket),
+        )).rowcount
+    return range_count, late_count
+
+
+def ensure_id_ranges(engine: Engine) -> None:
+    """기존 item 이 있는데 id 범위가 비어 있으면(처음 배포) 만든다."""
+    with engine.connect() as conn:
+        if conn.execute(select(models.RSSItemIdRange.id).limit(1)).first():
+            return
+        if not conn.execute(select(models.RSSItem.id).limit(1)).first():
+            return
+    range_count, late_count = rebuild_id_ranges(engine)
+    logger.warning(f"id ranges rebuilt: {range_count}, late items: {late_count}")
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="rss_item_rollups rebuild")
+    parser.add_argument("--start", type=datetime.datetime.fromisoformat)
+    parser.add_argument("--end", type=datetime.datetime.fromisoformat)
+    args = parser.parse_args(argv)
+
+    start = hour_bucket(args.start) if args.start else None
+    end = hour_bucket(args.end) if args.end else None
+
+    Base.metadata.create_all(engine)
+    started_at = time.perf_counter()
+    count = rebuild(engine, start, end)
+    range_count, late_count = rebuild_id_ranges(engine)
+    print(f"rollups: {count}, id ranges: {range_count}, late items: {late_count}, "
+          f"{time.perf_counter() - started_at:.1f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
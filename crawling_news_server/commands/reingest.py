@@ -0,0 +1,313 @@
+"""
+response_records 에 저장된 rss 본문을 다시 fix/parse 해서 빠진 item 은 넣고 달라진 item 은 고친다.
+rss_fixer, pub_date_to_dt 를 고친 뒤 이미 저장된 item 에 반영할 때 사용한다.
+
+    python -m crawling_news_server.commands.reingest --rss-id 1,2 --start 2024-01-01 --end 2024-02-01
+    python -m crawling_news_server.commands.reingest --dry-run --diff-limit 100
+
+parse 는 process pool(--workers)에서 하고, 저장은 batch 마다 한 transaction 으로 한다.
+새 item 과 고친 publish_datetime 의 rollup, id 범위, 저장 검색 결과도 같은 transaction 에서 반영하므로
+중간에 멈춰도 다시 실행하기만 하면 된다.
+처리한 마지막 response_records.id 를 --checkpoint 파일에 남겨 다시 실행하면 그 다음부터 이어간다.
+이미 맞는 item 은 건드리지 않으므로 같은 범위를 다시 실행해도 결과는 같다.
+고친 item 의 JSON 은 rss_item_json_invalidations 로 실행 중인 서버의 cache 에서도 빠진다.
+최근 item window 에는 반영되지 않으므로 최근 item 을 고쳤으면 끝난 뒤 서버를 다시 시작한다.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import datetime
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Iterator, Optional
+
+from sqlalchemy import and_, bindparam, delete, insert, or_, select, update
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.orm import Session
+
+from crawling_news_server import crud, crawl, models
+from crawling_news_server.database import Base, SessionLocal, engine
+from crawling_news_server.logics import archive, item_json
+
+RSSItem = models.RSSItem
+ResponseRecord = models.ResponseRecord
+
+# 다시 parse 한 값과 비교해 고치는 컬럼
+COMPARED_COLUMNS = (
+    "title", "description", "body_text", "snippet", "author", "category",
+    "pub_date", "publish_date", "publish_time", "publish_datetime",
+)
+
+
+def parse_record(record: tuple[int, int, str, str]) -> tuple[int, list[dict[str, Any]], Optional[str]]:
+    """process pool 에서 실행한다. (record id, item 값 목록, 오류)"""
+    record_id, rss_id, link, body = record
+    try:
+        rss_obj = crawl.rss_fixer.fix_rss(link, body)
+        items = []
+        for entry in rss_obj.entries:
+            if not entry.get("link"):
+                continue
+            values = crud.rss_item_values(rss_id, crud.rss_item_obj_to_dto(rss_id, entry))
+            if values.get("publish_datetime"):
+                # DB 에는 timezone 없이 저장된다.
+                values["publish_datetime"] = values["publish_datetime"].replace(tzinfo=None)
+            items.append(values)
+        return record_id, items, None
+    except Exception as e:
+        return record_id, [], f"{type(e).__name__}: {e}"
+
+
+def iter_records(last_id: int, rss_ids: Optional[list[int]], start: Optional[datetime.datetime],
+                 end: Optional[datetime.datetime], batch_size: int) -> Iterator[list[tuple[int, int, str, str]]]:
+    """last_id 다음부터 id 순서로 batch_size 개씩"""
+    while True:
+        query = (select(ResponseRecord.id, ResponseRecord.rss_id, ResponseRecord.link, ResponseRecord.body)
+                 .where(ResponseRecord.id > last_id, ResponseRecord.status_code < 400)
+                 .order_by(ResponseRecord.id)
+                 .limit(batch_size))
+        if rss_ids:
+            query = query.where(ResponseRecord.rss_id.in_(rss_ids))
+        if start:
+            query = query.where(ResponseRecord.created_at >= start)
+        if end:
+            query = query.where(ResponseRecord.created_at < end)
+        with engine.connect() as conn:
+            records = [tuple(row) for row in conn.execute(query)]
+        if not records:
+            return
+        yield records
+        last_id = records[-1][0]
+
+
+def normalize(value: Any) -> Any:
+    if isinstance(value, datetime.datetime):
+        return value.replace(tzinfo=None, microsecond=0)
+    return value
+
+
+def diff_items(db: Session, items: dict[tuple[int, int], dict[str, Any]],
+               archived_keys: set[tuple[int, int]]) -> tuple[list[dict], list[tuple[Any, dict]]]:
+    """
+    (새 item 값, (기존 행, 바뀐 값)). archive 로 옮긴 item 은 건너뛴다.
+    link_hash 를 채우기 전(backfill_link_hash)의 item 은 crud.same_link_condition 과 같이 link 를 그대로 비교한다.
+    """
+    keys = [key for key in items if key not in archived_keys]
+    existing, existing_links = {}, {}
+    if keys:
+        rows = db.execute(
+            select(RSSItem.id, RSSItem.rss_id, RSSItem.link_hash, RSSItem.link, RSSItem.created_at,
+                   *[getattr(RSSItem, c) for c in COMPARED_COLUMNS])
+            .where(RSSItem.rss_id.in_({rss_id for rss_id, _ in keys}),
+                   or_(RSSItem.link_hash.in_({hash_value for _, hash_value in keys}),
+                       and_(RSSItem.link_hash.is_(None), RSSItem.link.in_({items[key]["link"] for key in keys})))))
+        for row in rows:
+            if row.link_hash is None:
+                existing_links[(row.rss_id, row.link)] = row
+            else:
+                existing[(row.rss_id, row.link_hash)] = row
+
+    inserts, updates = [], []
+    for key in keys:
+        values = items[key]
+        row = existing.get(key) or existing_links.get((values["rss_id"], values["link"]))
+        if row is None:
+            inserts.append(values)
+            continue
+        # 다시 parse 해도 값이 없는 컬럼(날짜 parse 실패 등)은 그대로 둔다.
+        changes = {column: values[column] for column in COMPARED_COLUMNS
+                   if column in values and normalize(getattr(row, column)) != normalize(values[column])}
+        if changes:
+            updates.append((row, changes))
+    return inserts, updates
+
+
+def insert_ignore(db: Session, row: dict) -> Optional[int]:
+    """넣은 item 의 id. 다른 process 가 먼저 넣은 item 은 무시하고 None"""
+    table = RSSItem.__table__
+    dialect = db.bind.dialect.name
+    if dialect in ("mysql", "mariadb"):
+        stmt = mysql.insert(table).prefix_with("IGNORE")
+    elif dialect == "sqlite":
+        stmt = sqlite.insert(table).on_conflict_do_nothing()
+    else:
+        stmt = insert(table)
+    result = db.execute(stmt, row)
+    return result.inserted_primary_key[0] if result.rowcount else None
+
+
+def apply_changes(db: Session, inserts: list[dict], updates: list[tuple[Any, dict]]) -> int:
+    """
+    넣은 item 수. 수집 때(crud.create_rss_item)와 같이 rollup, id 범위, 저장 검색 결과를 같은 transaction 에서 고친다.
+    빠진 item 은 적으므로 한 행씩 넣어 실제로 넣은 item 만 반영한다.
+    """
+    now = datetime.datetime.now()
+    buckets: dict[tuple[int, datetime.datetime], int] = {}
+
+    inserted = 0
+    for values in inserts:
+        row = {"publish_date": "", "publish_time": "", "publish_datetime": now, "created_at": now, **values}
+        if (item_id := insert_ignore(db, row)) is None:
+            continue
+        inserted += 1
+        db_rss_item = RSSItem(id=item_id, **row)
+        bucket = (row["rss_id"], crud.hour_bucket(row["publish_datetime"]))
+        buckets[bucket] = buckets.get(bucket, 0) + 1
+        crud.record_rss_item_id_range(db, db_rss_item)
+        crud.create_saved_search_matches(db, db_rss_item)
+
+    by_columns: dict[tuple[str, ...], list[dict]] = {}
+    moved = []
+    for row, changes in updates:
+        by_columns.setdefault(tuple(sorted(changes)), []).append({"item_id": row.id, **changes})
+        if "publish_datetime" in changes:
+            moved.append(RSSItem(id=row.id, publish_datetime=changes["publish_datetime"], created_at=row.created_at))
+            old = (row.rss_id, crud.hour_bucket(row.publish_datetime)) if row.publish_datetime else None
+            new = (row.rss_id, crud.hour_bucket(changes["publish_datetime"]))
+            if old != new:
+                if old:
+                    buckets[old] = buckets.get(old, 0) - 1
+                buckets[new] = buckets.get(new, 0) + 1
+
+    table = RSSItem.__table__
+    for columns, params in by_columns.items():
+        db.execute(
+            update(table).where(table.c.id == bindparam("item_id"))
+            .values({column: bindparam(column) for column in columns}),
+            params)
+    if updates:
+        item_json.invalidate_items(db, [row.id for row, _ in updates])
+    if moved:
+        # 바뀐 publish_datetime 으로 다시 넣는다. 이전 시간 범위는 넓은 채로 두어도 결과는 같다.
+        db.execute(delete(models.LateRSSItem).where(
+            models.LateRSSItem.rss_item_id.in_([db_rss_item.id for db_rss_item in moved])))
+        for db_rss_item in moved:
+            crud.record_rss_item_id_range(db, db_rss_item)
+
+    for (rss_id, bucket), count in buckets.items():
+        if count:
+            crud.increment_rss_item_rollup(db, rss_id, bucket, count)
+    return inserted
+
+
+def print_diff(inserts: list[dict], updates: list[tuple[Any, dict]], limit: int) -> int:
+    printed = 0
+    for values in inserts:
+        if printed >= limit:
+            return printed
+        print(f"+ rss={values['rss_id']} {values['link']} {values['title'][:60]!r}")
+        printed += 1
+    for row, changes in updates:
+        for column, value in changes.items():
+            if printed >= limit:
+                return printed
+            old, new = getattr(row, column), value
+            if column in ("description", "body_text"):
+                old, new = f"{len(old or '')} chars", f"{len(new or '')} chars"
+            print(f"~ rss={row.rss_id} id={row.id} {column}: {old!r} -> {new!r}")
+            printed += 1
+    return printed
+
+
+def load_checkpoint(path: str, filters: dict) -> int:
+    if not os.path.exists(path):
+        return 0
+    with open(path, encoding="utf-8") as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("filters") != filters:
+        raise SystemExit(f"checkpoint {path} was made with other filters {checkpoint.get('filters')}, use --reset")
+    return checkpoint["last_record_id"]
+
+
+def save_checkpoint(path: str, filters: dict, last_record_id: int, stat: dict) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"filters": filters, "last_record_id": last_record_id, "stat": stat,
+                   "updated_at": datetime.datetime.now().isoformat()}, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def reingest(rss_ids: Optional[list[int]], start: Optional[datetime.datetime], end: Optional[datetime.datetime],
+             workers: int, batch_size: int, checkpoint: Optional[str], dry_run: bool, diff_limit: int) -> dict:
+    filters = {"rss_id": rss_ids, "start": start.isoformat() if start else None,
+               "end": end.isoformat() if end else None}
+    last_id = load_checkpoint(checkpoint, filters) if checkpoint else 0
+    stat = {"records": 0, "entries": 0, "inserted": 0, "updated": 0, "errors": 0}
+
+    with engine.connect() as conn:
+        segments = list(conn.scalars(select(models.ArchiveSegment)))
+    archived_keys = archive.archived_keys(segments) if segments else set()
+
+    started_at = time.perf_counter()
+    printed = 0
+    # dry run 은 쓰지 않으므로 앞 batch 에서 센 새 item 을 다시 세지 않게 기억한다.
+    dry_run_keys: set[tuple[int, int]] = set()
+    with ProcessPoolExecutor(workers) as pool:
+        for records in iter_records(last_id, rss_ids, start, end, batch_size):
+            items: dict[tuple[int, int], dict[str, Any]] = {}
+            chunksize = max(1, len(records) // (workers * 4))
+            for record_id, parsed, error in pool.map(parse_record, records, chunksize=chunksize):
+                if error:
+                    stat["errors"] += 1
+                    print(f"! record={record_id} {error}")
+                stat["entries"] += len(parsed)
+                for values in parsed:
+                    # 나중에 받은 본문의 값을 쓴다.
+                    items[(values["rss_id"], values["link_hash"])] = values
+
+            with SessionLocal() as db:
+                inserts, updates = diff_items(db, items, archived_keys)
+                if not dry_run:
+                    inserted = apply_changes(db, inserts, updates)
+                    db.commit()
+            if dry_run:
+                inserts = [values for values in inserts if (values["rss_id"], values["link_hash"]) not in dry_run_keys]
+                dry_run_keys.update((values["rss_id"], values["link_hash"]) for values in inserts)
+                inserted = len(inserts)
+            if dry_run and printed < diff_limit:
+                printed += print_diff(inserts, updates, diff_limit - printed)
+
+            stat["records"] += len(records)
+            stat["inserted"] += inserted
+            stat["updated"] += len(updates)
+            last_id = records[-1][0]
+            if checkpoint and not dry_run:
+                save_checkpoint(checkpoint, filters, last_id, stat)
+
+            elapsed = time.perf_counter() - started_at
+            print(f"record id {last_id}: {stat['records']} records, {stat['records'] / elapsed:.1f} records/s, "
+                  f"+{stat['inserted']} ~{stat['updated']}", file=sys.stderr)
+
+    stat["seconds"] = time.perf_counter() - started_at
+    return stat
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="re-ingest rss items from response_records")
+    parser.add_argument("--rss-id", type=lambda value: [int(v) for v in value.split(",")])
+    parser.add_argument("--start", type=datetime.datetime.fromisoformat, help="response_records.created_at >= start")
+    parser.add_argument("--end", type=datetime.datetime.fromisoformat, help="response_records.created_at < end")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--checkpoint", default="reingest.checkpoint.json")
+    parser.add_argument("--reset", action="store_true", help="ignore the checkpoint and start over")
+    parser.add_argument("--dry-run", action="store_true", help="print the diff without writing")
+    parser.add_argument("--diff-limit", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    Base.metadata.create_all(engine)
+    if args.reset and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+
+    stat = reingest(args.rss_id, args.start, args.end, args.workers, args.batch_size,
+                    args.checkpoint, args.dry_run, args.diff_limit)
+    seconds = max(stat["seconds"], 1e-9)
+    print(f"records: {stat['records']}, entries: {stat['entries']}, inserted: {stat['inserted']}, "
+          f"updated: {stat['updated']}, errors: {stat['errors']}{' (dry run)' if args.dry_run else ''}")
+    print(f"{stat['seconds']:.1f}s, {stat['records'] / seconds:.1f} records/s, {stat['entries'] / seconds:.1f} entries/s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,2 +1,9 @@
+import os
+
 RSS_IS_ACTIVE_DISABLE = 0
 RSS_IS_ACTIVE_ACTIVE = 1
+
+# 수집 시각과 publish_datetime 이 이 시간(초) 이상 차이나면 늦게(또는 미리) 발행된 item 으로 따로 기록한다.
+LATE_PUBLISH_SECONDS = int(os.environ.get("LATE_PUBLISH_SECONDS", "172800"))
+# 날짜 조건에 걸리는 늦게 발행된 item 이 이보다 많으면 id 범위 조건을 쓰지 않는다.
+LATE_PUBLISH_ID_LIMIT = int(os.environ.get("LATE_PUBLISH_ID_LIMIT", "1000"))
@@ -1,3 +1,6 @@
+from . import canonical_link
+from . import fetcher
+from . import html_text
 from . import response_to_text
 from . import rss_fixer
 from . import util
@@ -0,0 +1,49 @@
+import hashlib
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+# 같은 기사를 가리키지만 유입 경로만 다른 query parameter
+TRACKING_PARAMS = {"fbclid", "gclid", "dclid", "msclkid", "igshid", "mc_cid", "mc_eid", "_ga", "yclid"}
+TRACKING_PREFIXES = ("utm_",)
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def is_tracking_param(name: str) -> bool:
+    name = name.lower()
+    return name in TRACKING_PARAMS or name.startswith(TRACKING_PREFIXES)
+
+
+def canonicalize_link(link: str) -> str:
+    """
+    중복 확인용 link 정규화.
+    http/https, www., 기본 port, fragment, 끝의 /, 추적용 query 를 무시하고
+    남은 query 는 이름순으로 정렬한다. scheme 은 결과에 포함하지 않는다.
+    """
+    link = link.strip()
+    try:
+        parsed = urlsplit(link)
+        port = parsed.port
+    except ValueError:
+        return link
+
+    if not parsed.netloc:
+        return link
+
+    host = (parsed.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    if port and port != DEFAULT_PORTS.get(parsed.scheme.lower()):
+        host = f"{host}:{port}"
+
+    path = parsed.path.rstrip("/")
+    query = sorted((k, v) for k, v in parse_qsl(parsed.query, keep_blank_values=True) if not is_tracking_param(k))
+
+    canonical = f"//{host}{path}"
+    if query:
+        canonical += "?" + urlencode(query)
+    return canonical
+
+
+def link_hash(link: str) -> int:
+    """정규화한 link 의 64bit hash. BIGINT(signed) 에 맞도록 부호 있는 정수로 돌려준다."""
+    digest = hashlib.blake2b(canonicalize_link(link).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
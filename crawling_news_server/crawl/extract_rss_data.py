@@ -1,12 +1,15 @@
 import re
-import sys
+import asyncio
+import importlib.util
 from typing import Optional
 
 from bs4 import BeautifulSoup
-import aiohttp
 import requests
-from crawling_news_server.crawl.util import get_header, normalize_url
-from urllib.parse import urlparse
+from crawling_news_server.crawl import fetcher
+from crawling_news_server.crawl.util import normalize_url
+
+# lxml 이 설치되어 있으면 더 빠른 lxml parser 를 쓴다.
+HTML_PARSER = 'lxml' if importlib.util.find_spec('lxml') else 'html.parser'
 
 
 def is_ignore_url(url: str) -> bool:
@@ -32,46 +35,51 @@ def is_ignore_url(url: str) -> bool:
     return False
 
 
-async def fetch(url: str, encoding: Optional[str] = None):
-    # https://www.inflearn.com/questions/667190/%ED%8C%8C%EC%9D%B4%EC%8D%AC-%EC%BD%94%EB%A3%A8%ED%8B%B4-%EC%82%AC%EC%9A%A9%ED%95%98%EA%B8%B0-aiohttp%EB%A1%9C-crawling%EC%8B%9C%EC%97%90-ssl-error-%EB%B0%9C%EC%83%9D
-    # SSL 에러 무시
-    # connector = aiohttp.TCPConnector(ssl=False, limit=30)
-    # async with aiohttp.ClientSession(connector=connector) as session:
-    #     async with session.get(url, headers=get_header()) as resp:
-    #         try:
-    #             resp.raise_for_status()
-    #
-    #             if encoding:
-    #                 return resp.content.read()
-    #
-    #             with open(path, 'wb') as fd:
-    #                 async for chunk in resp.content.iter_chunked(chunk_size):
-    #                     fd.write(chunk)
-    #         except Exception as e:
-    #             print(f"Status Error {url}: {e}", file=sys.stderr)
-
-    response_bytes = requests.get(url, headers=get_header(), verify=False).content
-
-    webpage_data = ""
-    try:
-        webpage_data = response_bytes.decode('euc-kr')
-    except UnicodeDecodeError:
+_META_CHARSET = re.compile(rb"""<meta[^>]+charset=["']?([\w-]+)""", re.IGNORECASE)
+
+
+def decode_html(response: requests.Response) -> str:
+    """
+    헤더의 charset, BOM, meta charset 순서로 인코딩을 정한다.
+    아무것도 없으면 utf-8 로 읽고 실패하면 cp949(euc-kr 포함)로 읽는다.
+    """
+    content = response.content
+    if content.startswith(b'\xef\xbb\xbf'):
+        return content[3:].decode('utf-8', errors="replace")
+
+    # charset 이 없는 text/* 에 requests 가 넣는 ISO-8859-1 은 쓰지 않는다.
+    encodings = []
+    if "charset" in response.headers.get("Content-Type", "").lower() and response.encoding:
+        encodings.append(response.encoding)
+    if m := _META_CHARSET.search(content[:4096]):
+        encodings.append(m.group(1).decode('ascii'))
+    encodings += ['utf-8', 'cp949']
+
+    for encoding in encodings:
+        if encoding.lower().replace('_', '-') in ('euc-kr', 'ks-c-5601-1987'):
+            encoding = 'cp949'
         try:
-            webpage_data = response_bytes.decode('utf-8', errors="replace")
-        except:
-            try:
-                webpage_data = response_bytes.decode('cp949')
-            except:
-                webpage_data = response_bytes.decode('ascii')
+            return content.decode(encoding)
+        except (UnicodeDecodeError, LookupError):
+            continue
+    return content.decode('utf-8', errors="replace")
+
+
+async def fetch(url: str, encoding: Optional[str] = None) -> str:
+    """event loop 를 막지 않도록 fetcher.fetch 는 thread 에서 실행한다."""
+    response = await asyncio.to_thread(fetcher.fetch, url)
+    if encoding:
+        return response.content.decode(encoding, errors="replace")
 
+    webpage_data = decode_html(response)
     if not webpage_data:
-        Exception("no webpage data")
+        raise Exception("no webpage data")
 
     return webpage_data
 
 
 def create_beautifulsoup(html: str) -> BeautifulSoup:
-    soup = BeautifulSoup(html, 'html.parser')
+    soup = BeautifulSoup(html, HTML_PARSER)
 
     # for item in soup.select('link[href=""]'):
     #     item.decompose()
@@ -88,20 +96,23 @@ def create_beautifulsoup(html: str) -> BeautifulSoup:
 
 def extract_rss_url_from_link_tag(url: str, soup: BeautifulSoup) -> list:
     rss_url_list = set()
-    link_rss_list = soup.select('link[rel="alternate"][type="application/rss+xml"]')
+    link_rss_list = soup.select('link[rel="alternate"][type="application/rss+xml"], '
+                                'link[rel="alternate"][type="application/atom+xml"]')
     for item in link_rss_list:
-        href = item.extract()['href']
+        href = item.extract().get('href')
+        if not href:
+            continue
         rss_url_list.add(normalize_url(url, href))
     return list(rss_url_list)
 
 
 def extract_rss_url_from_body(url: str, soup: BeautifulSoup) -> list:
     rss_url_list = set()
-    tag_list = soup.find_all(href=re.compile(r"rss|feed"))
+    tag_list = soup.find_all(href=re.compile(r"rss|feed", re.IGNORECASE))
     for item in tag_list:
         extracted_item = item.extract()
         href = extracted_item['href']
-        if 'javascript:' in href or "#" in href:
+        if 'javascript:' in href or 'mailto:' in href or "#" in href:
             continue
 
         rss_url_list.add(normalize_url(url, href))
@@ -110,10 +121,7 @@ def extract_rss_url_from_body(url: str, soup: BeautifulSoup) -> list:
 
 async def extract_rss_urls(url: str):
     webpage_text = await fetch(url)
-    # print(webpage_text, file=sys.stdout)
-
     soup = create_beautifulsoup(webpage_text)
-    print(soup, file=sys.stdout)
 
     data = {'link': extract_rss_url_from_link_tag(url, soup), 'body': extract_rss_url_from_body(url, soup)}
 
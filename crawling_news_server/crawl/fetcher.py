@@ -0,0 +1,281 @@
+import os
+import time
+import socket
+import logging
+import itertools
+import threading
+from dataclasses import dataclass, field
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from crawling_news_server.crawl.util import get_header
+
+logger = logging.getLogger(__name__)
+
+FETCH_CONNECT_TIMEOUT = float(os.environ.get("FETCH_CONNECT_TIMEOUT", "10"))
+FETCH_READ_TIMEOUT = float(os.environ.get("FETCH_READ_TIMEOUT", "30"))
+FETCH_TOTAL_TIMEOUT = float(os.environ.get("FETCH_TOTAL_TIMEOUT", "60"))
+FETCH_MAX_BYTES = int(os.environ.get("FETCH_MAX_BYTES", str(10 * 1024 * 1024)))
+FETCH_WATCHDOG_INTERVAL = float(os.environ.get("FETCH_WATCHDOG_INTERVAL", "1"))
+FETCH_CHUNK_SIZE = 8 * 1024
+
+
+class FetchTimeout(requests.exceptions.Timeout):
+    """fetch 전체 시간 예산 초과"""
+
+
+class FetchTooLarge(requests.exceptions.RequestException):
+    """응답 본문이 최대 크기를 초과"""
+
+
+@dataclass
+class InFlightFetch:
+    fetch_id: int
+    url: str
+    started_at: float
+    deadline: float
+    response: Optional[requests.Response] = None
+    # 연결 직후의 소켓. 헤더를 받기 전에도 취소할 수 있다.
+    sockets: list[socket.socket] = field(default_factory=list)
+    cancelled: bool = False
+
+
+def _shutdown_socket(sock: socket.socket) -> None:
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+def _shutdown_response(response: requests.Response) -> None:
+    """읽기 중 블로킹된 소켓을 깨우기 위해 shutdown 후 close"""
+    sock = None
+    try:
+        sock = response.raw.connection.sock
+    except AttributeError:
+        pass
+    if sock is None:
+        try:
+            sock = response.raw._fp.fp.raw._sock
+        except AttributeError:
+            pass
+
+    if sock is not None:
+        _shutdown_socket(sock)
+
+    try:
+        response.close()
+    except Exception:
+        pass
+
+
+class FetchWatchdog:
+    """진행 중인 fetch 를 추적하고 시간 예산을 넘긴 fetch 를 보고 후 취소한다."""
+
+    def __init__(self, interval: float = FETCH_WATCHDOG_INTERVAL):
+        self.interval = interval
+        self.cancelled_count = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._in_flight: dict[int, InFlightFetch] = {}
+        self._thread: Optional[threading.Thread] = None
+
+    def register(self, url: str, budget: float) -> int:
+        self.start()
+        now = time.monotonic()
+        fetch_id = next(self._ids)
+        with self._lock:
+            self._in_flight[fetch_id] = InFlightFetch(fetch_id, url, now, now + budget)
+        return fetch_id
+
+    def attach(self, fetch_id: int, response: requests.Response) -> None:
+        with self._lock:
+            if in_flight := self._in_flight.get(fetch_id):
+                in_flight.response = response
+                cancel = in_flight.cancelled
+            else:
+                cancel = False
+
+        # 헤더를 받는 동안 이미 예산을 넘긴 경우
+        if cancel:
+            _shutdown_response(response)
+
+    def attach_socket(self, fetch_id: int, sock: socket.socket) -> None:
+        """연결(redirect 포함)마다 호출된다. 헤더를 천천히 보내는 서버도 예산 안에 끊을 수 있다."""
+        with self._lock:
+            if in_flight := self._in_flight.get(fetch_id):
+                in_flight.sockets.append(sock)
+                cancel = in_flight.cancelled
+            else:
+                cancel = False
+
+        if cancel:
+            _shutdown_socket(sock)
+
+    def unregister(self, fetch_id: int) -> Optional[InFlightFetch]:
+        with self._lock:
+            return self._in_flight.pop(fetch_id, None)
+
+    def is_cancelled(self, fetch_id: int) -> bool:
+        with self._lock:
+            in_flight = self._in_flight.get(fetch_id)
+            return bool(in_flight and in_flight.cancelled)
+
+    def in_flight(self) -> list[dict]:
+        now = time.monotonic()
+        with self._lock:
+            return [{
+                "id": item.fetch_id,
+                "url": item.url,
+                "elapsed": round(now - item.started_at, 3),
+                "budget": round(item.deadline - item.started_at, 3),
+                "cancelled": item.cancelled,
+            } for item in self._in_flight.values()]
+
+    def check(self) -> list[InFlightFetch]:
+        now = time.monotonic()
+        with self._lock:
+            expired = [item for item in self._in_flight.values() if not item.cancelled and item.deadline <= now]
+            for item in expired:
+                item.cancelled = True
+            self.cancelled_count += len(expired)
+
+        for item in expired:
+            logger.warning(f"[fetch {item.fetch_id:<8}]({item.url:<55}): "
+                           f"exceeded budget {item.deadline - item.started_at:.1f}s, cancel")
+            for sock in item.sockets:
+                _shutdown_socket(sock)
+            if item.response is not None:
+                _shutdown_response(item.response)
+        return expired
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="fetch-watchdog", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"fetch watchdog error: {e}")
+
+
+watchdog = FetchWatchdog()
+# 현재 thread 에서 진행 중인 fetch id. 연결을 만들 때 소켓을 watchdog 에 등록하는 데 쓴다.
+_current_fetch = threading.local()
+
+
+class _WatchedConnectionMixin:
+    def _new_conn(self) -> socket.socket:
+        sock = super()._new_conn()
+        if (fetch_id := getattr(_current_fetch, "fetch_id", None)) is not None:
+            watchdog.attach_socket(fetch_id, sock)
+        return sock
+
+
+class _WatchedHTTPConnection(_WatchedConnectionMixin, HTTPConnection):
+    pass
+
+
+class _WatchedHTTPSConnection(_WatchedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class _WatchedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _WatchedHTTPConnection
+
+
+class _WatchedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _WatchedHTTPSConnection
+
+
+WATCHED_POOL_CLASSES = {"http": _WatchedHTTPConnectionPool, "https": _WatchedHTTPSConnectionPool}
+
+
+class WatchedAdapter(HTTPAdapter):
+    """새 연결의 소켓을 요청 전에 watchdog 에 알리는 adapter"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = WATCHED_POOL_CLASSES
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        manager = super().proxy_manager_for(proxy, **proxy_kwargs)
+        # socks proxy 는 자체 pool class 를 쓴다.
+        if not proxy.lower().startswith("socks"):
+            manager.pool_classes_by_scheme = WATCHED_POOL_CLASSES
+        return manager
+
+
+def _read_body(fetch_id: int, response: requests.Response, deadline: float, max_bytes: int) -> bytes:
+    content_length = response.headers.get("Content-Length")
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+        raise FetchTooLarge(f"Content-Length {content_length} exceeds {max_bytes} bytes", response=response)
+
+    body = bytearray()
+    for chunk in response.iter_content(FETCH_CHUNK_SIZE):
+        body.extend(chunk)
+        if len(body) > max_bytes:
+            raise FetchTooLarge(f"body exceeds {max_bytes} bytes", response=response)
+        if time.monotonic() > deadline or watchdog.is_cancelled(fetch_id):
+            raise FetchTimeout("fetch exceeded total budget", response=response)
+    return bytes(body)
+
+
+def fetch(
+        url: str, headers: Optional[dict] = None,
+        budget: Optional[float] = None, max_bytes: Optional[int] = None,
+) -> requests.Response:
+    """
+    연결/읽기 타임아웃, 전체 시간 예산, 최대 본문 크기를 적용하여 url 을 가져온다.
+    반환된 Response 는 본문을 모두 읽은 상태이므로 content, text 를 그대로 사용할 수 있다.
+    """
+    budget = budget or FETCH_TOTAL_TIMEOUT
+    max_bytes = max_bytes or FETCH_MAX_BYTES
+
+    fetch_id = watchdog.register(url, budget)
+    deadline = time.monotonic() + budget
+    _current_fetch.fetch_id = fetch_id
+    session = requests.Session()
+    session.mount("http://", WatchedAdapter())
+    session.mount("https://", WatchedAdapter())
+    try:
+        response = session.get(
+            url, headers=headers or get_header(), verify=False, stream=True,
+            timeout=(FETCH_CONNECT_TIMEOUT, FETCH_READ_TIMEOUT),
+        )
+        watchdog.attach(fetch_id, response)
+        try:
+            response._content = _read_body(fetch_id, response, deadline, max_bytes)
+            response._content_consumed = True
+        finally:
+            response.close()
+        # 소켓을 닫으면 http.client 는 받다 만 헤더나 본문을 정상 종료로 볼 수 있다.
+        if watchdog.is_cancelled(fetch_id):
+            raise FetchTimeout(f"fetch exceeded total budget {budget}s: {url}", response=response)
+        return response
+
+    except (FetchTimeout, FetchTooLarge):
+        raise
+
+    except Exception as e:
+        # watchdog 이 소켓을 닫으면 읽기 중 연결 오류가 발생한다.
+        if watchdog.is_cancelled(fetch_id):
+            raise FetchTimeout(f"fetch exceeded total budget {budget}s: {url}") from e
+        raise
+
+    finally:
+        _current_fetch.fetch_id = None
+        session.close()
+        watchdog.unregister(fetch_id)
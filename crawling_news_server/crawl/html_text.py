@@ -0,0 +1,76 @@
+"""item description(HTML)을 검색/목록용 평문으로 바꾼다."""
+import os
+import re
+from html.parser import HTMLParser
+
+# 목록에 보내는 snippet 최대 글자 수
+SNIPPET_LENGTH = int(os.environ.get("SNIPPET_LENGTH", "200"))
+
+# 내용을 버리는 tag
+SKIP_TAGS = {"script", "style", "noscript", "iframe", "object", "svg", "head", "template"}
+# 앞뒤로 줄을 바꾸는 tag
+BLOCK_TAGS = {
+    "address", "article", "aside", "blockquote", "br", "dd", "div", "dl", "dt", "figcaption", "figure",
+    "footer", "h1", "h2", "h3", "h4", "h5", "h6", "header", "hr", "li", "ol", "p", "pre", "section",
+    "table", "tr", "td", "th", "ul",
+}
+
+_SPACES = re.compile(r"[ \t\r\f\v\u00a0\u200b]+")
+_NEWLINES = re.compile(r"\s*\n\s*")
+
+
+class _TextParser(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: list[str] = []
+        self.skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self.skip_depth += 1
+        elif tag in BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self.skip_depth = max(self.skip_depth - 1, 0)
+        elif tag in BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if not self.skip_depth:
+            self.parts.append(data)
+
+
+def html_to_text(description: str) -> str:
+    """tag, script/style, 연속 공백을 없앤 평문. 문단은 줄바꿈 하나로 남긴다."""
+    if not description:
+        return ""
+    if "<" not in description and "&" not in description:
+        text = description
+    else:
+        parser = _TextParser()
+        try:
+            parser.feed(description)
+            parser.close()
+        except Exception:
+            # 깨진 HTML 은 읽은 데까지만 사용한다.
+            pass
+        text = "".join(parser.parts)
+    text = _SPACES.sub(" ", text)
+    return _NEWLINES.sub("\n", text).strip()
+
+
+def make_snippet(text: str, length: int = SNIPPET_LENGTH) -> str:
+    """평문 앞부분을 한 줄로 length 글자 이내로 자른다. 가능하면 단어 중간에서 자르지 않는다."""
+    text = " ".join(text.split())
+    if len(text) <= length:
+        return text
+    cut = text[:length - 1]
+    if (space := cut.rfind(" ")) > length // 2:
+        cut = cut[:space]
+    return cut.rstrip() + "…"
@@ -4,6 +4,11 @@ import feedparser
 
 
 def fix_rss(url: str, text: str) -> feedparser.FeedParserDict:
+    return feedparser.parse(fix_text(url, text))
+
+
+def fix_text(url: str, text: str) -> str:
+    """feedparser 가 읽을 수 있도록 rss 본문을 고친다."""
     parsed_url = urlparse(url)
     # 카테고리 중첩 제거
     text = re.sub(r"(]]>)?</category>\s*<category>(<!\[CDATA\[)?", ":", text)
@@ -59,4 +64,4 @@ def fix_rss(url: str, text: str) -> feedparser.FeedParserDict:
         r"<\g<1>><![CDATA[\g<3>]]></\g<5>>",
         text)
 
-    return feedparser.parse(text)
+    return text
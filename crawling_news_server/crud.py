@@ -7,12 +7,20 @@ import logging
 import datetime
 from typing import List, Type, Union, Dict, Optional
 
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, text
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy import and_, exists, func, inspect, or_, select, text
 
 from . import models, schemas
+from .constants import LATE_PUBLISH_SECONDS, LATE_PUBLISH_ID_LIMIT
 from .models import RSS, RSSItem
-from crawling_news_server.crawl import pub_date_to_dt
+from crawling_news_server.crawl import html_text, pub_date_to_dt
+from crawling_news_server.crawl.canonical_link import canonicalize_link, link_hash
+from crawling_news_server.logics import item_json, metrics, saved_search
+from crawling_news_server.logics.broadcast import broadcaster
+from crawling_news_server.logics.hot_window import window
+from crawling_news_server.logics.facet_cache import facet_cache
 
 
 logger = logging.getLogger(__name__)
@@ -32,6 +40,17 @@ def get_rss_by_url(db: Session, url: str) -> models.RSS | None:
     return db.query(models.RSS).filter(models.RSS.url == url).first()
 
 
+def get_registered_rss_links(db: Session, urls: list[str]) -> set[str]:
+    """
+    urls 중 이미 등록된 url 의 canonicalize_link 값.
+    http/https, www., 끝의 / 처럼 등록된 url 과 표기만 다른 url 도 등록된 것으로 본다.
+    """
+    keys = {canonicalize_link(url) for url in urls}
+    if not keys:
+        return set()
+    return {key for url, in db.query(models.RSS.url) if (key := canonicalize_link(url)) in keys}
+
+
 def create_rss(db: Session, rss: schemas.RssCreateDto):
     db_rss = models.RSS(
         name=rss.name,
@@ -92,16 +111,134 @@ def update_rss_from_rss_dict(db: Session, rss_id: int, feed: Dict[str, str | Non
     return update_rss_obj(db, db_rss)
 
 
+def get_rss_health(db: Session, rss_id: int) -> models.RSSHealth | None:
+    return db.query(models.RSSHealth).filter(models.RSSHealth.rss_id == rss_id).first()
+
+
+def get_or_create_rss_health(db: Session, rss_id: int) -> models.RSSHealth:
+    db_health = get_rss_health(db, rss_id)
+    if db_health is None:
+        db_health = models.RSSHealth(rss_id=rss_id, fail_count=0)
+    return db_health
+
+
+def get_rss_health_all(db: Session) -> List[Type[models.RSSHealth]]:
+    return db.query(models.RSSHealth).order_by(models.RSSHealth.rss_id).all()
+
+
+def create_rss_health_for_inactive(db: Session, fail_count: int) -> int:
+    """상태 없이 비활성화된 rss 의 상태를 바로 probe 할 수 있게 만든다. 만든 수"""
+    rss_ids = [rss_id for rss_id, in db.query(models.RSS.id)
+               .outerjoin(models.RSSHealth, models.RSSHealth.rss_id == models.RSS.id)
+               .filter(models.RSS.is_active == 0, models.RSSHealth.id.is_(None))]
+    now = datetime.datetime.utcnow()
+    db.add_all([models.RSSHealth(rss_id=rss_id, fail_count=fail_count, next_retry_at=now) for rss_id in rss_ids])
+    db.commit()
+    return len(rss_ids)
+
+
+def get_rss_health_due_for_probe(
+        db: Session, now: datetime.datetime, min_fail_count: int, limit: int
+) -> List[Type[models.RSSHealth]]:
+    """연속 실패로 비활성화되었고 재시도 시각이 지난 rss 의 상태"""
+    return (db.query(models.RSSHealth)
+            .join(models.RSS, models.RSS.id == models.RSSHealth.rss_id)
+            .filter(models.RSS.is_active == 0,
+                    models.RSSHealth.fail_count >= min_fail_count,
+                    models.RSSHealth.next_retry_at <= now)
+            .order_by(models.RSSHealth.next_retry_at)
+            .limit(limit)
+            .all())
+
+
+def update_rss_health_success(db: Session, rss_id: int, status_code: int) -> models.RSSHealth:
+    db_health = get_or_create_rss_health(db, rss_id)
+    db_health.fail_count = 0
+    db_health.last_status_code = status_code
+    db_health.last_success_at = datetime.datetime.utcnow()
+    db_health.next_retry_at = None
+    db.add(db_health)
+    db.commit()
+    db.refresh(db_health)
+    return db_health
+
+
+def update_rss_health_failure(
+        db: Session, rss_id: int, error: str, status_code: Optional[int], retry_seconds: int
+) -> models.RSSHealth:
+    now = datetime.datetime.utcnow()
+    db_health = get_or_create_rss_health(db, rss_id)
+    db_health.fail_count = (db_health.fail_count or 0) + 1
+    db_health.last_error = error[:1024]
+    db_health.last_status_code = status_code
+    db_health.last_failure_at = now
+    db_health.next_retry_at = now + datetime.timedelta(seconds=retry_seconds)
+    db.add(db_health)
+    db.commit()
+    db.refresh(db_health)
+    return db_health
+
+
+def update_rss_yield(db: Session, rss_id: int, add_count: int, alpha: float) -> models.RSSHealth:
+    """poll 1회당 새 item 수의 지수이동평균을 갱신"""
+    db_health = get_or_create_rss_health(db, rss_id)
+    if db_health.yield_avg is None:
+        db_health.yield_avg = float(add_count)
+    else:
+        db_health.yield_avg = alpha * add_count + (1 - alpha) * db_health.yield_avg
+    db_health.poll_count = (db_health.poll_count or 0) + 1
+    db.add(db_health)
+    db.commit()
+    db.refresh(db_health)
+    return db_health
+
+
+def get_rss_yield_all(db: Session) -> dict[int, float]:
+    rows = (db.query(models.RSSHealth.rss_id, models.RSSHealth.yield_avg)
+            .filter(models.RSSHealth.yield_avg.isnot(None))
+            .all())
+    return {rss_id: yield_avg for rss_id, yield_avg in rows}
+
+
+def get_websub_subscription(db: Session, rss_id: int) -> models.WebSubSubscription | None:
+    return db.query(models.WebSubSubscription).filter(models.WebSubSubscription.rss_id == rss_id).first()
+
+
+def get_websub_subscriptions_expiring(db: Session, before: datetime.datetime) -> List[Type[models.WebSubSubscription]]:
+    return (db.query(models.WebSubSubscription)
+            .filter(models.WebSubSubscription.state == "active",
+                    models.WebSubSubscription.expires_at <= before)
+            .all())
+
+
+def update_websub_subscription(db: Session, db_subscription: models.WebSubSubscription) -> models.WebSubSubscription:
+    db.add(db_subscription)
+    db.commit()
+    db.refresh(db_subscription)
+    return db_subscription
+
+
 def get_rss_item_by_rss_id_and_link(db: Session, rss_id: int, link: str) -> models.RSSItem | None:
-    return db.query(models.RSSItem).filter(models.RSSItem.rss_id == rss_id, models.RSSItem.link == link).first()
+    """정규화한 link 가 같으면 같은 item 으로 본다."""
+    return (db.query(models.RSSItem)
+            .filter(models.RSSItem.rss_id == rss_id, same_link_condition(link))
+            .first())
 
 
-def create_rss_item(db: Session, rss_id: int, rss_item: schemas.RssItemCreateDto):
-    db_rss_item = models.RSSItem(
+def same_link_condition(link: str):
+    """link_hash 를 채우기 전(backfill_link_hash)의 item 은 link 를 그대로 비교한다."""
+    return or_(models.RSSItem.link_hash == link_hash(link),
+               and_(models.RSSItem.link_hash.is_(None), models.RSSItem.link == link))
+
+
+def rss_item_values(rss_id: int, rss_item: schemas.RssItemCreateDto) -> dict:
+    """rss_items 에 저장할 값. 수집과 재수집(commands.reingest)이 함께 쓴다."""
+    values = dict(
         rss_id=rss_id,
         title=rss_item.title,
         description=rss_item.description,
         link=rss_item.link,
+        link_hash=link_hash(rss_item.link),
         author=rss_item.author,
         category=rss_item.category,
         comments=rss_item.comments,
@@ -111,49 +248,230 @@ def create_rss_item(db: Session, rss_id: int, rss_item: schemas.RssItemCreateDto
         source=rss_item.source,
         extra=rss_item.extra,
     )
+    values["body_text"] = html_text.html_to_text(rss_item.description)
+    values["snippet"] = html_text.make_snippet(values["body_text"])
 
     if rss_item.pub_date:
         try:
-            if dt := pub_date_to_dt.parse_date(rss_item.pub_date):
-                db_rss_item.publish_date = dt.date().isoformat()
-                db_rss_item.publish_time = dt.time().isoformat()
-                db_rss_item.publish_datetime = dt
+            with metrics.stage("date"):
+                dt = pub_date_to_dt.parse_date(rss_item.pub_date)
+            if dt:
+                values["publish_date"] = dt.date().isoformat()
+                values["publish_time"] = dt.time().isoformat()
+                values["publish_datetime"] = dt
             else:
                 logger.error(f"error pub_date_to_dt: {rss_item.pub_date}")
 
         except Exception as e:
             logger.error(e)
             logger.error(f"error pub_date_to_dt: {rss_item.pub_date}")
+    return values
+
+
+def create_rss_item(db: Session, rss_id: int, rss_item: schemas.RssItemCreateDto):
+    db_rss_item = models.RSSItem(**rss_item_values(rss_id, rss_item))
 
     db.add(db_rss_item)
+    db.flush()
+    # DB 의 now() 로 채워진 값. 늦게 발행된 item 판단은 rebuild_id_ranges 와 같이 DB 의 created_at 을 기준으로 한다.
+    db.refresh(db_rss_item, ["publish_datetime", "created_at"])
+    increment_rss_item_rollup(db, rss_id, hour_bucket(db_rss_item.publish_datetime))
+    record_rss_item_id_range(db, db_rss_item)
+    create_saved_search_matches(db, db_rss_item)
+    item_json.persist_item(db, db_rss_item)
     db.commit()
     db.refresh(db_rss_item)
+    publish_rss_item(db, db_rss_item)
     return db_rss_item
 
 
-def create_rss_item_from_rss_item_obj(db: Session, rss_id: int, rss_item_obj: dict[str, str]) -> Optional[RSSItem]:
-    try:
-        rss_item = schemas.RssItemCreateDto(
-            title=rss_item_obj.get("title", "")[:1024],
-            link=rss_item_obj.get("link", "")[:768],
-            description="",
-            guid=rss_item_obj.get("link", "")[:1024],
-            pub_date=datetime.datetime.utcnow().isoformat()[:128],
-        )
+def publish_rss_item(db: Session, db_rss_item: models.RSSItem) -> None:
+    """commit 된 item 을 직렬화해 두고 최근 item window 와 stream 에 넣는다. facet cache 는 이 item 이 들어갈 수 있는 결과만 버린다."""
+    facet_cache.invalidate(db_rss_item.rss_id, db_rss_item.publish_datetime)
+    item_json.store_item(db_rss_item)
+    if window.ready:
+        window.add(db_rss_item)
 
-        try:
-            rss_item.description = html.unescape(rss_item_obj.get("summary", ""))
-        except Exception as e:
-            logging.warning(f"[{rss_id:<10}]: description error: {e}")
+    # 연결된 client 가 없으면 직렬화도 하지 않는다.
+    if broadcaster.has_subscribers():
+        broadcaster.publish(db_rss_item.id, db_rss_item.rss_id, item_json.serialize_item(db_rss_item).decode("utf-8"))
+
+
+def hour_bucket(dt: datetime.datetime) -> datetime.datetime:
+    """DB 에 저장되는 것과 같게 timezone 을 떼고 시간 단위로 자른다."""
+    return dt.replace(minute=0, second=0, microsecond=0, tzinfo=None)
+
+
+def increment_rss_item_rollup(db: Session, rss_id: int, bucket: datetime.datetime, count: int = 1) -> None:
+    """rollup 을 upsert 한다. commit 은 호출한 쪽에서 item 저장과 함께 한다."""
+    table = models.RSSItemRollup.__table__
+    values = {"rss_id": rss_id, "bucket": bucket, "count": count}
+    if db.bind.dialect.name in ("mysql", "mariadb"):
+        stmt = mysql.insert(table).values(**values)
+        stmt = stmt.on_duplicate_key_update(count=table.c.count + stmt.inserted.count)
+    else:
+        stmt = sqlite.insert(table).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.rss_id, table.c.bucket], set_={"count": table.c.count + stmt.excluded.count})
+    db.execute(stmt)
+
+
+def is_late_published(publish_datetime: datetime.datetime, created_at: datetime.datetime) -> bool:
+    return abs((publish_datetime.replace(tzinfo=None) - created_at).total_seconds()) > LATE_PUBLISH_SECONDS
+
+
+def record_rss_item_id_range(db: Session, db_rss_item: models.RSSItem) -> None:
+    """
+    item id 를 publish_datetime 시간 범위에 넣는다. commit 은 호출한 쪽에서 한다.
+    수집 시각과 크게 다른 item 은 범위를 넓히지 않도록 late_rss_items 에 따로 둔다.
+    """
+    if is_late_published(db_rss_item.publish_datetime, db_rss_item.created_at):
+        db.add(models.LateRSSItem(
+            rss_item_id=db_rss_item.id, publish_datetime=db_rss_item.publish_datetime.replace(tzinfo=None)))
+        return
+
+    table = models.RSSItemIdRange.__table__
+    values = {"bucket": hour_bucket(db_rss_item.publish_datetime), "min_id": db_rss_item.id, "max_id": db_rss_item.id}
+    if db.bind.dialect.name in ("mysql", "mariadb"):
+        stmt = mysql.insert(table).values(**values)
+        stmt = stmt.on_duplicate_key_update(
+            min_id=func.least(table.c.min_id, stmt.inserted.min_id),
+            max_id=func.greatest(table.c.max_id, stmt.inserted.max_id))
+    else:
+        stmt = sqlite.insert(table).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.bucket],
+            set_={"min_id": func.min(table.c.min_id, stmt.excluded.min_id),
+                  "max_id": func.max(table.c.max_id, stmt.excluded.max_id)})
+    db.execute(stmt)
+
+
+def to_datetime(value: datetime.datetime | str | None) -> Optional[datetime.datetime]:
+    if isinstance(value, str):
+        return datetime.datetime.fromisoformat(value)
+    return value
+
+
+def id_range_query(
+        start_dt: datetime.datetime | str | None, end_dt: datetime.datetime | str | None,
+) -> tuple:
+    """날짜 조건에 해당하는 (min(min_id), max(max_id)) 와 늦게 발행된 item id 조회"""
+    start_dt, end_dt = to_datetime(start_dt), to_datetime(end_dt)
+    id_range = models.RSSItemIdRange
+    late = models.LateRSSItem
+
+    range_query = select(func.min(id_range.min_id), func.max(id_range.max_id))
+    late_query = select(late.rss_item_id)
+    if start_dt:
+        range_query = range_query.filter(id_range.bucket >= hour_bucket(start_dt))
+        late_query = late_query.filter(late.publish_datetime >= start_dt.replace(tzinfo=None))
+    if end_dt:
+        range_query = range_query.filter(id_range.bucket <= end_dt.replace(tzinfo=None))
+        late_query = late_query.filter(late.publish_datetime <= end_dt.replace(tzinfo=None))
+    return range_query, late_query.limit(LATE_PUBLISH_ID_LIMIT + 1)
+
+
+def id_range_filter(min_id: Optional[int], max_id: Optional[int], late_ids: list[int],
+                    has_start: bool, has_end: bool):
+    """
+    publish_datetime 조건과 함께 거는 id 조건. 사용할 수 없으면 None.
+    clustered key 범위로 읽을 행을 줄일 뿐이고 publish_datetime 조건은 그대로 둔다.
+    """
+    # 범위에 해당하는 bucket 이 없으면 아직 기록되지 않은 item 이 있을 수 있으므로 좁히지 않는다.
+    if min_id is None or len(late_ids) > LATE_PUBLISH_ID_LIMIT:
+        return None
+
+    if has_start and has_end:
+        condition = models.RSSItem.id.between(min_id, max_id)
+    elif has_start:
+        condition = models.RSSItem.id >= min_id
+    else:
+        condition = models.RSSItem.id <= max_id
 
+    if late_ids:
+        return or_(condition, models.RSSItem.id.in_(late_ids))
+    return condition
+
+
+def get_id_range_filter(
+        db: Session, start_dt: datetime.datetime | str | None, end_dt: datetime.datetime | str | None):
+    range_query, late_query = id_range_query(start_dt, end_dt)
+    min_id, max_id = db.execute(range_query).one()
+    late_ids = list(db.scalars(late_query).all())
+    return id_range_filter(min_id, max_id, late_ids, bool(start_dt), bool(end_dt))
+
+
+def get_saved_search(db: Session, saved_search_id: int) -> models.SavedSearch | None:
+    return db.query(models.SavedSearch).filter(models.SavedSearch.id == saved_search_id).first()
+
+
+def get_saved_search_all(db: Session) -> List[Type[models.SavedSearch]]:
+    return db.query(models.SavedSearch).all()
+
+
+def create_saved_search(db: Session, saved_search_dto: schemas.SavedSearchCreateDto) -> models.SavedSearch:
+    db_saved_search = models.SavedSearch(
+        name=saved_search_dto.name,
+        query=saved_search_dto.q,
+        white_rss_id=",".join(map(str, saved_search_dto.white_rss_id)) or None,
+        black_rss_id=",".join(map(str, saved_search_dto.black_rss_id)) or None,
+    )
+    db.add(db_saved_search)
+    db.commit()
+    db.refresh(db_saved_search)
+    saved_search.matcher.invalidate()
+    return db_saved_search
+
+
+def delete_saved_search(db: Session, db_saved_search: models.SavedSearch) -> None:
+    db.delete(db_saved_search)
+    db.commit()
+    saved_search.matcher.invalidate()
+
+
+def create_saved_search_matches(db: Session, db_rss_item: models.RSSItem) -> list[int]:
+    """새 item 과 일치하는 저장 검색을 기록한다. commit 은 호출한 쪽에서 한다."""
+    saved_search_ids = saved_search.matcher.match(
+        db_rss_item.title, db_rss_item.rss_id, lambda: get_saved_search_all(db))
+    for saved_search_id in saved_search_ids:
+        db.add(models.SavedSearchMatch(saved_search_id=saved_search_id, rss_item_id=db_rss_item.id))
+    return saved_search_ids
+
+
+def rss_item_obj_to_dto(rss_id: int, rss_item_obj: dict[str, str]) -> schemas.RssItemCreateDto:
+    """feedparser entry 를 저장할 item 으로 바꾼다."""
+    rss_item = schemas.RssItemCreateDto(
+        title=rss_item_obj.get("title", "")[:1024],
+        link=rss_item_obj.get("link", "")[:768],
+        description="",
+        guid=rss_item_obj.get("link", "")[:1024],
+        pub_date=datetime.datetime.utcnow().isoformat()[:128],
+    )
+
+    try:
         rss_item.description = html.unescape(rss_item_obj.get("summary", ""))
-        rss_item.author = rss_item_obj.get("author", None)
-        rss_item.category = rss_item_obj.get("category", "")[:512] if rss_item_obj.get("category", None) else None
-        rss_item.pub_date = rss_item_obj.get("published", None)
+    except Exception as e:
+        logging.warning(f"[{rss_id:<10}]: description error: {e}")
+
+    rss_item.description = html.unescape(rss_item_obj.get("summary", ""))
+    rss_item.author = rss_item_obj.get("author", None)
+    rss_item.category = rss_item_obj.get("category", "")[:512] if rss_item_obj.get("category", None) else None
+    rss_item.pub_date = rss_item_obj.get("published", None)
+    return rss_item
+
 
-        return create_rss_item(db, rss_id, rss_item)
+def create_rss_item_from_rss_item_obj(db: Session, rss_id: int, rss_item_obj: dict[str, str]) -> Optional[RSSItem]:
+    try:
+        return create_rss_item(db, rss_id, rss_item_obj_to_dto(rss_id, rss_item_obj))
+
+    except IntegrityError:
+        # 같은 feed 를 polling 과 push 가 동시에 저장한 경우
+        db.rollback()
+        logger.info(f"[{rss_id:<10}]: rss_item already exists: {rss_item_obj.get('link', '')}")
 
     except Exception as e:
+        # flush 한 item 이 rollup, id 범위 없이 다음 commit 에 저장되지 않게 한다.
+        db.rollback()
         logger.error(f"[{rss_id:<10}]: rss_item error: {e}")
     return None
     # return False
@@ -173,6 +491,48 @@ def create_rss_response_record(db: Session, rss_id: int, link: str, body: str, s
     return db_response_record
 
 
+def item_conditions(
+        entity, title: str,
+        start_dt: Optional[datetime.datetime] = None, end_dt: Optional[datetime.datetime] = None,
+        white_rss_id: Optional[list[int]] = None, black_rss_id: Optional[list[int]] = None,
+) -> list:
+    """검색 조건. distinct_filter 의 비교 대상(alias)에도 같은 조건을 걸 수 있도록 entity 를 받는다."""
+    conditions = []
+    if title:
+        table_name = inspect(entity).selectable.name
+        conditions.append(text(f"MATCH({table_name}.title) AGAINST (:search_{table_name} IN BOOLEAN MODE)")
+                          .bindparams(**{f"search_{table_name}": ' '.join(title.split())}))
+
+    if start_dt and end_dt:
+        conditions.append(entity.publish_datetime.between(start_dt, end_dt))
+    elif start_dt:
+        conditions.append(entity.publish_datetime > start_dt)
+    elif end_dt:
+        conditions.append(entity.publish_datetime < end_dt)
+
+    if white_rss_id:
+        conditions.append(entity.rss_id.in_(white_rss_id))
+    elif black_rss_id:
+        conditions.append(~entity.rss_id.in_(black_rss_id))
+    return conditions
+
+
+def distinct_filter(
+        title: str, start_dt: Optional[datetime.datetime] = None, end_dt: Optional[datetime.datetime] = None,
+        white_rss_id: Optional[list[int]] = None, black_rss_id: Optional[list[int]] = None,
+):
+    """
+    distinct 검색. 조건에 맞는 item 중 link_hash 가 같은 더 새 item 이 있으면 뺀다(hot_window, archive 와 같이 최신 것만 남김).
+    GROUP BY 와 달리 id 순서로 읽으며 ix_rss_items_link_hash 로 확인하므로 temp table 과 filesort 가 없다.
+    """
+    newer = aliased(models.RSSItem, name="newer_items")
+    return ~exists().where(
+        newer.link_hash == models.RSSItem.link_hash,
+        newer.id > models.RSSItem.id,
+        *item_conditions(newer, title, start_dt, end_dt, white_rss_id, black_rss_id),
+    )
+
+
 def find_rss_item_by_title(
         db: Session, title: str, page_number: int, page_limit: int, distinct: bool,
         start_dt: Optional[datetime.datetime] = None, end_dt: Optional[datetime.datetime] = None,
@@ -183,29 +543,16 @@ def find_rss_item_by_title(
     https://stackoverflow.com/questions/4186062/sqlalchemy-order-by-descending
 
     """
-    query = db.query(models.RSSItem)
-
-    if title:
-        query = (query.filter(text("MATCH(title) AGAINST (:search_query IN BOOLEAN MODE)"))
-                 .params(search_query=' '.join(title.split())))
-
-    if start_dt and end_dt:
-        query = query.filter(models.RSSItem.publish_datetime.between(start_dt, end_dt))
-    elif start_dt:
-        query = query.filter(models.RSSItem.publish_datetime > start_dt)
-    elif end_dt:
-        query = query.filter(models.RSSItem.publish_datetime < end_dt)
+    query = db.query(models.RSSItem).filter(
+        *item_conditions(models.RSSItem, title, start_dt, end_dt, white_rss_id, black_rss_id))
 
-    if white_rss_id:
-        query = query.filter(models.RSSItem.rss_id.in_(white_rss_id))
-
-    elif black_rss_id:
-        query = query.filter(~models.RSSItem.rss_id.in_(black_rss_id))
+    if (start_dt or end_dt) and (id_condition := get_id_range_filter(db, start_dt, end_dt)) is not None:
+        query = query.filter(id_condition)
 
     logger.warning(f"{white_rss_id}, {black_rss_id}")
 
     if distinct:
-        query = query.group_by(models.RSSItem.link)
+        query = query.filter(distinct_filter(title, start_dt, end_dt, white_rss_id, black_rss_id))
 
     length = query.count()
 
@@ -0,0 +1,287 @@
+from __future__ import annotations
+
+import asyncio
+import datetime
+import logging
+from typing import List, Optional, Union
+
+from sqlalchemy import Select, func, null, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from . import models, schemas
+from .crud import distinct_filter, id_range_filter, id_range_query, item_conditions, same_link_condition
+from .logics import archive
+from .models import RSS, RSSItem
+
+logger = logging.getLogger(__name__)
+
+
+async def _paginate(db: AsyncSession, query: Select, page_number: int, page_limit: int) -> dict[str, list | int]:
+    length = await db.scalar(select(func.count()).select_from(query.order_by(None).subquery()))
+    if page_number > 0:
+        query = query.offset((page_number - 1) * page_limit)
+    query = query.limit(page_limit)
+    return {
+        "total_count": length,
+        "data": list((await db.scalars(query)).all())
+    }
+
+
+async def get_rss(db: AsyncSession, rss_id: int) -> RSS | None:
+    return await db.scalar(select(models.RSS).filter(models.RSS.id == rss_id).limit(1))
+
+
+async def get_rss_all(db: AsyncSession, include_not_active: bool = False) -> List[RSS]:
+    query = select(models.RSS)
+    if not include_not_active:
+        query = query.filter(models.RSS.is_active == 1)
+    return list((await db.scalars(query)).all())
+
+
+async def get_rss_by_url(db: AsyncSession, url: str) -> RSS | None:
+    return await db.scalar(select(models.RSS).filter(models.RSS.url == url).limit(1))
+
+
+async def get_rss_item_by_rss_id_and_link(db: AsyncSession, rss_id: int, link: str) -> RSSItem | None:
+    return await db.scalar(
+        select(models.RSSItem)
+        .filter(models.RSSItem.rss_id == rss_id, same_link_condition(link))
+        .limit(1))
+
+
+async def _filter_rss_items(
+        db: AsyncSession, query: Select, title: str,
+        start_dt: Optional[datetime.datetime] = None, end_dt: Optional[datetime.datetime] = None,
+        white_rss_id: Optional[list[int]] = None, black_rss_id: Optional[list[int]] = None,
+        archive_floor_id: int = 0,
+) -> Select:
+    if archive_floor_id:
+        # archive 로 옮긴 뒤 아직 지우지 못한 item 은 archive 에서 읽는다.
+        query = query.filter(models.RSSItem.id > archive_floor_id)
+
+    query = query.filter(*item_conditions(models.RSSItem, title, start_dt, end_dt, white_rss_id, black_rss_id))
+
+    if (start_dt or end_dt) and (id_condition := await get_id_range_filter(db, start_dt, end_dt)) is not None:
+        query = query.filter(id_condition)
+
+    return query
+
+
+async def find_rss_item_by_title(
+        db: AsyncSession, title: str, page_number: int, page_limit: int, distinct: bool,
+        start_dt: Optional[datetime.datetime] = None, end_dt: Optional[datetime.datetime] = None,
+        white_rss_id: Optional[list[int]] = None, black_rss_id: Optional[list[int]] = None,
+) -> dict[str, Union[int, list[RSSItem]]]:
+    segments = await archive.get_segments(db)
+    query = select(models.RSSItem).options(selectinload(models.RSSItem.rss))
+    query = await _filter_rss_items(
+        db, query, title, start_dt, end_dt, white_rss_id, black_rss_id, archive.floor_id(segments))
+
+    if distinct:
+        query = query.filter(distinct_filter(title, start_dt, end_dt, white_rss_id, black_rss_id))
+
+    query = query.order_by(models.RSSItem.id.desc())
+    found = await _paginate(db, query, page_number, page_limit)
+    archive_filter = archive.ArchiveFilter.create(title, start_dt, end_dt, white_rss_id, black_rss_id)
+    return await _merge_archive(db, found, segments, archive_filter, distinct, page_number, page_limit)
+
+
+async def _merge_archive(
+        db: AsyncSession, found: dict, segments: list[models.ArchiveSegment], archive_filter: archive.ArchiveFilter,
+        distinct: bool, page_number: int, page_limit: int) -> dict:
+    """
+    rss_items 결과 뒤에 archive 결과를 잇는다. archive 의 id 는 모두 rss_items 보다 작으므로
+    page 가 rss_items 의 끝을 넘을 때만 segment 를 읽는다. 개수는 저장된 segment 별 수로 세고,
+    행마다 봐야 하는 조건일 때만 segment index 로 센다. distinct 는 rss_items 와 archive 각각에서 묶는다.
+    """
+    segments = [segment for segment in segments if archive_filter.accept_segment(segment)]
+    if not segments:
+        return found
+
+    skip = max(max(page_number - 1, 0) * page_limit - found["total_count"], 0)
+    limit = page_limit - len(found["data"])
+    count = archive.stored_count(segments, archive_filter, distinct)
+    if count is not None and (limit <= 0 or skip >= count):
+        found["total_count"] += count
+        return found
+
+    count, rows = await asyncio.to_thread(archive.find_items, segments, archive_filter, distinct, skip, limit)
+    found["total_count"] += count
+    if rows:
+        found["data"] = list(found["data"]) + await _archive_rss_items(db, rows)
+    return found
+
+
+async def _archive_rss_items(db: AsyncSession, rows: list[dict],
+                             dto: type[schemas.RssItemResponseDto] = schemas.RssItemResponseDto) -> list:
+    """archive 의 item 은 ORM 객체로 만들지 않고 응답 형태로 바로 만든다."""
+    db_rss = {db_rss.id: schemas.RssResponseDto.model_validate(db_rss, from_attributes=True)
+              for db_rss in (await db.scalars(select(RSS).filter(RSS.id.in_({row["rss_id"] for row in rows}))))}
+    return [dto(**row, rss=db_rss[row["rss_id"]]) for row in rows if row["rss_id"] in db_rss]
+
+
+FACET_COLUMNS = {
+    "rss_id": lambda: models.RSSItem.rss_id,
+    "publish_date": lambda: func.date(models.RSSItem.publish_datetime),
+}
+
+
+async def get_rss_item_facets(
+        db: AsyncSession, facets: list[str], title: str, distinct: bool,
+        start_dt: Optional[datetime.datetime] = None, end_dt: Optional[datetime.datetime] = None,
+        white_rss_id: Optional[list[int]] = None, black_rss_id: Optional[list[int]] = None,
+) -> dict[str, dict[str, int]]:
+    """
+    find_rss_item_by_title 과 같은 조건의 facet 별 item 수.
+    facet 이 여러 개면 모두로 묶은 grouped query 한 번으로 구해 facet 별로 합친다.
+    distinct 는 검색과 같이 link 가 같은 item 중 가장 새 것만 세므로 다른 rss 의 중복도 한 번만 센다.
+    """
+    segments = await archive.get_segments(db)
+    columns = [FACET_COLUMNS[facet]() for facet in facets]
+    query = select(*columns, func.count()).group_by(*columns)
+    query = await _filter_rss_items(
+        db, query, title, start_dt, end_dt, white_rss_id, black_rss_id, archive.floor_id(segments))
+    if distinct:
+        query = query.filter(distinct_filter(title, start_dt, end_dt, white_rss_id, black_rss_id))
+
+    result = {facet: {} for facet in facets}
+    for row in (await db.execute(query)).all():
+        *keys, count = row
+        for facet, key in zip(facets, keys):
+            key = str(key)
+            result[facet][key] = result[facet].get(key, 0) + count
+
+    archive_filter = archive.ArchiveFilter.create(title, start_dt, end_dt, white_rss_id, black_rss_id)
+    if segments := [segment for segment in segments if archive_filter.accept_segment(segment)]:
+        archived = await asyncio.to_thread(archive.count_facets, segments, archive_filter, facets, distinct)
+        for facet, counts in archived.items():
+            for key, count in counts.items():
+                result[facet][key] = result[facet].get(key, 0) + count
+    return result
+
+
+async def get_id_range_filter(
+        db: AsyncSession, start_dt: datetime.datetime | str | None, end_dt: datetime.datetime | str | None):
+    range_query, late_query = id_range_query(start_dt, end_dt)
+    min_id, max_id = (await db.execute(range_query)).one()
+    late_ids = list((await db.scalars(late_query)).all())
+    return id_range_filter(min_id, max_id, late_ids, bool(start_dt), bool(end_dt))
+
+
+async def get_rss_responses(db: AsyncSession, rss_id: int, page_number: int, page_limit: int) -> dict[str, list[models.ResponseRecord] | int]:
+    query = (select(models.ResponseRecord)
+             .filter_by(rss_id=rss_id)
+             .order_by(models.ResponseRecord.id.desc()))
+    return await _paginate(db, query, page_number, page_limit)
+
+
+async def get_all_rss_responses(db: AsyncSession, page_number: int, page_limit: int) -> dict[str, list[models.ResponseRecord] | int]:
+    query = select(models.ResponseRecord).order_by(models.ResponseRecord.id.desc())
+    return await _paginate(db, query, page_number, page_limit)
+
+
+async def get_rss_items(db: AsyncSession, rss_id: int, page_number: int, page_limit: int) -> dict[str, list[RSSItem] | int]:
+    segments = await archive.get_segments(db)
+    query = (select(models.RSSItem)
+             .options(selectinload(models.RSSItem.rss))
+             .filter_by(rss_id=rss_id)
+             .order_by(models.RSSItem.id.desc()))
+    if floor_id := archive.floor_id(segments):
+        query = query.filter(models.RSSItem.id > floor_id)
+    found = await _paginate(db, query, page_number, page_limit)
+    return await _merge_archive(
+        db, found, segments, archive.ArchiveFilter.create(white_rss_id=[rss_id]), False, page_number, page_limit)
+
+
+async def get_all_rss(db: AsyncSession, page_number: int, page_limit: int) -> dict[str, list[RSS] | int]:
+    query = select(models.RSS).order_by(models.RSS.id.desc())
+    return await _paginate(db, query, page_number, page_limit)
+
+
+async def get_all_rss_search(db: AsyncSession, q: str, page_number: int, page_limit: int) -> dict[str, list[RSS] | int]:
+    filter_list = [models.RSS.name.like(f"%{word}%") for word in q.split()]
+    filter_list.extend([models.RSS.title.like(f"%{word}%") for word in q.split()])
+    filter_list.extend([models.RSS.description.like(f"%{word}%") for word in q.split()])
+    filter_list.extend([models.RSS.category.like(f"%{word}%") for word in q.split()])
+    query = (select(models.RSS)
+             .filter(or_(*filter_list))
+             .order_by(models.RSS.id.desc()))
+    return await _paginate(db, query, page_number, page_limit)
+
+
+async def get_rss_item_by_id(db: AsyncSession, rss_item_id: int) -> RSSItem | schemas.RssItemDetailDto | None:
+    """rss_items 에 없으면 id 범위가 맞는 archive segment 에서 읽는다."""
+    db_rss_item = (await db.scalars(
+        select(models.RSSItem).options(selectinload(models.RSSItem.rss)).filter_by(id=rss_item_id))).one_or_none()
+    if db_rss_item is not None:
+        return db_rss_item
+
+    segments = [segment for segment in await archive.get_segments(db)
+                if segment.min_id <= rss_item_id <= segment.max_id]
+    if not segments or (row := await asyncio.to_thread(archive.find_item, segments, rss_item_id)) is None:
+        return None
+    found = await _archive_rss_items(db, [row], schemas.RssItemDetailDto)
+    return found[0] if found else None
+
+
+async def read_all_rss_items(db: AsyncSession, page_number: int, page_limit: int) -> dict[str, list[RSSItem] | int]:
+    query = (select(models.RSSItem)
+             .options(selectinload(models.RSSItem.rss))
+             .order_by(models.RSSItem.id.desc()))
+    return await _paginate(db, query, page_number, page_limit)
+
+
+async def get_rss_items_after(
+        db: AsyncSession, after_id: int, limit: int,
+        white_rss_id: Optional[list[int]] = None, black_rss_id: Optional[list[int]] = None,
+) -> list[RSSItem]:
+    """after_id 다음 item 들(오래된 순). stream 재연결시 놓친 item 을 보낼 때 사용한다."""
+    query = select(models.RSSItem).filter(models.RSSItem.id > after_id)
+    if white_rss_id:
+        query = query.filter(models.RSSItem.rss_id.in_(white_rss_id))
+    elif black_rss_id:
+        query = query.filter(~models.RSSItem.rss_id.in_(black_rss_id))
+    return list((await db.scalars(query.order_by(models.RSSItem.id).limit(limit))).all())
+
+
+async def read_last_rss_item(db: AsyncSession, rss_id: int) -> RSSItem | None:
+    return await db.scalar(
+        select(models.RSSItem).filter_by(rss_id=rss_id).order_by(models.RSSItem.id.desc()).limit(1))
+
+
+async def get_rss_item_rollups(
+        db: AsyncSession, start_dt: datetime.datetime, end_dt: datetime.datetime,
+        rss_ids: Optional[list[int]] = None, per_feed: bool = True,
+) -> list[tuple[Optional[int], datetime.datetime, int]]:
+    """[start_dt, end_dt) 범위의 (rss_id, bucket, count). per_feed 가 아니면 rss_id 는 None"""
+    rollup = models.RSSItemRollup
+    if per_feed:
+        query = select(rollup.rss_id, rollup.bucket, rollup.count)
+    else:
+        query = select(null(), rollup.bucket, func.sum(rollup.count)).group_by(rollup.bucket)
+
+    query = query.filter(rollup.bucket >= start_dt, rollup.bucket < end_dt)
+    if rss_ids:
+        query = query.filter(rollup.rss_id.in_(rss_ids))
+    return [tuple(row) for row in (await db.execute(query.order_by(rollup.bucket))).all()]
+
+
+async def get_saved_search_all(db: AsyncSession) -> List[models.SavedSearch]:
+    return list((await db.scalars(select(models.SavedSearch).order_by(models.SavedSearch.id))).all())
+
+
+async def get_saved_search(db: AsyncSession, saved_search_id: int) -> models.SavedSearch | None:
+    return await db.scalar(select(models.SavedSearch).filter(models.SavedSearch.id == saved_search_id))
+
+
+async def get_saved_search_matches(
+        db: AsyncSession, saved_search_id: int, cursor: int, limit: int) -> list[models.SavedSearchMatch]:
+    """cursor(match id) 이후의 일치 결과. count 없이 (saved_search_id, id) index 만 사용한다."""
+    query = (select(models.SavedSearchMatch)
+             .options(selectinload(models.SavedSearchMatch.rss_item).selectinload(models.RSSItem.rss))
+             .filter(models.SavedSearchMatch.saved_search_id == saved_search_id,
+                     models.SavedSearchMatch.id > cursor)
+             .order_by(models.SavedSearchMatch.id)
+             .limit(limit))
+    return list((await db.scalars(query)).all())
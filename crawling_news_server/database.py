@@ -1,11 +1,18 @@
 import os
+import ssl
+import time
 from contextlib import contextmanager
 from dotenv import load_dotenv
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, make_url, Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession, AsyncEngine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
+from crawling_news_server.logics import metrics
+from crawling_news_server.logics.read_your_writes import should_read_primary
+
 load_dotenv()
 # https://ca.ramel.be/117
 # https://viewise.tistory.com/entry/Ubuntu-2204-Wake-on-lan-%EC%84%A4%EC%A0%95-%EC%84%9C%EB%B9%84%EC%8A%A4%EB%A1%9C-%EB%93%B1%EB%A1%9D%ED%95%98%EA%B8%B0
@@ -22,27 +29,116 @@ load_dotenv()
 # https://wikidocs.net/87477
 
 SQLALCHEMY_DATABASE_URL = os.environ.get("DB_PATH")
+ASYNC_SQLALCHEMY_DATABASE_URL = os.environ.get("ASYNC_DB_PATH")
+# 읽기 전용 replica. 없으면 primary 를 그대로 사용한다.
+SQLALCHEMY_REPLICA_DATABASE_URL = os.environ.get("DB_REPLICA_PATH")
+ASYNC_SQLALCHEMY_REPLICA_DATABASE_URL = os.environ.get("ASYNC_DB_REPLICA_PATH")
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "100"))
+DB_REPLICA_POOL_SIZE = int(os.environ.get("DB_REPLICA_POOL_SIZE", str(DB_POOL_SIZE)))
 
-connect_args = {}
-if "sqlite" in SQLALCHEMY_DATABASE_URL.split("//")[0]:
-    connect_args['check_same_thread'] = False
-else:
-    SQLALCHEMY_DATABASE_URL = SQLALCHEMY_DATABASE_URL + '?ssl=true'
-    connect_args = {
-        "ssl": {
-            "ssl_ca": "ca.pem",
-            "ssl_cert": "client-cert.pem",
-            "ssl_key": "client-key.pem"
+
+class TimedQueuePool(QueuePool):
+    """connection 을 받을 때까지 기다린 시간을 db_pool_checkout_wait_seconds 로 남긴다."""
+    metrics_name = "primary"
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            metrics.db_pool_checkout_wait_seconds.observe(time.perf_counter() - started, pool=self.metrics_name)
+
+
+class TimedAsyncAdaptedQueuePool(AsyncAdaptedQueuePool):
+    metrics_name = "async_primary"
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            metrics.db_pool_checkout_wait_seconds.observe(time.perf_counter() - started, pool=self.metrics_name)
+
+
+def create_db_engine(url: str, pool_size: int) -> Engine:
+    connect_args = {}
+    if "sqlite" in url.split("//")[0]:
+        connect_args['check_same_thread'] = False
+    else:
+        url = url + '?ssl=true'
+        connect_args = {
+            "ssl": {
+                "ssl_ca": "ca.pem",
+                "ssl_cert": "client-cert.pem",
+                "ssl_key": "client-key.pem"
+            }
         }
-    }
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    connect_args=connect_args,
-    pool_size=100
-)
+    return create_engine(
+        url,
+        connect_args=connect_args,
+        pool_size=pool_size,
+        poolclass=TimedQueuePool,
+    )
+
+
+def to_async_url(url: str) -> str:
+    """동기 드라이버 url 을 같은 DB 의 async 드라이버 url 로 바꾼다."""
+    parsed_url = make_url(url)
+    if parsed_url.get_backend_name() == "sqlite":
+        parsed_url = parsed_url.set(drivername="sqlite+aiosqlite")
+    elif parsed_url.get_backend_name() == "mysql":
+        parsed_url = parsed_url.set(drivername="mysql+aiomysql")
+    return parsed_url.render_as_string(hide_password=False)
+
+
+def create_async_connect_args(url: str) -> dict:
+    if make_url(url).get_backend_name() == "sqlite":
+        return {}
+    if not os.path.exists("ca.pem"):
+        return {}
+    ssl_context = ssl.create_default_context(cafile="ca.pem")
+    ssl_context.load_cert_chain("client-cert.pem", "client-key.pem")
+    return {"ssl": ssl_context}
+
+
+def create_async_db_engine(url: str, pool_size: int) -> AsyncEngine:
+    return create_async_engine(
+        url,
+        connect_args=create_async_connect_args(url),
+        pool_size=pool_size,
+        poolclass=TimedAsyncAdaptedQueuePool,
+    )
+
+
+if not ASYNC_SQLALCHEMY_DATABASE_URL:
+    ASYNC_SQLALCHEMY_DATABASE_URL = to_async_url(SQLALCHEMY_DATABASE_URL)
+if SQLALCHEMY_REPLICA_DATABASE_URL and not ASYNC_SQLALCHEMY_REPLICA_DATABASE_URL:
+    ASYNC_SQLALCHEMY_REPLICA_DATABASE_URL = to_async_url(SQLALCHEMY_REPLICA_DATABASE_URL)
+
+engine = create_db_engine(SQLALCHEMY_DATABASE_URL, DB_POOL_SIZE)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = create_async_db_engine(ASYNC_SQLALCHEMY_DATABASE_URL, DB_POOL_SIZE)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+if SQLALCHEMY_REPLICA_DATABASE_URL:
+    replica_engine = create_db_engine(SQLALCHEMY_REPLICA_DATABASE_URL, DB_REPLICA_POOL_SIZE)
+    replica_engine.pool.metrics_name = "replica"
+    ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=replica_engine)
+else:
+    replica_engine = engine
+    ReadSessionLocal = SessionLocal
+
+if ASYNC_SQLALCHEMY_REPLICA_DATABASE_URL:
+    async_replica_engine = create_async_db_engine(ASYNC_SQLALCHEMY_REPLICA_DATABASE_URL, DB_REPLICA_POOL_SIZE)
+    async_replica_engine.pool.metrics_name = "async_replica"
+    AsyncReadSessionLocal = async_sessionmaker(
+        async_replica_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+else:
+    async_replica_engine = async_engine
+    AsyncReadSessionLocal = AsyncSessionLocal
+
 Base = declarative_base()
 
 
@@ -55,6 +151,54 @@ def get_db():
         db.close()
 
 
+def get_read_db():
+    # 최근 쓰기를 한 클라이언트는 primary 에서 읽는다(read-your-writes).
+    db = SessionLocal() if should_read_primary() else ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def get_async_read_db():
+    session_local = AsyncSessionLocal if should_read_primary() else AsyncReadSessionLocal
+    async with session_local() as db:
+        yield db
+
+
+def _pool_status(pool) -> dict:
+    status = {"class": type(pool).__name__}
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        if method := getattr(pool, name, None):
+            status[name] = method()
+    return status
+
+
+def pool_status() -> dict:
+    """각 connection pool 의 사용량"""
+    status = {
+        "primary": _pool_status(engine.pool),
+        "async_primary": _pool_status(async_engine.pool),
+    }
+    if replica_engine is not engine:
+        status["replica"] = _pool_status(replica_engine.pool)
+    if async_replica_engine is not async_engine:
+        status["async_replica"] = _pool_status(async_replica_engine.pool)
+    return status
+
+
+def pool_checked_out() -> dict[tuple[str], int]:
+    return {(name,): status.get("checkedout", 0) for name, status in pool_status().items()}
+
+
+metrics.registry.gauge("db_pool_checked_out", "Connections checked out per pool", ("pool",), pool_checked_out)
+
+
 @contextmanager
 def get_context_db():
     db = SessionLocal()
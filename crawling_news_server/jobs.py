@@ -6,6 +6,7 @@ from time import struct_time
 from typing import Type
 
 
+from apscheduler.events import EVENT_JOB_SUBMITTED, JobSubmissionEvent
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
 from apscheduler.executors.pool import ThreadPoolExecutor, ProcessPoolExecutor
@@ -16,6 +17,10 @@ from crawling_news_server import models
 from crawling_news_server.database import get_context_db
 from crawling_news_server import crud
 from crawling_news_server import crawl
+from crawling_news_server.logics import health, hot_window, metrics, websub
+from crawling_news_server.logics.ingest import CrawlResult, fetch_and_ingest
+from crawling_news_server.logics.dispatcher import CrawlDispatcher
+from crawling_news_server.logics.single_flight import SingleFlight
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -43,6 +48,36 @@ job_defaults = {
 scheduler = BackgroundScheduler(jobstores=jobstores, executors=executors, job_defaults=job_defaults, timezone=utc)
 
 
+def on_job_submitted(event: JobSubmissionEvent) -> None:
+    """예정 시각을 남겨 실제로 시작할 때 scheduler_lag_seconds 를 잰다."""
+    if event.scheduled_run_times:
+        metrics.job_runs.planned(event.job_id, min(event.scheduled_run_times))
+
+
+scheduler.add_listener(on_job_submitted, EVENT_JOB_SUBMITTED)
+
+
+def executor_queue_depth() -> dict[tuple[str], int]:
+    """executor 에서 thread/process 를 기다리는 job 수와 dispatcher 큐 길이"""
+    depth = {}
+    for name, executor in executors.items():
+        pool = getattr(executor, "_pool", None)
+        if (work_queue := getattr(pool, "_work_queue", None)) is not None:
+            depth[(name,)] = work_queue.qsize()
+        elif (pending := getattr(pool, "_pending_work_items", None)) is not None:
+            depth[(name,)] = len(pending)
+    depth[("dispatcher",)] = dispatcher.queued_count
+    return depth
+
+
+metrics.registry.gauge(
+    "scheduler_executor_queue_depth", "Jobs waiting for an executor worker", ("executor",), executor_queue_depth)
+
+# 같은 rss 를 동시에 crawling 하지 않도록 수동/예약 crawling 이 함께 사용한다.
+CRAWL_RESULT_TTL = float(os.environ.get("CRAWL_RESULT_TTL", "30"))
+crawl_flight = SingleFlight(ttl=CRAWL_RESULT_TTL)
+
+
 def add_job_rss_crawling(db_rss: Type[models.RSS]):
     rss_id = db_rss.id
     name = db_rss.name
@@ -65,18 +100,140 @@ def add_job_rss_crawling(db_rss: Type[models.RSS]):
     )
 
 
+def add_job_health_probe():
+    scheduler.add_job(
+        probe_inactive_rss,
+        'interval',
+        id="health-probe",
+        name="health-probe",
+        seconds=health.HEALTH_PROBE_INTERVAL,
+        replace_existing=True,
+        max_instances=1,
+    )
+
+
+def add_job_hot_window_refresh():
+    if not hot_window.window.enabled:
+        return
+    scheduler.add_job(
+        refresh_hot_window,
+        'interval',
+        id="hot-window-refresh",
+        name="hot-window-refresh",
+        seconds=hot_window.HOT_WINDOW_REFRESH_SECONDS,
+        replace_existing=True,
+        max_instances=1,
+    )
+
+
+def refresh_hot_window() -> None:
+    with metrics.job_runs.track("hot-window-refresh", "hot-window-refresh"), get_context_db() as db:
+        hot_window.window.refresh_counts(db)
+
+
+def add_job_websub_renew():
+    if not websub.is_enabled():
+        return
+    scheduler.add_job(
+        renew_websub_subscriptions,
+        'interval',
+        id="websub-renew",
+        name="websub-renew",
+        seconds=websub.WEBSUB_RENEW_INTERVAL,
+        replace_existing=True,
+        max_instances=1,
+    )
+
+
+def renew_websub_subscriptions() -> None:
+    with metrics.job_runs.track("websub-renew", "websub-renew"), get_context_db() as db:
+        websub.renew_expiring(db)
+
+
+def probe_inactive_rss() -> None:
+    """연속 실패로 비활성화된 rss 를 조금씩 확인하여 회복되었으면 다시 활성화한다."""
+    with metrics.job_runs.track("health-probe", "health-probe"), get_context_db() as db:
+        db_health_list = crud.get_rss_health_due_for_probe(
+            db, datetime.datetime.utcnow(), health.HEALTH_DISABLE_AFTER, health.HEALTH_PROBE_LIMIT)
+
+        for db_health in db_health_list:
+            rss_id = db_health.rss_id
+            db_rss = crud.get_rss(db, rss_id)
+            url = db_rss.url
+            try:
+                response = crawl.fetcher.fetch(url)
+                response.raise_for_status()
+                rss_obj = crawl.rss_fixer.fix_rss(url, response.text)
+                if not rss_obj.entries:
+                    raise ValueError("no entries")
+
+            except requests.exceptions.HTTPError as http_error:
+                db_health = health.record_failure(db, rss_id, http_error, http_error.response.status_code)
+                logger.info(f"[{rss_id:<10}]({url:<55}): Probe failed, next {db_health.next_retry_at}")
+                continue
+
+            except Exception as e:
+                db_health = health.record_failure(db, rss_id, e)
+                logger.info(f"[{rss_id:<10}]({url:<55}): Probe failed, next {db_health.next_retry_at}")
+                continue
+
+            logger.info(f"[{rss_id:<10}]({url:<55}): Probe succeeded, Add job")
+            health.record_success(db, rss_id, response.status_code)
+            add_job_rss_crawling(crud.update_rss_active(db, rss_id, True))
+
+
+def crawl_once(db, rss_id: int, url: str) -> CrawlResult:
+    """진행 중이거나 방금 끝난 같은 rss 의 crawling 이 있으면 그 결과를 공유한다."""
+    result = crawl_flight.do(rss_id, fetch_and_ingest, db, rss_id, url)
+    dispatcher.set_expected_yield(rss_id, result.yield_avg)
+    return result
+
+
 def crawling(rss_id: int, url: str) -> None:
+    """예산 dispatcher 가 켜져 있으면 큐에 넣고, 아니면 바로 crawling 한다."""
+    if dispatcher.enabled:
+        dispatcher.submit(rss_id, url)
+        return
+    crawl_rss(rss_id, url)
+
+
+def start_dispatcher() -> None:
+    if not dispatcher.enabled:
+        return
+    with get_context_db() as db:
+        dispatcher.load_yields(crud.get_rss_yield_all(db))
+    dispatcher.start()
+
+
+def crawl_rss(rss_id: int, url: str) -> None:
     logger.info(f"[{rss_id:<10}]({url:<55}): Crawling...")
 
     def reschedule(base_seconds: int):
+        # push 를 받는 rss 는 안전 확인용으로만 가끔 polling 한다.
+        if websub.is_push_active(crud.get_websub_subscription(db, rss_id)):
+            base_seconds = max(base_seconds, websub.WEBSUB_POLL_SECONDS)
         scheduler.reschedule_job(f"{rss_id}", trigger='interval', seconds=base_seconds + random.randint(0, 600))
 
+    def backoff():
+        # 실패는 fetch_and_ingest 가 health 에 기록했다.
+        db_health = crud.get_or_create_rss_health(db, rss_id)
+        if health.is_disabled(db_health):
+            logger.info(f"[{rss_id:<10}]({url:<55}): {db_health.fail_count} failures, Remove job until probe succeeds")
+            crud.update_rss_active(db, rss_id, False)
+            scheduler.remove_job(f"{rss_id}")
+            return
+
+        retry_seconds = health.backoff_seconds(db_health.fail_count, crud.get_rss(db, rss_id).delay)
+        logger.info(f"[{rss_id:<10}]({url:<55}): {db_health.fail_count} failures, Retry after {retry_seconds}s")
+        scheduler.reschedule_job(f"{rss_id}", trigger='interval', seconds=retry_seconds)
+
     add_count = 0
-    with get_context_db() as db:
+    with metrics.job_runs.track(f"{rss_id}", "crawl") as run, get_context_db() as db:
 
         try:
             if not crud.get_rss(db, rss_id).is_active:
                 logging.info(f"[{rss_id:<10}]({url:<55}): Not active rss, remove job")
+                run.outcome = "inactive"
                 scheduler.remove_job(f"{rss_id}")
                 return
 
@@ -84,28 +241,19 @@ def crawling(rss_id: int, url: str) -> None:
             logging.error(f"[{rss_id:<10}]({url:<55}): Remove job Error {e}")
 
         try:
-            response = requests.get(url, headers=crawl.util.get_header(), verify=False)
-            response.raise_for_status()
-
-            text = crawl.response_to_text.response_to_text(url, response)
-            rss_obj = crawl.rss_fixer.fix_rss(url, response.text)
-
-            crud.update_rss_from_rss_dict(db, rss_id, rss_obj.get("feed", {}))
-
-            for item in rss_obj.entries:
-                if crud.get_rss_item_by_rss_id_and_link(db, rss_id, item.link) is not None:
-                    continue
-
-                if crud.create_rss_item_from_rss_item_obj(db, rss_id, item):
-                    add_count += 1
+            result = crawl_once(db, rss_id, url)
+            add_count = result.add_count
+            rss_obj = result.rss_obj
 
+            run.outcome = "added" if add_count else "no_new" if len(rss_obj.entries) else "empty"
             if add_count == 0:
                 if len(rss_obj.entries):
                     try:
                         rss_item_time: struct_time = rss_obj.entries[0].published_parsed
 
                         if (datetime.datetime.utcnow().year - rss_item_time.tm_year) > 1:
-                            crud.create_rss_response_record(db, rss_id, url, text, response.status_code)
+                            run.outcome = "stale"
+                            crud.create_rss_response_record(db, rss_id, url, result.text, result.status_code)
                             logger.info(f"[{rss_id:<10}]({url:<55}): Not Update, Remove job")
                             crud.update_rss_active(db, rss_id, False)
                             scheduler.remove_job(f"{rss_id}")
@@ -117,39 +265,39 @@ def crawling(rss_id: int, url: str) -> None:
                         reschedule(3600)
 
                 else:
-                    crud.create_rss_response_record(db, rss_id, url, "<!-- ENTRY ZERO -->" + text, response.status_code)
                     reschedule(7200)
 
             elif add_count / len(rss_obj.entries) > 0.5:
-                crud.create_rss_response_record(db, rss_id, url, text, response.status_code)
                 logger.info(f"[{rss_id:<10}]({url:<55}): Add {add_count} items")
                 reschedule(600)
 
             else:
-                crud.create_rss_response_record(db, rss_id, url, text, response.status_code)
                 logger.info(f"[{rss_id:<10}]({url:<55}): Add {add_count} items")
                 reschedule(1200)
 
         except requests.exceptions.HTTPError as http_error:
-            response: requests.Response = http_error.response
+            run.outcome = "http_error"
             logger.warning(f"[{rss_id:<10}]({url:<55}): {http_error}")
-            text = crawl.response_to_text.response_to_text(url, response)
-            crud.create_rss_response_record(db, rss_id, url, text, response.status_code)
-            reschedule(3600)
 
             if not crud.get_rss(db, rss_id).is_active:
                 logger.info(f"[{rss_id:<10}]({url:<55}): Remove job")
                 scheduler.remove_job(f"{rss_id}")
+            else:
+                backoff()
 
-        except requests.exceptions.ConnectionError:
-            logger.info(f"[{rss_id:<10}]({url:<55}): Connection Error, Remove job")
-            crud.update_rss_active(db, rss_id, False)
-            scheduler.remove_job(f"{rss_id}")
+        except requests.exceptions.RequestException as request_error:
+            run.outcome = "request_error"
+            logger.info(f"[{rss_id:<10}]({url:<55}): {type(request_error).__name__}: {request_error}")
+            backoff()
 
         except Exception as e:
+            run.outcome = "error"
             logger.warning(f"[{rss_id:<10}]({url:<55}): {e}")
             if not crud.get_rss(db, rss_id).is_active:
                 logger.info(f"[{rss_id:<10}]({url:<55}): Remove job")
                 scheduler.remove_job(f"{rss_id}")
-            pass
-    pass
+            else:
+                backoff()
+
+
+dispatcher = CrawlDispatcher(crawl_rss)
@@ -0,0 +1,63 @@
+from collections import deque
+from typing import Iterable
+
+
+class Automaton:
+    """
+    Aho-Corasick 다중 패턴 매칭.
+    패턴 수와 관계없이 본문 길이에 비례하는 시간에 포함된 패턴을 모두 찾는다.
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns: list[str] = []
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._out: list[list[int]] = [[]]
+
+        for pattern in patterns:
+            self._add(pattern)
+        self._build()
+
+    def __len__(self) -> int:
+        return len(self.patterns)
+
+    def _add(self, pattern: str) -> None:
+        if not pattern:
+            return
+        node = 0
+        for ch in pattern:
+            next_node = self._goto[node].get(ch)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][ch] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = next_node
+        self._out[node].append(len(self.patterns))
+        self.patterns.append(pattern)
+
+    def _build(self) -> None:
+        # 깊이 1 노드의 fail 은 root(0)
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, next_node in self._goto[node].items():
+                queue.append(next_node)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_node] = self._goto[fail].get(ch, 0)
+                self._out[next_node] = self._out[next_node] + self._out[self._fail[next_node]]
+
+    def search(self, text: str) -> set[int]:
+        """text 에 포함된 패턴 번호(self.patterns 의 index)"""
+        found = set()
+        node = 0
+        for ch in text:
+            while node and ch not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(ch, 0)
+            if self._out[node]:
+                found.update(self._out[node])
+        return found
@@ -0,0 +1,411 @@
+"""
+오래된 rss_items 를 월별 압축 segment 파일로 옮겨 두고 검색/목록에서 함께 조회한다.
+
+segment 하나는 두 파일로 이루어진다.
+    {path}.seg  id 내림차순 item 을 ARCHIVE_BLOCK_SIZE 개씩 JSON 으로 묶어 zlib 압축한 block 들
+    {path}.idx  id, rss_id, publish_datetime, link_hash, title 열과 block 위치(zlib 압축 JSON)
+
+조건 확인과 개수 계산은 .idx 만으로 하고, 응답할 item 이 있는 block 만 풀어 읽는다.
+rss 조건만 있는 개수는 archive_segments 에 저장한 segment 별 수(segment_counts)로 세고 .idx 를 읽지 않는다.
+"""
+import os
+import json
+import zlib
+import heapq
+import logging
+import datetime
+import threading
+from collections import OrderedDict
+from bisect import bisect_left
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Any, Iterable, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from crawling_news_server import models
+from crawling_news_server.logics.saved_search import CompiledSearch
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR = os.environ.get("ARCHIVE_DIR", os.path.join(os.getcwd(), "archive"))
+# 수집한 지 이 일수가 지난 item 을 옮긴다.
+ARCHIVE_AFTER_DAYS = int(os.environ.get("ARCHIVE_AFTER_DAYS", "365"))
+ARCHIVE_BLOCK_SIZE = int(os.environ.get("ARCHIVE_BLOCK_SIZE", "256"))
+# 메모리에 둘 segment index 수
+ARCHIVE_INDEX_CACHE_SIZE = int(os.environ.get("ARCHIVE_INDEX_CACHE_SIZE", "32"))
+
+# SQLite 가 DateTime 을 저장하는 형식과 같아 문자열 비교로 순서를 비교할 수 있다.
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+DATETIME_COLUMNS = ("publish_datetime", "created_at")
+
+
+def format_datetime(value: datetime.datetime | str | None) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.datetime.fromisoformat(value)
+    return value.replace(tzinfo=None).strftime(DATETIME_FORMAT)
+
+
+def segment_path(path: str) -> str:
+    return os.path.join(ARCHIVE_DIR, path)
+
+
+def encode_row(row: dict[str, Any]) -> dict[str, Any]:
+    row = dict(row)
+    for column in DATETIME_COLUMNS:
+        row[column] = format_datetime(row.get(column))
+    return row
+
+
+def decode_row(row: dict[str, Any]) -> dict[str, Any]:
+    for column in DATETIME_COLUMNS:
+        if row.get(column):
+            row[column] = datetime.datetime.strptime(row[column], DATETIME_FORMAT)
+    return row
+
+
+class SegmentWriter:
+    """id 내림차순으로 받은 item 을 block 단위로 압축해 한 segment 로 쓴다."""
+
+    def __init__(self, month: str, directory: str = ARCHIVE_DIR, block_size: int = ARCHIVE_BLOCK_SIZE):
+        self.month = month
+        self.directory = directory
+        self.block_size = block_size
+        self.raw_bytes = 0
+        self.compressed_bytes = 0
+        self._pending: list[dict] = []
+        self._index: dict[str, list] = {
+            "ids": [], "rss_ids": [], "publish": [], "link_hashes": [], "titles": [], "blocks": [],
+        }
+        os.makedirs(directory, exist_ok=True)
+        self._tmp_path = os.path.join(directory, f"rss_items-{month}.{os.getpid()}.tmp")
+        self._file = open(self._tmp_path, "wb")
+
+    def add(self, row: dict[str, Any]) -> None:
+        row = encode_row(row)
+        if self._index["ids"] and row["id"] >= self._index["ids"][-1]:
+            raise ValueError("rows must be in descending id order")
+        self._index["ids"].append(row["id"])
+        self._index["rss_ids"].append(row["rss_id"])
+        self._index["publish"].append(row["publish_datetime"])
+        self._index["link_hashes"].append(row["link_hash"])
+        self._index["titles"].append(row["title"])
+        self._pending.append(row)
+        if len(self._pending) >= self.block_size:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self._pending:
+            return
+        raw = json.dumps(self._pending, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        block = zlib.compress(raw, 6)
+        self._index["blocks"].append([self._file.tell(), len(block)])
+        self._file.write(block)
+        self.raw_bytes += len(raw)
+        self.compressed_bytes += len(block)
+        self._pending = []
+
+    def close(self) -> Optional[models.ArchiveSegment]:
+        """파일을 완성하고 archive_segments 에 넣을 행을 돌려준다. item 이 없으면 None"""
+        self._flush()
+        self._file.close()
+        ids = self._index["ids"]
+        if not ids:
+            os.remove(self._tmp_path)
+            return None
+
+        path = f"rss_items-{self.month}-{ids[-1]}-{ids[0]}"
+        self._index["block_size"] = self.block_size
+        index = zlib.compress(json.dumps(self._index, ensure_ascii=False, separators=(",", ":")).encode("utf-8"), 6)
+        with open(os.path.join(self.directory, path) + ".idx", "wb") as f:
+            f.write(index)
+        os.replace(self._tmp_path, os.path.join(self.directory, path) + ".seg")
+        self.compressed_bytes += len(index)
+
+        publish = [value for value in self._index["publish"] if value]
+        return models.ArchiveSegment(
+            month=self.month,
+            path=path,
+            item_count=len(ids),
+            min_id=ids[-1],
+            max_id=ids[0],
+            min_publish_datetime=datetime.datetime.strptime(min(publish), DATETIME_FORMAT) if publish else None,
+            max_publish_datetime=datetime.datetime.strptime(max(publish), DATETIME_FORMAT) if publish else None,
+        )
+
+
+@dataclass
+class SegmentIndex:
+    ids: list[int]
+    rss_ids: list[int]
+    publish: list[Optional[str]]
+    link_hashes: list[Optional[int]]
+    titles: list[str]
+    blocks: list[list[int]]
+    block_size: int
+
+    def distinct_key(self, position: int) -> int:
+        link_hash = self.link_hashes[position]
+        return link_hash if link_hash is not None else self.ids[position]
+
+    @cached_property
+    def keys(self) -> set[tuple[int, int]]:
+        """(rss_id, link_hash). index 와 함께 LRU 에 남는다."""
+        return {(rss_id, link_hash) for rss_id, link_hash in zip(self.rss_ids, self.link_hashes)
+                if link_hash is not None}
+
+    def position_of(self, item_id: int) -> Optional[int]:
+        # ids 는 내림차순
+        position = bisect_left(self.ids, -item_id, key=lambda value: -value)
+        return position if position < len(self.ids) and self.ids[position] == item_id else None
+
+
+_index_lock = threading.Lock()
+_index_cache: OrderedDict[str, SegmentIndex] = OrderedDict()
+
+
+def read_index(path: str) -> SegmentIndex:
+    """segment 파일은 바뀌지 않으므로 읽은 index 를 LRU 로 둔다."""
+    with _index_lock:
+        if (index := _index_cache.get(path)) is not None:
+            _index_cache.move_to_end(path)
+            return index
+
+    with open(segment_path(path) + ".idx", "rb") as f:
+        index = SegmentIndex(**json.loads(zlib.decompress(f.read())))
+
+    with _index_lock:
+        _index_cache[path] = index
+        while len(_index_cache) > ARCHIVE_INDEX_CACHE_SIZE:
+            _index_cache.popitem(last=False)
+    return index
+
+
+def read_rows(path: str, index: SegmentIndex, positions: Iterable[int]) -> dict[int, dict[str, Any]]:
+    """position -> item. 필요한 block 만 한 번씩 푼다."""
+    by_block: dict[int, list[int]] = {}
+    for position in positions:
+        by_block.setdefault(position // index.block_size, []).append(position)
+
+    rows = {}
+    with open(segment_path(path) + ".seg", "rb") as f:
+        for block_number, block_positions in sorted(by_block.items()):
+            offset, length = index.blocks[block_number]
+            f.seek(offset)
+            block = json.loads(zlib.decompress(f.read(length)))
+            for position in block_positions:
+                rows[position] = decode_row(block[position % index.block_size])
+    return rows
+
+
+@dataclass
+class ArchiveFilter:
+    """crud_async._filter_rss_items 와 같은 조건. title 은 MySQL BOOLEAN MODE 처럼 해석한다."""
+    title: Optional[CompiledSearch] = None
+    start_dt: Optional[str] = None
+    end_dt: Optional[str] = None
+    white_rss_id: Optional[set[int]] = None
+    black_rss_id: Optional[set[int]] = None
+
+    @classmethod
+    def create(cls, title: Optional[str] = None,
+               start_dt: datetime.datetime | str | None = None, end_dt: datetime.datetime | str | None = None,
+               white_rss_id: Optional[Iterable[int]] = None,
+               black_rss_id: Optional[Iterable[int]] = None) -> "ArchiveFilter":
+        return cls(
+            title=CompiledSearch.from_query(title) if title and title.split() else None,
+            start_dt=format_datetime(start_dt) if start_dt else None,
+            end_dt=format_datetime(end_dt) if end_dt else None,
+            white_rss_id=set(white_rss_id) if white_rss_id else None,
+            black_rss_id=set(black_rss_id) if black_rss_id and not white_rss_id else None,
+        )
+
+    def accept_segment(self, segment: models.ArchiveSegment) -> bool:
+        """segment 의 publish_datetime 범위가 날짜 조건에 닿는지"""
+        if not self.start_dt and not self.end_dt:
+            return True
+        if segment.max_publish_datetime is None:
+            return False
+        min_publish = format_datetime(segment.min_publish_datetime)
+        max_publish = format_datetime(segment.max_publish_datetime)
+        if self.start_dt and self.end_dt:
+            return max_publish >= self.start_dt and min_publish <= self.end_dt
+        if self.start_dt:
+            return max_publish > self.start_dt
+        return min_publish < self.end_dt
+
+    def accept_rss(self, rss_id: int) -> bool:
+        if self.white_rss_id and rss_id not in self.white_rss_id:
+            return False
+        return not (self.black_rss_id and rss_id in self.black_rss_id)
+
+    def accept(self, index: SegmentIndex, position: int) -> bool:
+        if not self.accept_rss(index.rss_ids[position]):
+            return False
+        if self.start_dt or self.end_dt:
+            publish = index.publish[position]
+            if publish is None:
+                return False
+            if self.start_dt and self.end_dt:
+                if not self.start_dt <= publish <= self.end_dt:
+                    return False
+            elif self.start_dt and publish <= self.start_dt:
+                return False
+            elif self.end_dt and publish >= self.end_dt:
+                return False
+        return self.title is None or self.title.match_text(index.titles[position])
+
+
+def _matches(segments: list[models.ArchiveSegment], archive_filter: ArchiveFilter,
+             distinct: bool) -> list[tuple[int, str, int]]:
+    """조건에 맞는 (id, path, position), id 내림차순. distinct 면 link 가 같은 item 중 id 가 가장 큰 것만"""
+    per_segment = []
+    for segment in segments:
+        if not archive_filter.accept_segment(segment):
+            continue
+        index = read_index(segment.path)
+        per_segment.append([(index.ids[position], segment.path, position)
+                            for position in range(len(index.ids)) if archive_filter.accept(index, position)])
+
+    merged = list(heapq.merge(*per_segment, reverse=True))
+    if not distinct:
+        return merged
+
+    seen = set()
+    result = []
+    for item_id, path, position in merged:
+        key = read_index(path).distinct_key(position)
+        if key not in seen:
+            seen.add(key)
+            result.append((item_id, path, position))
+    return result
+
+
+def stored_count(segments: list[models.ArchiveSegment], archive_filter: ArchiveFilter,
+                 distinct: bool) -> Optional[int]:
+    """
+    archive_segments 에 저장한 수로 센 조건에 맞는 item 수.
+    행마다 봐야 하는 조건(title, 날짜, rss 조건이 있는 distinct)이거나 수가 없는 segment 가 있으면 None
+    """
+    if archive_filter.title or archive_filter.start_dt or archive_filter.end_dt:
+        return None
+    if distinct and (archive_filter.white_rss_id or archive_filter.black_rss_id):
+        return None
+    if any(segment.rss_counts is None or segment.distinct_count is None for segment in segments):
+        return None
+    if distinct:
+        return sum(segment.distinct_count for segment in segments)
+    return sum(count for segment in segments for rss_id, count in json.loads(segment.rss_counts).items()
+               if archive_filter.accept_rss(int(rss_id)))
+
+
+def find_items(segments: list[models.ArchiveSegment], archive_filter: ArchiveFilter, distinct: bool,
+               skip: int, limit: int) -> tuple[int, list[dict[str, Any]]]:
+    """조건에 맞는 archive item 수와 id 내림차순 skip 번째부터 limit 개"""
+    matches = _matches(segments, archive_filter, distinct)
+    page = matches[skip:skip + limit] if limit > 0 else []
+
+    by_path: dict[str, list[int]] = {}
+    for _, path, position in page:
+        by_path.setdefault(path, []).append(position)
+    rows = {path: read_rows(path, read_index(path), positions) for path, positions in by_path.items()}
+    return len(matches), [rows[path][position] for _, path, position in page]
+
+
+def count_facets(segments: list[models.ArchiveSegment], archive_filter: ArchiveFilter,
+                 facets: list[str], distinct: bool) -> dict[str, dict[str, int]]:
+    """crud_async.get_rss_item_facets 의 archive 부분. distinct 는 archive 안에서 가장 새 item 만 센다."""
+    result: dict[str, dict[str, int]] = {facet: {} for facet in facets}
+    for _, path, position in _matches(segments, archive_filter, distinct):
+        index = read_index(path)
+        for facet in facets:
+            if facet == "rss_id":
+                key = str(index.rss_ids[position])
+            else:
+                key = str(index.publish[position][:10]) if index.publish[position] else "None"
+            result[facet][key] = result[facet].get(key, 0) + 1
+    return result
+
+
+def segment_counts(paths: list[str]) -> dict[str, tuple[dict[int, int], int]]:
+    """
+    segment 별 (rss_id 별 item 수, distinct 수). distinct 는 link 가 같은 item 중 archive 전체에서 id 가 가장 큰
+    item 이 있는 segment 에 센다. 새 segment 가 이전 segment 의 distinct 수를 바꾸므로 전체를 함께 센다.
+    """
+    rss_counts: dict[str, dict[int, int]] = {}
+    newest: dict[int, tuple[int, str]] = {}
+    for path in paths:
+        index = read_index(path)
+        counts = rss_counts[path] = {}
+        for position, rss_id in enumerate(index.rss_ids):
+            counts[rss_id] = counts.get(rss_id, 0) + 1
+            key = index.distinct_key(position)
+            if key not in newest or newest[key][0] < index.ids[position]:
+                newest[key] = (index.ids[position], path)
+
+    distinct_counts = dict.fromkeys(paths, 0)
+    for _, path in newest.values():
+        distinct_counts[path] += 1
+    return {path: (rss_counts[path], distinct_counts[path]) for path in paths}
+
+
+def summarize(segments: list[models.ArchiveSegment]) -> dict[str, Any]:
+    """전체 archive 의 item 수, rss 별 item 수, link 묶음 수, 가장 늦은 publish_datetime"""
+    if any(segment.rss_counts is None or segment.distinct_count is None for segment in segments):
+        counts = segment_counts([segment.path for segment in segments])
+    else:
+        counts = {segment.path: ({int(rss_id): count for rss_id, count in json.loads(segment.rss_counts).items()},
+                                 segment.distinct_count) for segment in segments}
+    rss_counts: dict[int, int] = {}
+    for segment_rss_counts, _ in counts.values():
+        for rss_id, count in segment_rss_counts.items():
+            rss_counts[rss_id] = rss_counts.get(rss_id, 0) + count
+    publish = [segment.max_publish_datetime for segment in segments if segment.max_publish_datetime]
+    return {
+        "total_count": sum(rss_counts.values()),
+        "rss_counts": rss_counts,
+        "distinct_count": sum(distinct_count for _, distinct_count in counts.values()),
+        "max_publish_datetime": max(publish) if publish else None,
+    }
+
+
+def archived_keys(segments: list[models.ArchiveSegment]) -> set[tuple[int, int]]:
+    """archive 에 있는 (rss_id, link_hash). 다시 수집할 때 이미 옮긴 item 을 건너뛰는 데 쓴다."""
+    keys = set()
+    for segment in segments:
+        keys.update(read_index(segment.path).keys)
+    return keys
+
+
+def is_archived(segments: list[models.ArchiveSegment], rss_id: int, link_hash: int) -> bool:
+    """수집한 item 이 archive 에 있는지. rss_id 의 item 이 없는 segment 는 index 를 읽지 않는다."""
+    for segment in segments:
+        if segment.rss_counts is not None and str(rss_id) not in json.loads(segment.rss_counts):
+            continue
+        if (rss_id, link_hash) in read_index(segment.path).keys:
+            return True
+    return False
+
+
+def find_item(segments: list[models.ArchiveSegment], item_id: int) -> Optional[dict[str, Any]]:
+    """id 범위가 item_id 를 포함하는 segment 에서 item 하나를 읽는다."""
+    for segment in segments:
+        if not segment.min_id <= item_id <= segment.max_id:
+            continue
+        index = read_index(segment.path)
+        if (position := index.position_of(item_id)) is not None:
+            return read_rows(segment.path, index, [position])[position]
+    return None
+
+
+def floor_id(segments: list[models.ArchiveSegment]) -> int:
+    """이 id 이하의 item 은 archive 에만 있다."""
+    return max((segment.max_id for segment in segments), default=0)
+
+
+async def get_segments(db: AsyncSession) -> list[models.ArchiveSegment]:
+    return list((await db.scalars(
+        select(models.ArchiveSegment).order_by(models.ArchiveSegment.max_id.desc()))).all())
@@ -0,0 +1,92 @@
+import os
+import asyncio
+import logging
+import threading
+from typing import Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# client 별로 쌓아둘 수 있는 event 수. 넘치면 그 client 는 끊는다.
+SSE_BUFFER_SIZE = int(os.environ.get("SSE_BUFFER_SIZE", "256"))
+
+
+class Subscriber:
+    """event loop 에서 소비하는 client 하나. 발행은 어느 thread 에서나 가능하다."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, maxsize: int,
+                 white_rss_id: Optional[Iterable[int]] = None, black_rss_id: Optional[Iterable[int]] = None):
+        self.loop = loop
+        self.queue: asyncio.Queue[tuple[int, str]] = asyncio.Queue(maxsize)
+        self.white_rss_id = set(white_rss_id) if white_rss_id else None
+        self.black_rss_id = set(black_rss_id) if black_rss_id else None
+        self.dropped = False
+
+    def accept(self, rss_id: int) -> bool:
+        if self.white_rss_id:
+            return rss_id in self.white_rss_id
+        if self.black_rss_id:
+            return rss_id not in self.black_rss_id
+        return True
+
+    def _put(self, event: tuple[int, str]) -> None:
+        if self.dropped:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped = True
+
+
+class ItemBroadcaster:
+    """
+    새로 저장된 item 을 연결된 모든 client 에게 보낸다.
+    item 은 한 번만 직렬화하고, client 마다 DB 를 조회하지 않는다.
+    """
+
+    def __init__(self, buffer_size: int = SSE_BUFFER_SIZE):
+        self.buffer_size = buffer_size
+        self.published_count = 0
+        self.dropped_count = 0
+        self._lock = threading.Lock()
+        self._subscribers: set[Subscriber] = set()
+
+    def has_subscribers(self) -> bool:
+        return bool(self._subscribers)
+
+    def subscribe(self, white_rss_id: Optional[Iterable[int]] = None,
+                  black_rss_id: Optional[Iterable[int]] = None) -> Subscriber:
+        """event loop 안에서 호출한다."""
+        subscriber = Subscriber(asyncio.get_running_loop(), self.buffer_size, white_rss_id, black_rss_id)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        with self._lock:
+            self._subscribers.discard(subscriber)
+            if subscriber.dropped:
+                self.dropped_count += 1
+
+    def publish(self, item_id: int, rss_id: int, data: str) -> None:
+        with self._lock:
+            subscribers = [subscriber for subscriber in self._subscribers if subscriber.accept(rss_id)]
+            self.published_count += 1
+
+        for subscriber in subscribers:
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber._put, (item_id, data))
+            except RuntimeError:
+                # event loop 가 이미 닫힘
+                self.unsubscribe(subscriber)
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                "subscribers": len(self._subscribers),
+                "buffered": sum(subscriber.queue.qsize() for subscriber in self._subscribers),
+                "published_count": self.published_count,
+                "dropped_count": self.dropped_count,
+            }
+
+
+broadcaster = ItemBroadcaster()
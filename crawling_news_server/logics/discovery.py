@@ -0,0 +1,317 @@
+"""
+여러 site 에서 rss 를 한꺼번에 찾는다.
+
+1. site 의 html 을 가져와 <link rel="alternate"> 와 본문의 rss/feed 링크를 후보로 모은다.
+2. 후보를 모두 가져와 feedparser 로 읽어 보고, feed 가 아니면 버린다.
+   site 본문에서 찾은 후보가 html(예: "RSS 서비스" 안내 page)이면 그 page 의 후보를 한 번 더 확인한다.
+3. redirect 후 url 과 내용이 같은 feed 는 하나로 합치고 점수 순으로 돌려준다.
+
+fetch 는 모두 DISCOVERY_CONCURRENCY 개 thread 의 pool 에서 실행하고 host 당 동시 요청은 DISCOVERY_PER_HOST 개로 제한한다.
+"""
+import os
+import time
+import asyncio
+import logging
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Optional
+from urllib.parse import urlsplit
+
+import requests
+
+from crawling_news_server import crawl
+from crawling_news_server.crawl import extract_rss_data
+from crawling_news_server.crawl.canonical_link import canonicalize_link
+
+logger = logging.getLogger(__name__)
+
+DISCOVERY_CONCURRENCY = int(os.environ.get("DISCOVERY_CONCURRENCY", "32"))
+DISCOVERY_PER_HOST = int(os.environ.get("DISCOVERY_PER_HOST", "4"))
+DISCOVERY_MAX_SITES = int(os.environ.get("DISCOVERY_MAX_SITES", "500"))
+# site(또는 안내 page) 하나에서 확인하는 최대 후보 수
+DISCOVERY_MAX_CANDIDATES = int(os.environ.get("DISCOVERY_MAX_CANDIDATES", "30"))
+DISCOVERY_FETCH_TIMEOUT = float(os.environ.get("DISCOVERY_FETCH_TIMEOUT", "20"))
+DISCOVERY_MAX_BYTES = int(os.environ.get("DISCOVERY_MAX_BYTES", str(5 * 1024 * 1024)))
+DISCOVERY_DEFAULT_DELAY = 60
+
+SOURCE_SCORES = {"link": 3, "index": 2, "body": 1}
+
+_executor = ThreadPoolExecutor(max_workers=DISCOVERY_CONCURRENCY, thread_name_prefix="discovery")
+
+
+@dataclass
+class Candidate:
+    url: str
+    site: str
+    # link: <link rel="alternate">, body: site 본문의 링크, index: 본문 링크가 가리킨 안내 page 의 링크
+    source: str
+
+
+@dataclass
+class DiscoveredFeed:
+    url: str
+    site: str
+    source: str
+    format: str
+    title: str
+    description: str
+    link: str
+    category: str
+    entry_count: int
+    latest_entry_at: Optional[datetime.datetime]
+    bozo: bool
+    # 같은 feed 인지 비교하는 값: feed link 와 앞쪽 entry link
+    fingerprint: tuple = field(repr=False, default=())
+    registered: bool = False
+
+    @property
+    def score(self) -> float:
+        """<link> 로 알린 feed, 같은 site, entry 가 많고 최근 entry 가 있는 feed 를 앞에 둔다."""
+        score = SOURCE_SCORES[self.source]
+        if _same_site(self.url, self.site):
+            score += 1
+        score += min(self.entry_count, 20) / 20
+        if self.latest_entry_at is not None:
+            age = datetime.datetime.now() - self.latest_entry_at
+            if age <= datetime.timedelta(days=7):
+                score += 1
+            elif age <= datetime.timedelta(days=30):
+                score += 0.5
+        if self.bozo:
+            score -= 0.5
+        return round(score, 3)
+
+    def to_dict(self) -> dict:
+        return {
+            "url": self.url,
+            "site": self.site,
+            "source": self.source,
+            "score": self.score,
+            "format": self.format,
+            "entry_count": self.entry_count,
+            "latest_entry_at": self.latest_entry_at,
+            "bozo": self.bozo,
+            "registered": self.registered,
+            # POST /api/v2/rss 에 그대로 보낼 수 있는 값
+            "rss": {
+                "name": self.title,
+                "url": self.url,
+                "title": self.title,
+                "description": self.description,
+                "link": self.link,
+                "delay": DISCOVERY_DEFAULT_DELAY,
+                "category": self.category,
+            },
+        }
+
+
+@dataclass
+class SiteResult:
+    url: str
+    error: Optional[str] = None
+    candidate_count: int = 0
+    # 중복을 합친 뒤 이 site 에서 찾은 feed 수
+    feed_count: int = 0
+
+    def to_dict(self) -> dict:
+        return {
+            "url": self.url,
+            "error": self.error,
+            "candidate_count": self.candidate_count,
+            "feed_count": self.feed_count,
+        }
+
+
+def _host(url: str) -> str:
+    host = (urlsplit(url).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+def _same_site(url: str, site: str) -> bool:
+    host, site_host = _host(url), _host(site)
+    return bool(host and site_host) and (
+        host == site_host or host.endswith("." + site_host) or site_host.endswith("." + host))
+
+
+def _candidate_order(url: str) -> int:
+    """후보가 많을 때 feed 일 가능성이 높은 url 을 먼저 확인한다."""
+    path = urlsplit(url).path.lower()
+    if path.endswith((".xml", ".rss", ".atom")) or "/rss/" in path or "/feed/" in path:
+        return 0
+    if "rss" in path or "feed" in path:
+        return 1
+    return 2
+
+
+def _looks_like_html(text: str) -> bool:
+    head = text[:1024].lstrip().lower()
+    return head.startswith("<!doctype html") or "<html" in head
+
+
+def _latest_entry_at(entries: list) -> Optional[datetime.datetime]:
+    dates = [datetime.datetime(*parsed[:6]) for entry in entries
+             if (parsed := entry.get("published_parsed") or entry.get("updated_parsed"))]
+    return max(dates) if dates else None
+
+
+def parse_feed(candidate: Candidate, url: str, text: str) -> Optional[DiscoveredFeed]:
+    """feed 로 읽히지 않으면 None"""
+    rss_obj = crawl.rss_fixer.fix_rss(url, text)
+    if not rss_obj.get("version") and not rss_obj.entries:
+        return None
+
+    feed = rss_obj.get("feed", {})
+    title = feed.get("title") or url
+    if (subtitle := feed.get("subtitle")) and subtitle not in title:
+        title = f"{title}({subtitle})"
+    tags = feed.get("tags") or []
+    entry_links = tuple(canonicalize_link(entry.link) for entry in rss_obj.entries[:5] if entry.get("link"))
+    return DiscoveredFeed(
+        url=url,
+        site=candidate.site,
+        source=candidate.source,
+        format=rss_obj.get("version") or "unknown",
+        title=title,
+        description=feed.get("description") or "",
+        link=feed.get("link") or candidate.site,
+        category=(tags[0].get("term") if tags else None) or "",
+        entry_count=len(rss_obj.entries),
+        latest_entry_at=_latest_entry_at(rss_obj.entries),
+        bozo=bool(rss_obj.get("bozo")),
+        fingerprint=(canonicalize_link(feed.get("link") or ""), entry_links) if entry_links else (),
+    )
+
+
+def extract_candidates(url: str, html: str, site: str, source: str) -> list[Candidate]:
+    soup = extract_rss_data.create_beautifulsoup(html)
+    link_urls = extract_rss_data.extract_rss_url_from_link_tag(url, soup)
+    body_urls = sorted(set(extract_rss_data.extract_rss_url_from_body(url, soup)) - set(link_urls),
+                       key=_candidate_order)
+    candidates = [Candidate(link_url, site, "link" if source == "body" else source) for link_url in link_urls]
+    candidates += [Candidate(body_url, site, source) for body_url in body_urls]
+    return [candidate for candidate in candidates
+            if not extract_rss_data.is_ignore_url(candidate.url)][:DISCOVERY_MAX_CANDIDATES]
+
+
+def read_response(candidate: Candidate, response: requests.Response,
+                  source: Optional[str]) -> tuple[Optional[DiscoveredFeed], list[Candidate]]:
+    """
+    executor 에서 실행한다. 본문이 feed 면 (feed, []), html 이면 (None, html 안의 source 후보).
+    source 가 None 이면 html 의 후보는 찾지 않는다.
+    """
+    text = crawl.response_to_text.response_to_text(candidate.url, response)
+    if not _looks_like_html(text):
+        return parse_feed(candidate, response.url, text), []
+    if source is None:
+        return None, []
+    html = extract_rss_data.decode_html(response)
+    return None, extract_candidates(response.url, html, candidate.site, source)
+
+
+class Discovery:
+    """요청 하나의 상태. 이미 확인한 url 은 다른 site 에서 나와도 다시 가져오지 않는다."""
+
+    def __init__(self):
+        self.fetch_count = 0
+        self._seen: set[str] = set()
+        self._host_limits: dict[str, asyncio.Semaphore] = {}
+
+    async def fetch(self, url: str) -> requests.Response:
+        host = _host(url)
+        if (limit := self._host_limits.get(host)) is None:
+            limit = self._host_limits[host] = asyncio.Semaphore(DISCOVERY_PER_HOST)
+        async with limit:
+            self.fetch_count += 1
+            loop = asyncio.get_running_loop()
+            response = await loop.run_in_executor(_executor, lambda: crawl.fetcher.fetch(
+                url, budget=DISCOVERY_FETCH_TIMEOUT, max_bytes=DISCOVERY_MAX_BYTES))
+        response.raise_for_status()
+        return response
+
+    def visit(self, url: str) -> bool:
+        """처음 보는 url 이면 True"""
+        key = canonicalize_link(url)
+        if key in self._seen:
+            return False
+        self._seen.add(key)
+        return True
+
+    async def check(self, candidate: Candidate) -> list[DiscoveredFeed]:
+        try:
+            response = await self.fetch(candidate.url)
+        except requests.exceptions.RequestException as e:
+            logger.debug(f"discovery {candidate.url}: {type(e).__name__}: {e}")
+            return []
+
+        # feed 가 아닌 본문 링크는 site 의 rss 안내 page 라고 보고 그 안의 후보를 확인한다.
+        loop = asyncio.get_running_loop()
+        try:
+            feed, candidates = await loop.run_in_executor(
+                _executor, read_response, candidate, response, "index" if candidate.source == "body" else None)
+        except Exception as e:
+            # 깨진 본문 하나 때문에 다른 후보를 버리지 않는다.
+            logger.warning(f"discovery {candidate.url}: {type(e).__name__}: {e}")
+            return []
+        if feed:
+            return [feed]
+        return await self.check_all(candidates)
+
+    async def check_all(self, candidates: list[Candidate]) -> list[DiscoveredFeed]:
+        candidates = [candidate for candidate in candidates if self.visit(candidate.url)]
+        results = await asyncio.gather(*[self.check(candidate) for candidate in candidates])
+        return [feed for feeds in results for feed in feeds]
+
+    async def discover_site(self, site: str) -> tuple[SiteResult, list[DiscoveredFeed]]:
+        result = SiteResult(site)
+        try:
+            response = await self.fetch(site)
+        except requests.exceptions.RequestException as e:
+            result.error = f"{type(e).__name__}: {e}"
+            return result, []
+
+        self.visit(response.url)
+        # site 대신 feed url 을 넣었으면 feed 로 읽는다.
+        loop = asyncio.get_running_loop()
+        try:
+            feed, candidates = await loop.run_in_executor(
+                _executor, read_response, Candidate(site, site, "link"), response, "body")
+        except Exception as e:
+            result.error = f"{type(e).__name__}: {e}"
+            return result, []
+        if feed:
+            return result, [feed]
+        result.candidate_count = len(candidates)
+        return result, await self.check_all(candidates)
+
+
+def rank(feeds: list[DiscoveredFeed]) -> list[DiscoveredFeed]:
+    """url(redirect 후) 또는 내용이 같은 feed 는 점수가 높은 하나만 남긴다."""
+    ranked = []
+    seen_urls, seen_fingerprints = set(), set()
+    for feed in sorted(feeds, key=lambda f: f.score, reverse=True):
+        key = canonicalize_link(feed.url)
+        if key in seen_urls or (feed.fingerprint and feed.fingerprint in seen_fingerprints):
+            continue
+        seen_urls.add(key)
+        if feed.fingerprint:
+            seen_fingerprints.add(feed.fingerprint)
+        ranked.append(feed)
+    return ranked
+
+
+async def discover(sites: list[str]) -> tuple[list[SiteResult], list[DiscoveredFeed]]:
+    started = time.perf_counter()
+    discovery = Discovery()
+    sites = list(dict.fromkeys(site.strip() for site in sites if site.strip()))
+    for site in sites:
+        discovery.visit(site)
+
+    results = await asyncio.gather(*[discovery.discover_site(site) for site in sites])
+    site_results = [site_result for site_result, _ in results]
+    feeds = rank([feed for _, site_feeds in results for feed in site_feeds])
+    for site_result in site_results:
+        site_result.feed_count = sum(feed.site == site_result.url for feed in feeds)
+    logger.info(f"discovery: {len(sites)} sites, {discovery.fetch_count} fetches, {len(feeds)} feeds "
+                f"in {time.perf_counter() - started:.1f}s")
+    return site_results, feeds
@@ -0,0 +1,155 @@
+import os
+import time
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# 0 이면 dispatcher 를 사용하지 않고 job 에서 바로 crawling 한다.
+CRAWL_BUDGET_PER_MINUTE = float(os.environ.get("CRAWL_BUDGET_PER_MINUTE", "0"))
+CRAWL_BUDGET_CONCURRENCY = int(os.environ.get("CRAWL_BUDGET_CONCURRENCY", "20"))
+# poll 1회당 새 item 수 평균의 지수이동평균 가중치
+CRAWL_YIELD_ALPHA = float(os.environ.get("CRAWL_YIELD_ALPHA", "0.3"))
+# 처음 보는 rss 의 기대 수집량
+CRAWL_YIELD_PRIOR = float(os.environ.get("CRAWL_YIELD_PRIOR", "1"))
+# 대기 시간이 이 값(초)만큼 늘어날 때마다 기대 수집량 1 만큼 우선순위를 올린다(기아 방지).
+CRAWL_YIELD_AGING = float(os.environ.get("CRAWL_YIELD_AGING", "1800"))
+
+
+class TokenBucket:
+    """분당 rate 개의 토큰을 채우는 token bucket"""
+
+    def __init__(self, rate_per_minute: float, capacity: float):
+        self.rate = rate_per_minute / 60
+        self.capacity = max(capacity, 1)
+        self.tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+@dataclass
+class QueuedCrawl:
+    rss_id: int
+    url: str
+    queued_at: float
+
+
+class CrawlDispatcher:
+    """
+    예정 시각이 된 rss 를 큐에 모으고 전역 예산(분당 fetch 수, 동시 fetch 수) 안에서
+    기대 수집량이 높은 rss 부터 crawling 한다.
+    """
+
+    def __init__(self, handler: Callable[[int, str], None],
+                 per_minute: float = CRAWL_BUDGET_PER_MINUTE, concurrency: int = CRAWL_BUDGET_CONCURRENCY):
+        self.handler = handler
+        self.per_minute = per_minute
+        self.concurrency = concurrency
+        self.dispatched_count = 0
+        self._bucket = TokenBucket(per_minute, concurrency) if per_minute > 0 else None
+        self._cond = threading.Condition()
+        self._queue: dict[int, QueuedCrawl] = {}
+        self._running: set[int] = set()
+        self._yields: dict[int, float] = {}
+        self._workers: list[threading.Thread] = []
+
+    @property
+    def enabled(self) -> bool:
+        return self.per_minute > 0
+
+    @property
+    def queued_count(self) -> int:
+        return len(self._queue)
+
+    def expected_yield(self, rss_id: int) -> float:
+        return self._yields.get(rss_id, CRAWL_YIELD_PRIOR)
+
+    def set_expected_yield(self, rss_id: int, value: float) -> None:
+        self._yields[rss_id] = value
+
+    def load_yields(self, yields: dict[int, float]) -> None:
+        self._yields.update(yields)
+
+    def score(self, item: QueuedCrawl, now: float) -> float:
+        return self.expected_yield(item.rss_id) + (now - item.queued_at) / CRAWL_YIELD_AGING
+
+    def submit(self, rss_id: int, url: str) -> bool:
+        """이미 큐에 있거나 실행 중이면 무시한다."""
+        with self._cond:
+            if rss_id in self._queue or rss_id in self._running:
+                return False
+            self._queue[rss_id] = QueuedCrawl(rss_id, url, time.monotonic())
+            self._cond.notify()
+        return True
+
+    def _pop_best(self) -> QueuedCrawl:
+        now = time.monotonic()
+        best = max(self._queue.values(), key=lambda item: self.score(item, now))
+        del self._queue[best.rss_id]
+        self._running.add(best.rss_id)
+        return best
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                item = self._pop_best()
+                self.dispatched_count += 1
+
+            # 토큰은 꺼낸 job 이 있을 때만 쓴다. 빈 큐를 보고 토큰만 쓰고 돌아가면 예산이 줄어든다.
+            self._bucket.acquire()
+
+            try:
+                self.handler(item.rss_id, item.url)
+            except Exception as e:
+                logger.error(f"[{item.rss_id:<10}]({item.url:<55}): dispatch error {e}")
+            finally:
+                with self._cond:
+                    self._running.discard(item.rss_id)
+
+    def start(self) -> None:
+        if not self.enabled or self._workers:
+            return
+        for i in range(self.concurrency):
+            worker = threading.Thread(target=self._run, name=f"crawl-dispatcher-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def status(self, top: Optional[int] = 20) -> dict:
+        now = time.monotonic()
+        with self._cond:
+            queued = sorted(self._queue.values(), key=lambda item: self.score(item, now), reverse=True)
+            running = list(self._running)
+        return {
+            "enabled": self.enabled,
+            "per_minute": self.per_minute,
+            "concurrency": self.concurrency,
+            "dispatched_count": self.dispatched_count,
+            "queued_count": len(queued),
+            "running": running,
+            "queued": [{
+                "rss_id": item.rss_id,
+                "url": item.url,
+                "expected_yield": round(self.expected_yield(item.rss_id), 3),
+                "waiting": round(now - item.queued_at, 1),
+                "score": round(self.score(item, now), 3),
+            } for item in queued[:top]],
+        }
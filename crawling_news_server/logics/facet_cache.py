@@ -0,0 +1,116 @@
+import os
+import time
+import datetime
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Hashable, Optional
+
+FACET_CACHE_SIZE = int(os.environ.get("FACET_CACHE_SIZE", "1024"))
+# 다른 프로세스에서 저장된 item 은 알 수 없으므로 이 시간(초)이 지나면 다시 계산한다.
+FACET_CACHE_SECONDS = int(os.environ.get("FACET_CACHE_SECONDS", "60"))
+# 계산 중 들어온 item 이 결과에 영향을 주는지 확인하려고 남겨 두는 최근 invalidate 수
+FACET_CACHE_EVENTS = 1024
+
+
+def normalize_key(facets: list[str], title: Optional[str], distinct: bool,
+                  start_dt: Optional[str], end_dt: Optional[str],
+                  white_rss_id: Optional[list[int]], black_rss_id: Optional[list[int]]) -> Hashable:
+    """같은 결과가 나오는 요청이 같은 key 가 되도록 정리한다."""
+    return (
+        tuple(sorted(set(facets))),
+        ' '.join(title.lower().split()) if title else "",
+        distinct,
+        start_dt or "",
+        end_dt or "",
+        tuple(sorted(set(white_rss_id or ()))),
+        tuple(sorted(set(black_rss_id or ()))),
+    )
+
+
+def _to_datetime(value: str) -> Optional[datetime.datetime]:
+    try:
+        return datetime.datetime.fromisoformat(value).replace(tzinfo=None)
+    except ValueError:
+        return None
+
+
+def affects(key: Hashable, rss_id: Optional[int], publish_datetime: Optional[datetime.datetime]) -> bool:
+    """rss_id, publish_datetime 인 새 item 이 key 의 결과를 바꿀 수 있는지. 검색어는 보지 않는다."""
+    if rss_id is None:
+        return True
+    _, _, _, start_dt, end_dt, white_rss_id, black_rss_id = key
+    if white_rss_id and rss_id not in white_rss_id:
+        return False
+    if not white_rss_id and black_rss_id and rss_id in black_rss_id:
+        return False
+    if publish_datetime is not None:
+        publish_datetime = publish_datetime.replace(tzinfo=None)
+        if start_dt and (start := _to_datetime(start_dt)) and publish_datetime < start:
+            return False
+        if end_dt and (end := _to_datetime(end_dt)) and publish_datetime > end:
+            return False
+    return True
+
+
+class FacetCache:
+    """
+    정규화한 검색 조건별 facet 결과 LRU cache.
+    새 item 이 저장되면 그 item 의 rss_id, publish_datetime 이 조건에 들 수 있는 결과만 버린다.
+    """
+
+    def __init__(self, maxsize: int = FACET_CACHE_SIZE, ttl: float = FACET_CACHE_SECONDS):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.version = 0
+        self.hit_count = 0
+        self.miss_count = 0
+        self._lock = threading.Lock()
+        self._data: OrderedDict[Hashable, tuple[int, float, Any]] = OrderedDict()
+        # (version, rss_id, publish_datetime)
+        self._events: deque[tuple[int, Optional[int], Optional[datetime.datetime]]] = deque(maxlen=FACET_CACHE_EVENTS)
+
+    def invalidate(self, rss_id: Optional[int] = None, publish_datetime: Optional[datetime.datetime] = None) -> None:
+        """rss_id 가 없으면 모두 버린다."""
+        with self._lock:
+            self.version += 1
+            self._events.append((self.version, rss_id, publish_datetime))
+            for key in [key for key in self._data if affects(key, rss_id, publish_datetime)]:
+                del self._data[key]
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            found = self._data.get(key)
+            if found is None or time.monotonic() - found[1] > self.ttl:
+                self._data.pop(key, None)
+                self.miss_count += 1
+                return None
+            self._data.move_to_end(key)
+            self.hit_count += 1
+            return found[2]
+
+    def set(self, key: Hashable, value: Any, version: int) -> None:
+        """계산을 시작할 때의 version 으로 저장해, 계산 중 결과에 영향을 주는 item 이 들어왔으면 버린다."""
+        with self._lock:
+            if version != self.version:
+                if not self._events or self._events[0][0] > version + 1:
+                    # 계산 중 들어온 item 을 모두 알 수 없다.
+                    return
+                if any(affects(key, rss_id, publish_datetime)
+                       for event_version, rss_id, publish_datetime in self._events if event_version > version):
+                    return
+            self._data[key] = (version, time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "version": self.version,
+                "hit_count": self.hit_count,
+                "miss_count": self.miss_count,
+            }
+
+
+facet_cache = FacetCache()
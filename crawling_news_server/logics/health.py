@@ -0,0 +1,49 @@
+import os
+import logging
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from crawling_news_server import crud, models
+
+logger = logging.getLogger(__name__)
+
+HEALTH_BACKOFF_BASE = int(os.environ.get("HEALTH_BACKOFF_BASE", "600"))
+HEALTH_BACKOFF_CAP = int(os.environ.get("HEALTH_BACKOFF_CAP", "86400"))
+# 연속 실패가 이 횟수에 도달하면 job 을 제거하고 probe 로만 확인한다.
+HEALTH_DISABLE_AFTER = int(os.environ.get("HEALTH_DISABLE_AFTER", "10"))
+HEALTH_PROBE_INTERVAL = int(os.environ.get("HEALTH_PROBE_INTERVAL", "3600"))
+HEALTH_PROBE_LIMIT = int(os.environ.get("HEALTH_PROBE_LIMIT", "20"))
+
+
+def backoff_seconds(fail_count: int, delay: int = 0) -> int:
+    """
+    연속 실패 횟수에 따른 지수 backoff(상한 HEALTH_BACKOFF_CAP).
+    첫 재시도도 rss 의 delay 보다 빠르지 않도록 max(HEALTH_BACKOFF_BASE, delay) 에서 시작한다.
+    """
+    if fail_count <= 0:
+        return 0
+    base = max(HEALTH_BACKOFF_BASE, delay or 0)
+    return min(base * 2 ** min(fail_count - 1, 32), HEALTH_BACKOFF_CAP)
+
+
+def is_disabled(db_health: Optional[models.RSSHealth]) -> bool:
+    return bool(db_health and db_health.fail_count >= HEALTH_DISABLE_AFTER)
+
+
+def record_success(db: Session, rss_id: int, status_code: int) -> models.RSSHealth:
+    return crud.update_rss_health_success(db, rss_id, status_code)
+
+
+def record_failure(db: Session, rss_id: int, error: Exception | str, status_code: Optional[int] = None) -> models.RSSHealth:
+    db_health = crud.get_rss_health(db, rss_id)
+    fail_count = (db_health.fail_count if db_health else 0) + 1
+    error_text = error if isinstance(error, str) else f"{type(error).__name__}: {error}"
+    retry_seconds = backoff_seconds(fail_count, crud.get_rss(db, rss_id).delay)
+    return crud.update_rss_health_failure(db, rss_id, error_text, status_code, retry_seconds)
+
+
+def seed_disabled(db: Session) -> None:
+    """rss_health 이전에 비활성화되어 상태가 없는 rss 도 probe 가 확인하도록 비활성화된 상태를 만든다."""
+    if count := crud.create_rss_health_for_inactive(db, HEALTH_DISABLE_AFTER):
+        logger.info(f"health: {count} inactive rss will be probed")
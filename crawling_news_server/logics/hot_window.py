@@ -0,0 +1,385 @@
+import os
+import sys
+import bisect
+import logging
+import datetime
+import threading
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session, joinedload
+
+from crawling_news_server import models, schemas
+from crawling_news_server.logics import archive
+
+logger = logging.getLogger(__name__)
+
+# 최근 item 을 메모리에 둘 최대 개수와 시간(초). 0 이면 사용하지 않는다.
+HOT_WINDOW_SIZE = int(os.environ.get("HOT_WINDOW_SIZE", "20000"))
+HOT_WINDOW_SECONDS = int(os.environ.get("HOT_WINDOW_SECONDS", "86400"))
+# window 밖 요약(item 수, distinct 묶음 수)을 DB 에서 다시 세는 주기(초)
+HOT_WINDOW_REFRESH_SECONDS = int(os.environ.get("HOT_WINDOW_REFRESH_SECONDS", "600"))
+
+
+@dataclass
+class Entry:
+    id: int
+    rss_id: int
+    publish_datetime: Optional[datetime.datetime]
+    distinct_key: int
+    # DB 의 저장 시각
+    created_at: datetime.datetime
+    item: schemas.RssItemEventDto
+    # 들어올 때 window 안에 같은 distinct_key 가 없었는지
+    new_distinct: bool = False
+
+
+def to_naive(dt: Optional[datetime.datetime]) -> Optional[datetime.datetime]:
+    return dt.replace(tzinfo=None) if dt else dt
+
+
+class HotWindow:
+    """
+    최근 item 을 id 순서로 담는 고정 크기 ring buffer.
+    id 가 floor_id 보다 큰 item 은 모두 들어 있으므로, 조건에 맞는 item 이
+    모두 window 안에 있거나 요청한 page 가 window 안에서 채워지면 DB 없이 응답한다.
+    """
+
+    def __init__(self, capacity: int = HOT_WINDOW_SIZE, window_seconds: int = HOT_WINDOW_SECONDS):
+        self.capacity = capacity
+        self.window_seconds = window_seconds
+        self.hit_count = 0
+        self.miss_count = 0
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self.ready = False
+        self._slots: list[Optional[Entry]] = [None] * max(self.capacity, 0)
+        self._head = 0
+        self._size = 0
+        self._by_rss: dict[int, list[int]] = {}
+        self._by_id: dict[int, Entry] = {}
+        # window 안의 distinct_key 별 item 수
+        self._keys: dict[int, int] = {}
+        self._rss: dict[int, schemas.RssResponseDto] = {}
+        self.newest_created_at: Optional[datetime.datetime] = None
+        # window 밖(id <= floor_id) item 에 대한 요약
+        self.floor_id = 0
+        self.outside_max_publish: Optional[datetime.datetime] = None
+        # 전체 item 수, rss 별 item 수, distinct 묶음 수
+        self.total_count = 0
+        self.rss_counts: dict[int, int] = {}
+        self.distinct_count = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _slot(self, offset: int) -> int:
+        return (self._head + offset) % self.capacity
+
+    def _entries_desc(self) -> Iterable[Entry]:
+        for offset in range(self._size - 1, -1, -1):
+            yield self._slots[self._slot(offset)]
+
+    def load(self, db: Session) -> None:
+        """시작할 때 최근 item 과 window 밖 요약을 DB 에서 읽는다."""
+        if not self.enabled:
+            return
+
+        # expire 와 같이 DB 의 created_at 을 기준으로 한다.
+        newest = db.query(func.max(models.RSSItem.created_at)).scalar() or datetime.datetime.now()
+        since = newest - datetime.timedelta(seconds=self.window_seconds)
+        segments = db.query(models.ArchiveSegment).all()
+        archive_floor_id = archive.floor_id(segments)
+        db_rss_items = (db.query(models.RSSItem)
+                        .options(joinedload(models.RSSItem.rss))
+                        .filter(models.RSSItem.created_at >= since, models.RSSItem.id > archive_floor_id)
+                        .order_by(models.RSSItem.id.desc())
+                        .limit(self.capacity)
+                        .all())
+
+        with self._lock:
+            self._reset()
+            if db_rss_items:
+                self.floor_id = db_rss_items[-1].id - 1
+            else:
+                self.floor_id = max(db.query(func.max(models.RSSItem.id)).scalar() or 0, archive_floor_id)
+            self.outside_max_publish = to_naive(
+                db.query(func.max(models.RSSItem.publish_datetime))
+                .filter(models.RSSItem.id > archive_floor_id, models.RSSItem.id <= self.floor_id).scalar())
+            summary = self._count(db, segments)
+            self.rss_counts, self.distinct_count = summary["rss_counts"], summary["distinct_count"]
+            if summary["archive_max_publish"] and (
+                    self.outside_max_publish is None or summary["archive_max_publish"] > self.outside_max_publish):
+                self.outside_max_publish = summary["archive_max_publish"]
+            self.total_count = sum(self.rss_counts.values())
+
+            for db_rss_item in reversed(db_rss_items):
+                self._insert(db_rss_item)
+            self.ready = True
+
+        logger.info(f"hot window loaded: {self._size} items, floor_id={self.floor_id}")
+
+    @staticmethod
+    def _count(db: Session, segments: list[models.ArchiveSegment], upto_id: Optional[int] = None) -> dict:
+        """
+        rss 별 item 수와 distinct 묶음 수. upto_id 가 있으면 그 id 까지만 센다.
+        archive 의 item 도 목록의 일부이므로 더한다(distinct 는 각각 묶어 더한다).
+        """
+        live = db.query(models.RSSItem).filter(models.RSSItem.id > archive.floor_id(segments))
+        if upto_id is not None:
+            live = live.filter(models.RSSItem.id <= upto_id)
+        rss_counts = dict(
+            live.with_entities(models.RSSItem.rss_id, func.count()).group_by(models.RSSItem.rss_id).all())
+        distinct_count = live.with_entities(
+            func.count(func.distinct(func.coalesce(models.RSSItem.link_hash, models.RSSItem.id)))).scalar()
+
+        archive_max_publish = None
+        if segments:
+            archived = archive.summarize(segments)
+            for rss_id, count in archived["rss_counts"].items():
+                rss_counts[rss_id] = rss_counts.get(rss_id, 0) + count
+            distinct_count += archived["distinct_count"]
+            archive_max_publish = archived["max_publish_datetime"]
+        return {"rss_counts": rss_counts, "distinct_count": distinct_count, "archive_max_publish": archive_max_publish}
+
+    def refresh_counts(self, db: Session) -> None:
+        """
+        window 밖 요약을 DB 에서 다시 센다. archive, reingest 는 다른 프로세스에서 item 을 옮기거나 넣고
+        add 의 distinct 판단은 window 안만 보므로 주기적으로(HOT_WINDOW_REFRESH_SECONDS) 맞춘다.
+        """
+        if not self.ready:
+            return
+        upto_id = db.query(func.max(models.RSSItem.id)).scalar() or 0
+        summary = self._count(db, db.query(models.ArchiveSegment).all(), upto_id)
+        rss_counts, distinct_count = summary["rss_counts"], summary["distinct_count"]
+        with self._lock:
+            # 세는 동안 add 로 들어온 item
+            for entry in self._by_id.values():
+                if entry.id > upto_id:
+                    rss_counts[entry.rss_id] = rss_counts.get(entry.rss_id, 0) + 1
+                    distinct_count += entry.new_distinct
+            if (self.total_count, self.distinct_count) != (sum(rss_counts.values()), distinct_count):
+                logger.info(f"hot window counts refreshed: {self.total_count} -> {sum(rss_counts.values())}, "
+                            f"distinct {self.distinct_count} -> {distinct_count}")
+            self.rss_counts, self.distinct_count = rss_counts, distinct_count
+            self.total_count = sum(rss_counts.values())
+
+    def _insert(self, db_rss_item: models.RSSItem, new_distinct: bool = False) -> None:
+        self._rss[db_rss_item.rss_id] = schemas.RssResponseDto.model_validate(db_rss_item.rss, from_attributes=True)
+        created_at = to_naive(db_rss_item.created_at) or self.newest_created_at or datetime.datetime.now()
+        entry = Entry(
+            id=db_rss_item.id,
+            rss_id=db_rss_item.rss_id,
+            publish_datetime=to_naive(db_rss_item.publish_datetime),
+            distinct_key=self._distinct_key(db_rss_item),
+            created_at=created_at,
+            item=schemas.RssItemEventDto.model_validate(db_rss_item, from_attributes=True),
+            new_distinct=new_distinct,
+        )
+        if self.newest_created_at is None or created_at > self.newest_created_at:
+            self.newest_created_at = created_at
+
+        if self._size == self.capacity:
+            self._evict()
+
+        # 보통은 맨 뒤에 붙고, 동시에 저장된 item 만 조금 앞으로 옮긴다.
+        offset = self._size
+        while offset > 0 and self._slots[self._slot(offset - 1)].id > entry.id:
+            self._slots[self._slot(offset)] = self._slots[self._slot(offset - 1)]
+            offset -= 1
+        self._slots[self._slot(offset)] = entry
+        self._size += 1
+
+        self._by_id[entry.id] = entry
+        self._keys[entry.distinct_key] = self._keys.get(entry.distinct_key, 0) + 1
+        bisect.insort(self._by_rss.setdefault(entry.rss_id, []), entry.id)
+
+    @staticmethod
+    def _distinct_key(db_rss_item: models.RSSItem) -> int:
+        return db_rss_item.link_hash if db_rss_item.link_hash is not None else db_rss_item.id
+
+    def _evict(self) -> None:
+        entry = self._slots[self._head]
+        self._slots[self._head] = None
+        self._head = (self._head + 1) % self.capacity
+        self._size -= 1
+
+        del self._by_id[entry.id]
+        if self._keys[entry.distinct_key] == 1:
+            del self._keys[entry.distinct_key]
+        else:
+            self._keys[entry.distinct_key] -= 1
+        ids = self._by_rss[entry.rss_id]
+        ids.remove(entry.id)
+        if not ids:
+            del self._by_rss[entry.rss_id]
+
+        self.floor_id = max(self.floor_id, entry.id)
+        if entry.publish_datetime and (self.outside_max_publish is None or entry.publish_datetime > self.outside_max_publish):
+            self.outside_max_publish = entry.publish_datetime
+
+    def expire(self) -> None:
+        """가장 최근 item 보다 window_seconds 이상 먼저 저장된 item 을 뺀다. load 와 같이 DB 의 created_at 으로 비교한다."""
+        with self._lock:
+            if self.newest_created_at is None:
+                return
+            deadline = self.newest_created_at - datetime.timedelta(seconds=self.window_seconds)
+            while self._size and self._slots[self._head].created_at < deadline:
+                self._evict()
+
+    def add(self, db_rss_item: models.RSSItem) -> None:
+        """
+        commit 된 새 item. 같은 link 의 item 이 window 안에 없으면 새 distinct 묶음으로 센다.
+        window 밖의 같은 link 는 refresh_counts 가 맞춘다.
+        """
+        if not self.ready or db_rss_item.id in self._by_id:
+            return
+        with self._lock:
+            new_distinct = self._distinct_key(db_rss_item) not in self._keys
+            if db_rss_item.id > self.floor_id:
+                self._insert(db_rss_item, new_distinct)
+            else:
+                # 이미 window 밖으로 밀려난 구간에 늦게 commit 된 item
+                publish_datetime = to_naive(db_rss_item.publish_datetime)
+                if publish_datetime and (self.outside_max_publish is None or publish_datetime > self.outside_max_publish):
+                    self.outside_max_publish = publish_datetime
+            self.total_count += 1
+            self.rss_counts[db_rss_item.rss_id] = self.rss_counts.get(db_rss_item.rss_id, 0) + 1
+            if new_distinct:
+                self.distinct_count += 1
+        self.expire()
+
+    def _response(self, entries: list[Entry]) -> list[schemas.RssItemResponseDto]:
+        return [schemas.RssItemResponseDto(**entry.item.model_dump(), rss=self._rss[entry.rss_id]) for entry in entries]
+
+    def _hit(self, found: Optional[dict]) -> Optional[dict]:
+        if found is None:
+            self.miss_count += 1
+        else:
+            self.hit_count += 1
+        return found
+
+    def find_rss_items(self, rss_id: int, page_number: int, page_limit: int) -> Optional[dict]:
+        """/rss/{rss_id}/items. window 로 답할 수 없으면 None"""
+        if not self.ready:
+            return None
+        start = max(page_number - 1, 0) * page_limit
+        with self._lock:
+            ids = self._by_rss.get(rss_id, [])
+            total_count = self.rss_counts.get(rss_id, 0)
+            if start + page_limit > len(ids) and total_count > len(ids):
+                return self._hit(None)
+            page_ids = ids[::-1][start:start + page_limit]
+            return self._hit({
+                "total_count": total_count,
+                "data": self._response([self._by_id[item_id] for item_id in page_ids]),
+            })
+
+    def find_items(
+            self, page_number: int, page_limit: int, distinct: bool,
+            start_dt: Optional[datetime.datetime] = None, end_dt: Optional[datetime.datetime] = None,
+            white_rss_id: Optional[list[int]] = None, black_rss_id: Optional[list[int]] = None,
+    ) -> Optional[dict]:
+        """
+        /api/v2/items 의 검색어 없는 목록. crud.find_rss_item_by_title 과 같은 조건을 적용한다.
+        window 로 답할 수 없으면 None
+        """
+        if not self.ready:
+            return None
+        start_dt, end_dt = to_naive(start_dt), to_naive(end_dt)
+        start = max(page_number - 1, 0) * page_limit
+
+        with self._lock:
+            # 조건에 맞는 item 이 모두 window 안에 있는지
+            if self.outside_max_publish is None:
+                covered = self.total_count == self._size
+            elif start_dt:
+                covered = start_dt > self.outside_max_publish if end_dt else start_dt >= self.outside_max_publish
+            else:
+                covered = False
+
+            # 모두 있지 않다면 window 밖의 총 개수를 알고 있어야 한다.
+            if covered:
+                total_count = None
+            elif start_dt or end_dt:
+                return self._hit(None)
+            elif distinct:
+                if white_rss_id or black_rss_id:
+                    return self._hit(None)
+                total_count = self.distinct_count
+            elif white_rss_id:
+                total_count = sum(self.rss_counts.get(rss_id, 0) for rss_id in set(white_rss_id))
+            elif black_rss_id:
+                total_count = self.total_count - sum(self.rss_counts.get(rss_id, 0) for rss_id in set(black_rss_id))
+            else:
+                total_count = self.total_count
+
+            white, black = set(white_rss_id or ()), set(black_rss_id or ())
+            seen_keys = set()
+            matched = []
+            for entry in self._entries_desc():
+                if white and entry.rss_id not in white:
+                    continue
+                if not white and black and entry.rss_id in black:
+                    continue
+                if start_dt and end_dt:
+                    if entry.publish_datetime is None or not start_dt <= entry.publish_datetime <= end_dt:
+                        continue
+                elif start_dt and (entry.publish_datetime is None or entry.publish_datetime <= start_dt):
+                    continue
+                elif end_dt and (entry.publish_datetime is None or entry.publish_datetime >= end_dt):
+                    continue
+                if distinct:
+                    if entry.distinct_key in seen_keys:
+                        continue
+                    seen_keys.add(entry.distinct_key)
+                matched.append(entry)
+                if total_count is not None and len(matched) >= start + page_limit:
+                    break
+
+            if total_count is None:
+                total_count = len(matched)
+            elif len(matched) < start + page_limit and total_count > len(matched):
+                return self._hit(None)
+
+            return self._hit({
+                "total_count": total_count,
+                "data": self._response(matched[start:start + page_limit]),
+            })
+
+    def memory_bytes(self) -> int:
+        """slot, index, item 문자열을 합한 대략의 메모리 사용량"""
+        with self._lock:
+            size = sys.getsizeof(self._slots) + sys.getsizeof(self._by_id) + sys.getsizeof(self._by_rss)
+            size += sum(sys.getsizeof(ids) for ids in self._by_rss.values())
+            for entry in self._by_id.values():
+                size += sys.getsizeof(entry) + sys.getsizeof(entry.__dict__) + sys.getsizeof(entry.item)
+                size += sum(sys.getsizeof(value) for value in entry.item.__dict__.values())
+            return size
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                "ready": self.ready,
+                "size": self._size,
+                "capacity": self.capacity,
+                "window_seconds": self.window_seconds,
+                "floor_id": self.floor_id,
+                "outside_max_publish": self.outside_max_publish,
+                "newest_created_at": self.newest_created_at,
+                "total_count": self.total_count,
+                "distinct_count": self.distinct_count,
+                "memory_bytes": self.memory_bytes(),
+                "hit_count": self.hit_count,
+                "miss_count": self.miss_count,
+            }
+
+
+window = HotWindow()
@@ -0,0 +1,113 @@
+import time
+import logging
+from dataclasses import dataclass, field
+from typing import Optional
+
+import feedparser
+import requests
+from sqlalchemy.orm import Session
+
+from crawling_news_server import crud, models, crawl
+from crawling_news_server.crawl.canonical_link import link_hash
+from crawling_news_server.logics import archive, health, metrics, websub
+from crawling_news_server.logics.dispatcher import CRAWL_YIELD_ALPHA
+
+logger = logging.getLogger(__name__)
+
+
+def ingest_rss(db: Session, rss_id: int, url: str, text: str) -> tuple[feedparser.FeedParserDict, list[models.RSSItem]]:
+    """rss 본문을 fix/parse 하여 rss 정보를 갱신하고 새 item 만 저장한다."""
+    with metrics.stage("fix"):
+        text = crawl.rss_fixer.fix_text(url, text)
+    with metrics.stage("parse"):
+        rss_obj = feedparser.parse(text)
+
+    with metrics.stage("db"):
+        crud.update_rss_from_rss_dict(db, rss_id, rss_obj.get("feed", {}))
+
+        db_rss_items = []
+        segments = None
+        for item in rss_obj.entries:
+            if crud.get_rss_item_by_rss_id_and_link(db, rss_id, item.link) is not None:
+                continue
+            # archive 로 옮긴 item 이 feed 에 남아 있는 경우
+            if segments is None:
+                segments = db.query(models.ArchiveSegment).all()
+            if segments and archive.is_archived(segments, rss_id, link_hash(item.link)):
+                continue
+
+            if db_rss_item := crud.create_rss_item_from_rss_item_obj(db, rss_id, item):
+                db_rss_items.append(db_rss_item)
+
+    return rss_obj, db_rss_items
+
+
+@dataclass
+class CrawlResult:
+    rss_id: int
+    url: str
+    status_code: int
+    text: str
+    rss_obj: feedparser.FeedParserDict
+    item_ids: list[int] = field(default_factory=list)
+    yield_avg: Optional[float] = None
+    fetched_at: float = field(default_factory=time.time)
+
+    @property
+    def add_count(self) -> int:
+        return len(self.item_ids)
+
+    @property
+    def entry_count(self) -> int:
+        return len(self.rss_obj.entries)
+
+
+def fetch_and_ingest(db: Session, rss_id: int, url: str) -> CrawlResult:
+    """
+    rss 를 가져와 새 item 을 저장하고 응답을 기록한다.
+    실패는 health 에 기록하고(HTTP 오류는 응답도 기록) 예외를 그대로 올려보낸다. 재시도 일정은 호출한 쪽에서 정한다.
+    수동/예약 crawling 이 single-flight 로 결과를 공유하므로 기록은 여기서 한 번만 한다.
+    """
+    try:
+        return _fetch_and_ingest(db, rss_id, url)
+
+    except requests.exceptions.HTTPError as http_error:
+        response: requests.Response = http_error.response
+        db.rollback()
+        crud.create_rss_response_record(
+            db, rss_id, url, crawl.response_to_text.response_to_text(url, response), response.status_code)
+        health.record_failure(db, rss_id, http_error, response.status_code)
+        raise
+
+    except Exception as e:
+        db.rollback()
+        health.record_failure(db, rss_id, e)
+        raise
+
+
+def _fetch_and_ingest(db: Session, rss_id: int, url: str) -> CrawlResult:
+    with metrics.stage("fetch"):
+        response = crawl.fetcher.fetch(url)
+    metrics.crawl_fetch_bytes.observe(len(response.content))
+    response.raise_for_status()
+    health.record_success(db, rss_id, response.status_code)
+
+    with metrics.stage("decode"):
+        text = crawl.response_to_text.response_to_text(url, response)
+    rss_obj, db_rss_items = ingest_rss(db, rss_id, url, response.text)
+    result = CrawlResult(rss_id, url, response.status_code, text, rss_obj, [row.id for row in db_rss_items])
+    metrics.crawl_items_added.observe(result.add_count)
+
+    if result.add_count:
+        crud.create_rss_response_record(db, rss_id, url, text, response.status_code)
+    elif not result.entry_count:
+        crud.create_rss_response_record(db, rss_id, url, "<!-- ENTRY ZERO -->" + text, response.status_code)
+
+    result.yield_avg = crud.update_rss_yield(db, rss_id, result.add_count, CRAWL_YIELD_ALPHA).yield_avg
+
+    try:
+        websub.ensure_subscription(db, rss_id, url, rss_obj)
+    except Exception as e:
+        logger.warning(f"[{rss_id:<10}]({url:<55}): WebSub subscribe error {e}")
+
+    return result
@@ -0,0 +1,236 @@
+import os
+import json
+import time
+import logging
+import datetime
+import threading
+from collections import OrderedDict
+from typing import Any, Iterable, Optional
+
+from fastapi.responses import JSONResponse, Response
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+
+try:
+    import orjson
+    from fastapi.responses import ORJSONResponse as FastJSONResponse
+except ImportError:  # pragma: no cover
+    orjson = None
+    FastJSONResponse = JSONResponse
+
+from crawling_news_server import models, schemas
+
+logger = logging.getLogger(__name__)
+
+ITEM_JSON_CACHE_SIZE = int(os.environ.get("ITEM_JSON_CACHE_SIZE", "50000"))
+# item JSON 을 rss_item_json 테이블에도 저장해 재시작 후나 다른 process 에서 다시 쓴다.
+ITEM_JSON_PERSIST = os.environ.get("ITEM_JSON_PERSIST", "FALSE") == "TRUE"
+# 다른 process(commands)가 고친 item 을 확인하는 간격
+ITEM_JSON_INVALIDATION_SECONDS = float(os.environ.get("ITEM_JSON_INVALIDATION_SECONDS", "10"))
+ITEM_JSON_INVALIDATION_KEEP_DAYS = int(os.environ.get("ITEM_JSON_INVALIDATION_KEEP_DAYS", "1"))
+
+
+def dumps(value: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def serialize_item(item: models.RSSItem | schemas.RssItemDto, full: bool = True) -> bytes:
+    """
+    rss 를 뺀 item JSON(RssItemEventDto 와 같음). item 은 저장 후 바뀌지 않는다.
+    full 이 아니면 목록용으로 description 을 뺀다.
+    """
+    exclude = set() if full else {"description"}
+    if isinstance(item, schemas.RssItemResponseDto):
+        return item.model_dump_json(exclude=exclude | {"rss"}).encode("utf-8")
+    if not isinstance(item, schemas.RssItemEventDto):
+        item = schemas.RssItemEventDto.model_validate(item, from_attributes=True)
+    return item.model_dump_json(exclude=exclude).encode("utf-8")
+
+
+def serialize_rss(rss: models.RSS | schemas.RssResponseDto) -> bytes:
+    if not isinstance(rss, schemas.RssResponseDto):
+        rss = schemas.RssResponseDto.model_validate(rss, from_attributes=True)
+    return rss.model_dump_json().encode("utf-8")
+
+
+def with_rss(item_json: bytes, rss_json: bytes) -> bytes:
+    """item JSON 끝에 rss 를 붙여 RssItemResponseDto 와 같은 JSON 을 만든다."""
+    return item_json[:-1] + b',"rss":' + rss_json + b'}'
+
+
+class ItemJsonCache:
+    """(item id, full) -> 직렬화한 item JSON(bytes) LRU cache"""
+
+    def __init__(self, maxsize: int = ITEM_JSON_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hit_count = 0
+        self.miss_count = 0
+        self.size_bytes = 0
+        # 마지막으로 반영한 rss_item_json_invalidations.id. 아직 확인 전이면 None
+        self.invalidation_id: Optional[int] = None
+        self.checked_at = 0.0
+        self._lock = threading.Lock()
+        self._data: OrderedDict[tuple[int, bool], bytes] = OrderedDict()
+
+    def __contains__(self, key: tuple[int, bool]) -> bool:
+        return key in self._data
+
+    def get_many(self, item_ids: Iterable[int], full: bool = False) -> dict[int, bytes]:
+        found = {}
+        with self._lock:
+            for item_id in item_ids:
+                if (value := self._data.get((item_id, full))) is not None:
+                    self._data.move_to_end((item_id, full))
+                    found[item_id] = value
+        return found
+
+    def put(self, item_id: int, value: bytes, full: bool = False) -> None:
+        if self.maxsize <= 0:
+            return
+        key = (item_id, full)
+        with self._lock:
+            if (old := self._data.pop(key, None)) is not None:
+                self.size_bytes -= len(old)
+            self._data[key] = value
+            self.size_bytes += len(value)
+            while len(self._data) > self.maxsize:
+                _, evicted = self._data.popitem(last=False)
+                self.size_bytes -= len(evicted)
+
+    def invalidate(self, item_ids: Iterable[int]) -> None:
+        with self._lock:
+            for item_id in item_ids:
+                for full in (False, True):
+                    if (old := self._data.pop((item_id, full), None)) is not None:
+                        self.size_bytes -= len(old)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.size_bytes = 0
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "size_bytes": self.size_bytes,
+                "hit_count": self.hit_count,
+                "miss_count": self.miss_count,
+                "persist": ITEM_JSON_PERSIST,
+                "invalidation_id": self.invalidation_id,
+                "encoder": "orjson" if orjson is not None else "json",
+            }
+
+
+cache = ItemJsonCache()
+
+
+def persist_item(db: Session, db_rss_item: models.RSSItem) -> None:
+    """ITEM_JSON_PERSIST 면 item 과 같은 transaction 에 두 형태의 JSON 을 저장한다. commit 은 호출한 쪽에서 한다."""
+    if ITEM_JSON_PERSIST:
+        db.add(models.RSSItemJson(
+            rss_item_id=db_rss_item.id,
+            body=serialize_item(db_rss_item).decode("utf-8"),
+            summary=serialize_item(db_rss_item, full=False).decode("utf-8"),
+        ))
+
+
+def store_item(db_rss_item: models.RSSItem) -> None:
+    """commit 된 새 item 의 목록용 JSON 을 cache 에 넣는다."""
+    cache.put(db_rss_item.id, serialize_item(db_rss_item, full=False))
+
+
+def invalidate_items(db: Session | Connection, item_ids: list[int]) -> None:
+    """
+    고친 item 의 저장된 JSON 을 지우고 rss_item_json_invalidations 에 기록한다. commit 은 호출한 쪽에서 한다.
+    실행 중인 서버는 sync_invalidations 로 자기 cache 에서 뺀다.
+    """
+    if not item_ids:
+        return
+    table = models.RSSItemJsonInvalidation
+    db.execute(delete(models.RSSItemJson).where(models.RSSItemJson.rss_item_id.in_(item_ids)))
+    db.execute(insert(table), [{"rss_item_id": item_id} for item_id in item_ids])
+    expired_at = datetime.datetime.now() - datetime.timedelta(days=ITEM_JSON_INVALIDATION_KEEP_DAYS)
+    db.execute(delete(table).where(table.created_at < expired_at))
+    cache.invalidate(item_ids)
+
+
+async def sync_invalidations(db: AsyncSession) -> None:
+    """다른 process 가 고친 item 을 cache 에서 뺀다. ITEM_JSON_INVALIDATION_SECONDS 마다 한 번만 확인한다."""
+    now = time.monotonic()
+    if now - cache.checked_at < ITEM_JSON_INVALIDATION_SECONDS:
+        return
+    cache.checked_at = now
+    table = models.RSSItemJsonInvalidation
+    if cache.invalidation_id is None:
+        # 처음에는 그 전의 기록을 알 수 없으므로 cache 를 비우고 지금부터 본다.
+        cache.invalidation_id = await db.scalar(select(func.max(table.id))) or 0
+        cache.clear()
+        return
+    rows = (await db.execute(
+        select(table.id, table.rss_item_id).where(table.id > cache.invalidation_id).order_by(table.id))).all()
+    if rows:
+        cache.invalidation_id = rows[-1].id
+        cache.invalidate(row.rss_item_id for row in rows)
+        logger.info(f"item json cache: {len(rows)} invalidated items")
+
+
+async def load_persisted(db: AsyncSession, items: list, full: bool = False) -> dict[int, bytes]:
+    """cache 에 없는 item 의 저장된 JSON"""
+    if not ITEM_JSON_PERSIST:
+        return {}
+    missing = [item.id for item in items if (item.id, full) not in cache]
+    if not missing:
+        return {}
+    column = models.RSSItemJson.body if full else models.RSSItemJson.summary
+    rows = await db.execute(
+        select(models.RSSItemJson.rss_item_id, column)
+        .filter(models.RSSItemJson.rss_item_id.in_(missing), column.is_not(None)))
+    return {rss_item_id: body.encode("utf-8") for rss_item_id, body in rows}
+
+
+def items_json(items: list, persisted: Optional[dict[int, bytes]] = None, full: bool = False) -> list[bytes]:
+    """
+    RssItemResponseDto 목록의 item 별 JSON. items 는 rss 가 로드된 RSSItem 또는 RssItemResponseDto.
+    item 부분은 cache, persisted, 직렬화 순으로 구하고 rss 부분은 rss 마다 한 번만 직렬화한다.
+    """
+    found = cache.get_many((item.id for item in items), full)
+    cache.hit_count += len(found)
+    rss_json: dict[int, bytes] = {}
+    result = []
+    for item in items:
+        item_json = found.get(item.id)
+        if item_json is None:
+            cache.miss_count += 1
+            item_json = (persisted or {}).get(item.id) or serialize_item(item, full)
+            cache.put(item.id, item_json, full)
+
+        if item.rss_id not in rss_json:
+            rss_json[item.rss_id] = serialize_rss(item.rss)
+        result.append(with_rss(item_json, rss_json[item.rss_id]))
+    return result
+
+
+async def list_response(db: Optional[AsyncSession], items: list, total_count: Optional[int] = None,
+                        full: bool = False, **extra: Any) -> Response:
+    """
+    미리 직렬화한 item 으로 목록 응답 body 를 조립한다. full 이 아니면 item 에 description 이 없다.
+    total_count 가 None 이면 배열, 아니면 {"total_count", "data", **extra}
+    """
+    persisted = None
+    if db is not None:
+        await sync_invalidations(db)
+        persisted = await load_persisted(db, items, full)
+    data = b"[" + b",".join(items_json(items, persisted, full)) + b"]"
+    if total_count is None:
+        return Response(data, media_type="application/json")
+
+    body = b'{"total_count":' + str(total_count).encode() + b',"data":' + data
+    for key, value in extra.items():
+        body += b"," + dumps(key) + b":" + dumps(value)
+    return Response(body + b"}", media_type="application/json")
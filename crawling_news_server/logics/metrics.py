@@ -0,0 +1,274 @@
+"""
+Prometheus text 형식(/metrics)으로 내보내는 counter, gauge, histogram 과 job 실행 기록.
+label 에는 rss_id 처럼 값이 많은 것을 넣지 않는다.
+"""
+import time
+import math
+import threading
+import datetime
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Iterator, Optional
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+BYTES_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+class Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Gauge(Metric):
+    """func 가 있으면 scrape 할 때마다 {label 값 tuple: 값} 을 받아 쓴다."""
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (),
+                 func: Optional[Callable[[], dict[tuple[str, ...], float]]] = None):
+        super().__init__(name, documentation, labelnames)
+        self.func = func
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def samples(self) -> Iterator[str]:
+        if self.func is not None:
+            values = list(self.func().items())
+        else:
+            with self._lock:
+                values = list(self._values.items())
+        for key, value in values:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # label 값 tuple -> [bucket 별 개수..., 합계]
+        self._values: dict[tuple[str, ...], list[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            if (counts := self._values.get(key)) is None:
+                counts = self._values[key] = [0] * (len(self.buckets) + 1)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            counts[-1] += value
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def snapshot(self, **labels) -> tuple[int, float]:
+        """(개수, 합계)"""
+        counts = self._values.get(self._key(labels))
+        return (int(sum(counts[:-1])), counts[-1]) if counts else (0, 0.0)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = [(key, list(counts)) for key, counts in self._values.items()]
+        names = self.labelnames + ("le",)
+        for key, counts in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield f"{self.name}_bucket{_format_labels(names, key + (_format_value(bound),))} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(counts[-1])}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: tuple[str, ...] = (), func=None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, func))
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple[str, ...] = (),
+                  buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        parts = []
+        for metric in list(self._metrics.values()):
+            try:
+                parts.append(metric.render())
+            except Exception as e:
+                # 값을 못 읽는 gauge 하나 때문에 전체가 실패하지 않게 한다.
+                parts.append(f"# {metric.name} error: {_escape(str(e))}")
+        return "\n".join(parts) + "\n"
+
+
+registry = Registry()
+
+crawl_stage_seconds = registry.histogram(
+    "crawl_stage_seconds", "Time spent per crawl stage (db includes date)", ("stage",))
+crawl_fetch_bytes = registry.histogram(
+    "crawl_fetch_bytes", "Response body size per fetch", buckets=BYTES_BUCKETS)
+crawl_items_added = registry.histogram(
+    "crawl_items_added", "New items stored per poll", buckets=COUNT_BUCKETS)
+scheduler_lag_seconds = registry.histogram(
+    "scheduler_lag_seconds", "Delay between the planned and the actual start of a job", ("kind",))
+job_duration_seconds = registry.histogram("job_duration_seconds", "Job run time", ("kind",))
+job_runs_total = registry.counter("job_runs_total", "Job runs by outcome (crawl polls are kind=crawl)", ("kind", "outcome"))
+db_pool_checkout_wait_seconds = registry.histogram(
+    "db_pool_checkout_wait_seconds", "Time waiting for a connection from the pool", ("pool",),
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30))
+
+
+def stage(name: str):
+    """with metrics.stage("fetch"): ..."""
+    return crawl_stage_seconds.time(stage=name)
+
+
+@dataclass
+class JobRun:
+    kind: str
+    started_at: Optional[datetime.datetime] = None
+    duration: Optional[float] = None
+    outcome: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        return {
+            "last_run_at": f"{self.started_at}" if self.started_at else None,
+            "last_duration": round(self.duration, 3) if self.duration is not None else None,
+            "last_outcome": self.outcome,
+        }
+
+
+class JobRuns:
+    """job 별 마지막 실행 시간과 결과, 예정 시각과 실제 시작 시각의 차이"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._runs: dict[str, JobRun] = {}
+        self._planned: dict[str, datetime.datetime] = {}
+
+    def planned(self, job_id: str, run_time: datetime.datetime) -> None:
+        """scheduler 가 job 을 executor 에 넘길 때. 밀린 실행이 여러 번이면 가장 이른 시각을 남긴다."""
+        with self._lock:
+            if job_id not in self._planned or run_time < self._planned[job_id]:
+                self._planned[job_id] = run_time
+
+    @contextmanager
+    def track(self, job_id: str, kind: str) -> Iterator[JobRun]:
+        """실행 중 outcome 을 정하지 않으면 "ok", 예외가 나면 "error" 로 남긴다."""
+        now = datetime.datetime.now(datetime.timezone.utc)
+        with self._lock:
+            planned = self._planned.pop(job_id, None)
+        if planned is not None:
+            scheduler_lag_seconds.observe(max((now - planned).total_seconds(), 0), kind=kind)
+
+        run = JobRun(kind, now)
+        started = time.perf_counter()
+        try:
+            yield run
+        except BaseException:
+            run.outcome = "error"
+            raise
+        finally:
+            run.duration = time.perf_counter() - started
+            run.outcome = run.outcome or "ok"
+            job_duration_seconds.observe(run.duration, kind=kind)
+            job_runs_total.inc(kind=kind, outcome=run.outcome)
+            with self._lock:
+                self._runs[job_id] = run
+
+    def get(self, job_id: str) -> Optional[JobRun]:
+        return self._runs.get(job_id)
+
+    def describe(self, job_id: str) -> dict:
+        if (run := self._runs.get(job_id)) is None:
+            return {"last_run_at": None, "last_duration": None, "last_outcome": None}
+        return run.to_dict()
+
+    def remove(self, job_id: str) -> None:
+        with self._lock:
+            self._runs.pop(job_id, None)
+            self._planned.pop(job_id, None)
+
+
+job_runs = JobRuns()
@@ -0,0 +1,192 @@
+"""
+재시작 없이 실행 중인 프로세스를 들여다보는 도구. DEBUG_ENDPOINTS=TRUE 일 때 /debug 로 노출한다.
+
+* SamplingProfiler: 정해진 시간 동안 모든 thread 의 stack 을 주기적으로 모아 collapsed stack
+  (flamegraph.pl, speedscope 에서 읽는 "frame;frame;frame count" 형식)으로 돌려준다.
+* MemorySnapshots: tracemalloc snapshot 을 찍어 두고 두 snapshot 사이에 늘어난 할당 위치를 보여준다.
+"""
+import os
+import sys
+import time
+import threading
+import tracemalloc
+import linecache
+from collections import Counter, OrderedDict
+from typing import Any, Optional
+
+DEBUG_ENDPOINTS = os.environ.get("DEBUG_ENDPOINTS", "FALSE") == "TRUE"
+PROFILE_MAX_SECONDS = float(os.environ.get("PROFILE_MAX_SECONDS", "60"))
+PROFILE_MIN_INTERVAL = 0.001
+TRACEMALLOC_FRAMES = int(os.environ.get("TRACEMALLOC_FRAMES", "10"))
+TRACEMALLOC_KEEP = int(os.environ.get("TRACEMALLOC_KEEP", "5"))
+
+# 이 함수에서 멈춰 있는 stack 은 기다리는 중이므로 idle=False 면 뺀다.
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("socket.py", "accept"),
+    ("thread.py", "_worker"),
+}
+
+
+class ProfilerBusy(Exception):
+    """이미 다른 profile 을 실행 중"""
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    # ";" 는 collapsed stack 의 구분자이다.
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})".replace(";", ":")
+
+
+def _is_idle(frame) -> bool:
+    return (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in IDLE_FRAMES
+
+
+class SamplingProfiler:
+    def __init__(self):
+        self.last_result: Optional[dict[str, Any]] = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def run(self, seconds: float, interval: float = 0.01, idle: bool = False) -> dict[str, Any]:
+        """seconds 동안 interval 마다 stack 을 모은다. 호출한 thread 는 이 시간 동안 막힌다."""
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy()
+        try:
+            seconds = min(max(seconds, interval), PROFILE_MAX_SECONDS)
+            interval = max(interval, PROFILE_MIN_INTERVAL)
+            stacks: Counter[str] = Counter()
+            me = threading.get_ident()
+            samples = 0
+            started = time.perf_counter()
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == me or (not idle and _is_idle(frame)):
+                        continue
+                    labels = []
+                    while frame is not None:
+                        labels.append(_frame_label(frame))
+                        frame = frame.f_back
+                    labels.append(names.get(thread_id, str(thread_id)).replace(";", ":"))
+                    stacks[";".join(reversed(labels))] += 1
+                samples += 1
+                time.sleep(interval)
+
+            self.last_result = {
+                "seconds": round(time.perf_counter() - started, 3),
+                "interval": interval,
+                "samples": samples,
+                "stacks": stacks,
+            }
+            return self.last_result
+        finally:
+            self._lock.release()
+
+    @staticmethod
+    def collapsed(result: dict[str, Any]) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in result["stacks"].most_common())
+
+
+class MemorySnapshots:
+    """번호를 붙여 최근 TRACEMALLOC_KEEP 개의 snapshot 을 둔다."""
+
+    def __init__(self, keep: int = TRACEMALLOC_KEEP):
+        self.keep = keep
+        self._next_id = 1
+        self._lock = threading.Lock()
+        self._snapshots: OrderedDict[int, tuple[float, tracemalloc.Snapshot]] = OrderedDict()
+
+    def start(self, frames: int = TRACEMALLOC_FRAMES) -> dict[str, Any]:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        return self.status()
+
+    def stop(self) -> dict[str, Any]:
+        with self._lock:
+            self._snapshots.clear()
+        tracemalloc.stop()
+        return self.status()
+
+    def status(self) -> dict[str, Any]:
+        current, peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+        with self._lock:
+            snapshots = [{"id": snapshot_id, "taken_at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(taken_at))}
+                         for snapshot_id, (taken_at, _) in self._snapshots.items()]
+        return {
+            "tracing": tracemalloc.is_tracing(),
+            "frames": tracemalloc.get_traceback_limit(),
+            "traced_bytes": current,
+            "traced_peak_bytes": peak,
+            "tracemalloc_bytes": tracemalloc.get_tracemalloc_memory(),
+            "snapshots": snapshots,
+        }
+
+    def take(self) -> int:
+        """tracing 중이 아니면 먼저 start 한다. 처음 snapshot 은 start 이후의 할당만 담는다."""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            # snapshot 을 걸러내며 생기는 할당도 뺀다.
+            tracemalloc.Filter(False, tracemalloc.__file__, all_frames=True),
+            tracemalloc.Filter(False, linecache.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ))
+        with self._lock:
+            snapshot_id = self._next_id
+            self._next_id += 1
+            self._snapshots[snapshot_id] = (time.time(), snapshot)
+            while len(self._snapshots) > self.keep:
+                self._snapshots.popitem(last=False)
+        return snapshot_id
+
+    def _get(self, snapshot_id: int) -> tracemalloc.Snapshot:
+        with self._lock:
+            if snapshot_id not in self._snapshots:
+                raise KeyError(snapshot_id)
+            return self._snapshots[snapshot_id][1]
+
+    def previous_id(self, snapshot_id: int) -> Optional[int]:
+        with self._lock:
+            ids = [n for n in self._snapshots if n < snapshot_id]
+        return ids[-1] if ids else None
+
+    def top(self, snapshot_id: int, key: str = "lineno", limit: int = 20) -> list[dict[str, Any]]:
+        stats = self._get(snapshot_id).statistics(key)
+        return [{
+            "size": stat.size,
+            "count": stat.count,
+            "where": _format_traceback(stat.traceback, key),
+        } for stat in stats[:limit]]
+
+    def diff(self, base_id: int, target_id: int, key: str = "lineno", limit: int = 20) -> list[dict[str, Any]]:
+        """target 에서 늘어난 크기 순"""
+        stats = self._get(target_id).compare_to(self._get(base_id), key)
+        return [{
+            "size": stat.size,
+            "size_diff": stat.size_diff,
+            "count": stat.count,
+            "count_diff": stat.count_diff,
+            "where": _format_traceback(stat.traceback, key),
+        } for stat in stats[:limit]]
+
+
+def _format_traceback(traceback: tracemalloc.Traceback, key: str) -> list[str] | str:
+    if key == "traceback":
+        # 바깥 호출부터
+        return [f"{frame.filename}:{frame.lineno}" for frame in traceback]
+    frame = traceback[0]
+    return frame.filename if key == "filename" else f"{frame.filename}:{frame.lineno}"
+
+
+profiler = SamplingProfiler()
+memory = MemorySnapshots()
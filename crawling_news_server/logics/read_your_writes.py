@@ -0,0 +1,83 @@
+"""
+read-your-writes. 쓰기 요청에 쿠키를 붙여 READ_PRIMARY_SECONDS 동안은 같은 클라이언트의 읽기를 primary 로 보낸다.
+
+database 는 should_read_primary() 만 보고 session 을 고르며 요청/응답은 ReadYourWritesMiddleware 가 다룬다.
+"""
+import os
+import time
+import contextvars
+from dataclasses import dataclass
+from http.cookies import CookieError, SimpleCookie
+from typing import Optional
+
+READ_PRIMARY_SECONDS = int(os.environ.get("READ_PRIMARY_SECONDS", "10"))
+READ_PRIMARY_COOKIE = "read_primary_until"
+
+
+@dataclass
+class RequestState:
+    read_primary: bool = False
+    wrote: bool = False
+
+
+_current: contextvars.ContextVar[Optional[RequestState]] = contextvars.ContextVar("read_your_writes", default=None)
+
+
+def should_read_primary() -> bool:
+    """최근 쓰기를 한 클라이언트의 요청인지"""
+    state = _current.get()
+    return state is not None and state.read_primary
+
+
+def stick_to_primary() -> None:
+    """쓰기 요청 처리 중에 호출한다. 응답에 쿠키를 붙인다."""
+    if (state := _current.get()) is not None:
+        state.wrote = True
+
+
+def _read_cookie(headers: list[tuple[bytes, bytes]]) -> bool:
+    for name, value in headers:
+        if name != b"cookie":
+            continue
+        cookie = SimpleCookie()
+        try:
+            cookie.load(value.decode("latin-1"))
+            return READ_PRIMARY_COOKIE in cookie and float(cookie[READ_PRIMARY_COOKIE].value) > time.time()
+        except (ValueError, CookieError):
+            return False
+    return False
+
+
+def _set_cookie_header() -> bytes:
+    cookie = SimpleCookie()
+    cookie[READ_PRIMARY_COOKIE] = f"{time.time() + READ_PRIMARY_SECONDS:.0f}"
+    cookie[READ_PRIMARY_COOKIE]["max-age"] = READ_PRIMARY_SECONDS
+    cookie[READ_PRIMARY_COOKIE]["path"] = "/"
+    cookie[READ_PRIMARY_COOKIE]["httponly"] = True
+    cookie[READ_PRIMARY_COOKIE]["samesite"] = "lax"
+    return cookie[READ_PRIMARY_COOKIE].OutputString().encode("latin-1")
+
+
+class ReadYourWritesMiddleware:
+    """요청의 쿠키를 읽어 RequestState 를 두고, stick_to_primary() 를 부른 요청의 응답에 쿠키를 붙인다."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        state = RequestState(read_primary=_read_cookie(scope.get("headers", [])))
+        token = _current.set(state)
+
+        async def send_with_cookie(message):
+            if message["type"] == "http.response.start" and state.wrote:
+                message = {**message, "headers": [*message.get("headers", []), (b"set-cookie", _set_cookie_header())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_cookie)
+        finally:
+            _current.reset(token)
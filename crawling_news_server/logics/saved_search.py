@@ -0,0 +1,144 @@
+import os
+import time
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, Optional
+
+from crawling_news_server import models
+from crawling_news_server.logics.aho_corasick import Automaton
+
+logger = logging.getLogger(__name__)
+
+# 다른 프로세스에서 바뀐 저장 검색도 이 시간(초) 안에 반영한다.
+SAVED_SEARCH_RELOAD_SECONDS = int(os.environ.get("SAVED_SEARCH_RELOAD_SECONDS", "60"))
+
+
+@dataclass
+class CompiledSearch:
+    """
+    검색어를 MySQL BOOLEAN MODE 처럼 해석한다.
+    +단어 는 반드시 포함, -단어 는 포함하면 제외, 그 외 단어는 하나 이상 포함.
+    """
+    id: int
+    required: set[str] = field(default_factory=set)
+    optional: set[str] = field(default_factory=set)
+    excluded: set[str] = field(default_factory=set)
+    white_rss_id: Optional[set[int]] = None
+    black_rss_id: Optional[set[int]] = None
+
+    @classmethod
+    def parse(cls, db_saved_search: models.SavedSearch) -> "CompiledSearch":
+        return cls.from_query(
+            db_saved_search.query, db_saved_search.id,
+            white_rss_id=parse_rss_id(db_saved_search.white_rss_id),
+            black_rss_id=parse_rss_id(db_saved_search.black_rss_id),
+        )
+
+    @classmethod
+    def from_query(cls, query: str, search_id: int = 0, **kwargs) -> "CompiledSearch":
+        search = cls(search_id, **kwargs)
+        for word in query.lower().split():
+            if word.startswith("+") and len(word) > 1:
+                search.required.add(word[1:])
+            elif word.startswith("-") and len(word) > 1:
+                search.excluded.add(word[1:])
+            else:
+                search.optional.add(word)
+        return search
+
+    @property
+    def terms(self) -> set[str]:
+        return self.required | self.optional | self.excluded
+
+    def accept_rss(self, rss_id: int) -> bool:
+        if self.white_rss_id:
+            return rss_id in self.white_rss_id
+        if self.black_rss_id:
+            return rss_id not in self.black_rss_id
+        return True
+
+    def match_text(self, text: str) -> bool:
+        """automaton 없이 text 하나를 직접 비교한다."""
+        text = text.lower()
+        return self.is_match({term for term in self.terms if term in text})
+
+    def is_match(self, found: set[str]) -> bool:
+        if found & self.excluded:
+            return False
+        if not self.required <= found:
+            return False
+        return bool(self.required) or bool(found & self.optional)
+
+
+def parse_rss_id(value: Optional[str]) -> Optional[set[int]]:
+    if not value:
+        return None
+    return {int(rss_id) for rss_id in value.split(",") if rss_id.strip()}
+
+
+class SavedSearchMatcher:
+    """
+    모든 저장 검색의 단어로 automaton 하나를 만들어
+    새 item 의 title 을 한 번만 훑고 일치하는 저장 검색을 찾는다.
+    """
+
+    def __init__(self, reload_seconds: float = SAVED_SEARCH_RELOAD_SECONDS):
+        self.reload_seconds = reload_seconds
+        self._lock = threading.Lock()
+        self._searches: list[CompiledSearch] = []
+        self._automaton = Automaton([])
+        # 단어 -> 그 단어를 +/일반 단어로 가진 저장 검색
+        self._term_searches: dict[str, list[CompiledSearch]] = {}
+        self._loaded_at: Optional[float] = None
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._loaded_at = None
+
+    def load(self, db_saved_searches: Iterable[models.SavedSearch]) -> None:
+        searches = [CompiledSearch.parse(row) for row in db_saved_searches]
+        terms = sorted({term for search in searches for term in search.terms})
+        automaton = Automaton(terms)
+        term_searches = {}
+        for search in searches:
+            for term in search.required | search.optional:
+                term_searches.setdefault(term, []).append(search)
+        with self._lock:
+            self._searches = searches
+            self._automaton = automaton
+            self._term_searches = term_searches
+            self._loaded_at = time.monotonic()
+        logger.info(f"saved search loaded: {len(searches)} searches, {len(terms)} terms")
+
+    def is_stale(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.reload_seconds
+
+    def match(self, title: str, rss_id: int,
+              loader: Optional[Callable[[], Iterable[models.SavedSearch]]] = None) -> list[int]:
+        """일치하는 저장 검색 id. loader 가 있으면 오래된 경우 다시 읽는다."""
+        if loader is not None and self.is_stale():
+            self.load(loader())
+
+        with self._lock:
+            automaton, term_searches = self._automaton, self._term_searches
+
+        if not term_searches:
+            return []
+
+        found = {automaton.patterns[index] for index in automaton.search(title.lower())}
+        # title 에 나온 단어를 가진 저장 검색만 확인한다.
+        candidates = {search.id: search for term in found for search in term_searches.get(term, ())}
+        return sorted(search_id for search_id, search in candidates.items()
+                      if search.accept_rss(rss_id) and search.is_match(found))
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                "searches": len(self._searches),
+                "terms": len(self._automaton),
+                "loaded_at": self._loaded_at,
+            }
+
+
+matcher = SavedSearchMatcher()
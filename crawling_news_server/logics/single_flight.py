@@ -0,0 +1,75 @@
+import time
+import threading
+from typing import Any, Callable, Hashable, Optional
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.done_at: Optional[float] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    같은 key 로 동시에 들어온 호출을 하나로 합친다.
+    먼저 들어온 호출만 fn 을 실행하고 나머지는 그 결과(또는 예외)를 공유한다.
+    성공한 결과는 ttl 초 동안 재사용한다.
+    """
+
+    def __init__(self, ttl: float = 0):
+        self.ttl = ttl
+        self.executed_count = 0
+        self.shared_count = 0
+        self._lock = threading.Lock()
+        self._calls: dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None and call.done_at is not None:
+                if call.error is None and time.monotonic() - call.done_at < self.ttl:
+                    self.shared_count += 1
+                    return call.result
+                call = None
+
+            if call is not None:
+                call.waiters += 1
+                self.shared_count += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.executed_count += 1
+                leader = True
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                call.done_at = time.monotonic()
+                if call.error is not None or self.ttl <= 0:
+                    self._calls.pop(key, None)
+            call.event.set()
+        return call.result
+
+    def forget(self, key: Hashable) -> None:
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None and call.done_at is not None:
+                del self._calls[key]
+
+    def in_flight(self) -> list[Hashable]:
+        with self._lock:
+            return [key for key, call in self._calls.items() if call.done_at is None]
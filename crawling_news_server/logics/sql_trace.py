@@ -0,0 +1,217 @@
+"""
+요청별 SQL 추적과 느린 query 기록. SQL_TRACE=TRUE 일 때만 켠다.
+
+* 요청마다 실행한 statement 수, DB 시간 합계, 가장 느린 statement 를 Server-Timing 헤더로 돌려준다.
+* SQL_SLOW_SECONDS 이상 걸린 statement 는 SQL_SLOW_SAMPLE_RATE 비율로 parameter 와 함께 logger 에 남기고
+  최근 SQL_SLOW_LOG_SIZE 개를 /db/slow-queries 로 보여준다. SQL_SLOW_EXPLAIN=TRUE 면 SELECT 의 실행 계획도 붙인다.
+"""
+import os
+import json
+import time
+import queue
+import random
+import logging
+import threading
+import contextvars
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Connection, Engine
+
+logger = logging.getLogger(__name__)
+
+SQL_TRACE = os.environ.get("SQL_TRACE", "FALSE") == "TRUE"
+# Server-Timing 에 넣는 느린 statement 수
+SQL_TRACE_TOP = int(os.environ.get("SQL_TRACE_TOP", "3"))
+# 요청 하나가 이보다 많은 statement 를 실행하면 경고한다(N+1 확인용).
+SQL_TRACE_MANY_STATEMENTS = int(os.environ.get("SQL_TRACE_MANY_STATEMENTS", "50"))
+SQL_SLOW_SECONDS = float(os.environ.get("SQL_SLOW_SECONDS", "0.5"))
+SQL_SLOW_SAMPLE_RATE = float(os.environ.get("SQL_SLOW_SAMPLE_RATE", "1"))
+SQL_SLOW_EXPLAIN = os.environ.get("SQL_SLOW_EXPLAIN", "FALSE") == "TRUE"
+SQL_SLOW_LOG_SIZE = int(os.environ.get("SQL_SLOW_LOG_SIZE", "100"))
+# 로그에 남기는 statement, parameter 의 최대 길이
+SQL_TRACE_TEXT_LIMIT = 2000
+
+SKIP_OPTION = "sql_trace_skip"
+
+
+def _shorten(text: str, limit: int = SQL_TRACE_TEXT_LIMIT) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit] + "…"
+
+
+@dataclass
+class RequestTrace:
+    path: str
+    statement_count: int = 0
+    seconds: float = 0.0
+    # (걸린 시간, statement) 느린 순으로 SQL_TRACE_TOP 개
+    slowest: list[tuple[float, str]] = field(default_factory=list)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add(self, seconds: float, statement: str) -> None:
+        with self._lock:
+            self.statement_count += 1
+            self.seconds += seconds
+            if len(self.slowest) < SQL_TRACE_TOP or seconds > self.slowest[-1][0]:
+                self.slowest.append((seconds, statement))
+                self.slowest.sort(key=lambda item: item[0], reverse=True)
+                del self.slowest[SQL_TRACE_TOP:]
+
+    def server_timing(self) -> str:
+        parts = [f'db;dur={self.seconds * 1000:.1f};desc="{self.statement_count} statements"']
+        for n, (seconds, statement) in enumerate(self.slowest, start=1):
+            # 헤더는 latin-1 이므로 "…" 대신 "..." 을 쓴다.
+            desc = " ".join(statement.split())
+            desc = (desc if len(desc) <= 80 else desc[:80] + "...").replace('"', "'").replace("\\", "/")
+            parts.append(f'sql{n};dur={seconds * 1000:.1f};desc="{desc}"')
+        return ", ".join(parts)
+
+
+_current: contextvars.ContextVar[Optional[RequestTrace]] = contextvars.ContextVar("sql_trace", default=None)
+
+
+class SlowQueryLog:
+    """느린 statement 를 표본으로 남긴다. EXPLAIN 은 요청을 막지 않도록 별도 thread 에서 실행한다."""
+
+    def __init__(self, size: int = SQL_SLOW_LOG_SIZE):
+        self.recorded_count = 0
+        self.skipped_count = 0
+        self._lock = threading.Lock()
+        self._entries: deque[dict[str, Any]] = deque(maxlen=size)
+        self._explain_queue: queue.Queue = queue.Queue(maxsize=100)
+        self._explain_thread: Optional[threading.Thread] = None
+
+    def record(self, engine: Engine, seconds: float, statement: str, parameters: Any, path: Optional[str]) -> None:
+        if random.random() >= SQL_SLOW_SAMPLE_RATE:
+            with self._lock:
+                self.skipped_count += 1
+            return
+
+        entry = {
+            "at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "ms": round(seconds * 1000, 1),
+            "path": path,
+            "statement": _shorten(statement),
+            "parameters": _shorten(repr(parameters), 500),
+            "explain": None,
+        }
+        with self._lock:
+            self.recorded_count += 1
+            self._entries.append(entry)
+
+        if SQL_SLOW_EXPLAIN and not engine.dialect.is_async and statement.lstrip()[:6].upper() == "SELECT":
+            self._start_explain(engine)
+            try:
+                self._explain_queue.put_nowait((engine, entry, statement, parameters))
+                return
+            except queue.Full:
+                pass
+        logger.warning(f"slow query {json.dumps(entry, ensure_ascii=False, default=str)}")
+
+    def _start_explain(self, engine: Engine) -> None:
+        if self._explain_thread and self._explain_thread.is_alive():
+            return
+        with self._lock:
+            if self._explain_thread and self._explain_thread.is_alive():
+                return
+            self._explain_thread = threading.Thread(target=self._run_explain, name="sql-explain", daemon=True)
+            self._explain_thread.start()
+
+    def _run_explain(self) -> None:
+        while True:
+            engine, entry, statement, parameters = self._explain_queue.get()
+            try:
+                entry["explain"] = explain(engine, statement, parameters)
+            except Exception as e:
+                entry["explain"] = f"{type(e).__name__}: {e}"
+            logger.warning(f"slow query {json.dumps(entry, ensure_ascii=False, default=str)}")
+
+    def entries(self) -> list[dict[str, Any]]:
+        with self._lock:
+            return list(reversed(self._entries))
+
+    def status(self) -> dict:
+        return {
+            "enabled": SQL_TRACE,
+            "slow_seconds": SQL_SLOW_SECONDS,
+            "sample_rate": SQL_SLOW_SAMPLE_RATE,
+            "explain": SQL_SLOW_EXPLAIN,
+            "recorded_count": self.recorded_count,
+            "skipped_count": self.skipped_count,
+            "data": self.entries(),
+        }
+
+
+def explain(engine: Engine, statement: str, parameters: Any) -> list[str]:
+    """느린 statement 를 실행한 engine 의 새 connection 에서 실행 계획을 본다."""
+    prefix = "EXPLAIN QUERY PLAN " if engine.dialect.name == "sqlite" else "EXPLAIN "
+    with engine.connect().execution_options(**{SKIP_OPTION: True}) as conn:
+        rows = conn.exec_driver_sql(prefix + statement, parameters or ()).all()
+    return [" | ".join(str(value) for value in row) for row in rows]
+
+
+slow_log = SlowQueryLog()
+# async engine 의 sync_engine -> 같은 DB 의 동기 engine. EXPLAIN 은 동기 engine 으로 실행한다.
+_explain_engines: dict[Engine, Engine] = {}
+
+
+def _before_cursor_execute(conn: Connection, cursor, statement, parameters, context, executemany) -> None:
+    # 실패한 문장은 after 가 불리지 않으므로 connection 이 아닌 문장의 context 에 둔다.
+    if context is not None:
+        context._sql_trace_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn: Connection, cursor, statement, parameters, context, executemany) -> None:
+    if (started := getattr(context, "_sql_trace_started", None)) is None:
+        return
+    if conn.get_execution_options().get(SKIP_OPTION):
+        return
+    seconds = time.perf_counter() - started
+    trace = _current.get()
+    if trace is not None:
+        trace.add(seconds, statement)
+    if seconds >= SQL_SLOW_SECONDS:
+        engine = _explain_engines.get(conn.engine, conn.engine)
+        slow_log.record(engine, seconds, statement, parameters, trace.path if trace else None)
+
+
+def install(explain_engines: Optional[dict[Engine, Engine]] = None) -> None:
+    """모든 engine(async engine 의 sync_engine 포함)에 event 를 건다."""
+    _explain_engines.update(explain_engines or {})
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class SQLTraceMiddleware:
+    """요청마다 RequestTrace 를 만들고 응답 헤더에 Server-Timing, X-DB-Statements 를 붙인다."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace = RequestTrace(scope.get("path", ""))
+        token = _current.set(trace)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", trace.server_timing().encode("latin-1", "replace")))
+                headers.append((b"x-db-statements", str(trace.statement_count).encode()))
+                message = {**message, "headers": headers}
+                if trace.statement_count >= SQL_TRACE_MANY_STATEMENTS:
+                    logger.warning(f"{trace.path}: {trace.statement_count} statements, "
+                                   f"{trace.seconds * 1000:.1f}ms in DB")
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
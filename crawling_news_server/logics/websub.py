@@ -0,0 +1,170 @@
+import os
+import hmac
+import hashlib
+import logging
+import secrets
+import datetime
+from typing import Optional
+
+import feedparser
+import requests
+from sqlalchemy.orm import Session
+
+from crawling_news_server import crud, models
+from crawling_news_server.crawl import fetcher
+
+logger = logging.getLogger(__name__)
+
+# 외부에서 접근 가능한 서버 주소. 없으면 WebSub 구독을 하지 않는다.
+WEBSUB_CALLBACK_URL = os.environ.get("WEBSUB_CALLBACK_URL", "").rstrip("/")
+WEBSUB_LEASE_SECONDS = int(os.environ.get("WEBSUB_LEASE_SECONDS", str(10 * 24 * 3600)))
+# push 를 받는 rss 의 안전 확인용 polling 주기
+WEBSUB_POLL_SECONDS = int(os.environ.get("WEBSUB_POLL_SECONDS", str(12 * 3600)))
+WEBSUB_RENEW_INTERVAL = int(os.environ.get("WEBSUB_RENEW_INTERVAL", str(6 * 3600)))
+# 만료 이 시간(초) 전에 구독을 갱신한다.
+WEBSUB_RENEW_BEFORE = int(os.environ.get("WEBSUB_RENEW_BEFORE", str(24 * 3600)))
+
+
+def is_enabled() -> bool:
+    return bool(WEBSUB_CALLBACK_URL)
+
+
+def callback_url(rss_id: int) -> str:
+    return f"{WEBSUB_CALLBACK_URL}/api/v2/websub/{rss_id}"
+
+
+def find_hub(rss_obj: feedparser.FeedParserDict, url: str) -> tuple[Optional[str], str]:
+    """feed 의 <link rel="hub"> 와 <link rel="self"> 를 찾는다. self 가 없으면 rss url 을 topic 으로 사용"""
+    hub, topic = None, url
+    for link in rss_obj.get("feed", {}).get("links", []):
+        if link.get("rel") == "hub" and not hub:
+            hub = link.get("href")
+        elif link.get("rel") == "self" and link.get("href"):
+            topic = link.get("href")
+    return hub, topic
+
+
+def is_push_active(db_subscription: Optional[models.WebSubSubscription]) -> bool:
+    return bool(db_subscription
+                and db_subscription.state == "active"
+                and db_subscription.expires_at
+                and db_subscription.expires_at > datetime.datetime.utcnow())
+
+
+def request_subscription(
+        db: Session, rss_id: int, hub: str, topic: str, mode: str = "subscribe"
+) -> models.WebSubSubscription:
+    """hub 에 구독(해지) 요청을 보낸다. 실제 활성화는 hub 의 확인 요청(verify_intent)에서 이루어진다."""
+    db_subscription = crud.get_websub_subscription(db, rss_id)
+    if db_subscription is None:
+        db_subscription = models.WebSubSubscription(rss_id=rss_id, hub=hub, topic=topic, secret=secrets.token_hex(20))
+    db_subscription.hub = hub
+    db_subscription.topic = topic
+    db_subscription.pending_mode = mode
+    if mode == "subscribe" and db_subscription.state != "active":
+        db_subscription.state = "pending"
+    db_subscription = crud.update_websub_subscription(db, db_subscription)
+
+    data = {
+        "hub.callback": callback_url(rss_id),
+        "hub.mode": mode,
+        "hub.topic": topic,
+    }
+    if mode == "subscribe":
+        data["hub.secret"] = db_subscription.secret
+        data["hub.lease_seconds"] = WEBSUB_LEASE_SECONDS
+
+    response = requests.post(hub, data=data, timeout=(fetcher.FETCH_CONNECT_TIMEOUT, fetcher.FETCH_READ_TIMEOUT))
+    response.raise_for_status()
+    logger.info(f"[{rss_id:<10}]({hub:<55}): WebSub {mode} requested, {response.status_code}")
+    return db_subscription
+
+
+def ensure_subscription(db: Session, rss_id: int, url: str, rss_obj: feedparser.FeedParserDict) -> None:
+    """hub 를 광고하는 rss 에 아직 구독이 없으면 구독을 요청한다."""
+    if not is_enabled():
+        return
+
+    hub, topic = find_hub(rss_obj, url)
+    if not hub:
+        return
+
+    db_subscription = crud.get_websub_subscription(db, rss_id)
+    if db_subscription and db_subscription.hub == hub and db_subscription.state in ("pending", "active", "denied"):
+        return
+
+    request_subscription(db, rss_id, hub, topic)
+
+
+def verify_intent(
+        db: Session, rss_id: int, mode: str, topic: str, challenge: str, lease_seconds: Optional[int]
+) -> Optional[str]:
+    """
+    hub 의 구독 확인 요청을 처리하고 응답할 본문을 돌려준다.
+    우리가 보낸 요청(pending_mode)과 mode, topic 이 맞지 않으면 None.
+    denied 는 subscribe 요청에 대한 거절 통보이므로 challenge 없이 빈 본문으로 응답한다.
+    """
+    db_subscription = crud.get_websub_subscription(db, rss_id)
+    if db_subscription is None or db_subscription.topic != topic:
+        return None
+    expected_mode = "subscribe" if mode == "denied" else mode
+    if db_subscription.pending_mode != expected_mode:
+        logger.warning(f"[{rss_id:<10}]({db_subscription.hub:<55}): "
+                       f"WebSub {mode} without pending request ({db_subscription.pending_mode}), ignore")
+        return None
+
+    now = datetime.datetime.utcnow()
+    if mode == "subscribe":
+        db_subscription.state = "active"
+        db_subscription.lease_seconds = lease_seconds or WEBSUB_LEASE_SECONDS
+        db_subscription.expires_at = now + datetime.timedelta(seconds=db_subscription.lease_seconds)
+        db_subscription.verified_at = now
+    elif mode == "unsubscribe":
+        db_subscription.state = "unsubscribed"
+        db_subscription.expires_at = None
+    elif mode == "denied":
+        db_subscription.state = "denied"
+        db_subscription.expires_at = None
+        challenge = ""
+    else:
+        return None
+
+    db_subscription.pending_mode = None
+    crud.update_websub_subscription(db, db_subscription)
+    logger.info(f"[{rss_id:<10}]({db_subscription.hub:<55}): WebSub {mode} verified")
+    return challenge
+
+
+def verify_signature(secret: str, body: bytes, signature: Optional[str]) -> bool:
+    """X-Hub-Signature: <method>=<hex digest> 검증"""
+    if not signature or "=" not in signature:
+        return False
+    method, digest = signature.split("=", 1)
+    if method not in ("sha1", "sha256", "sha384", "sha512"):
+        return False
+    expected = hmac.new(secret.encode(), body, getattr(hashlib, method)).hexdigest()
+    return hmac.compare_digest(expected, digest.strip())
+
+
+def body_to_text(body: bytes, content_type: Optional[str]) -> str:
+    encoding = requests.utils.get_encoding_from_headers({"content-type": content_type or ""})
+    if not encoding or encoding == "ISO-8859-1":
+        encoding = "utf-8"
+    if body.startswith(b'\xef\xbb\xbf'):
+        body = body[3:]
+        encoding = "utf-8"
+    return body.decode(encoding, errors="replace").strip()
+
+
+def record_push(db: Session, db_subscription: models.WebSubSubscription) -> None:
+    db_subscription.last_push_at = datetime.datetime.utcnow()
+    crud.update_websub_subscription(db, db_subscription)
+
+
+def renew_expiring(db: Session) -> None:
+    before = datetime.datetime.utcnow() + datetime.timedelta(seconds=WEBSUB_RENEW_BEFORE)
+    for db_subscription in crud.get_websub_subscriptions_expiring(db, before):
+        try:
+            request_subscription(db, db_subscription.rss_id, db_subscription.hub, db_subscription.topic)
+        except Exception as e:
+            logger.warning(f"[{db_subscription.rss_id:<10}]({db_subscription.hub:<55}): WebSub renew error {e}")
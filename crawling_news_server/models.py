@@ -3,7 +3,7 @@ from typing import List, Optional
 from datetime import datetime
 
 from sqlalchemy.sql import func
-from sqlalchemy import ForeignKey, String, Text, DateTime, text, Engine
+from sqlalchemy import ForeignKey, String, Text, DateTime, Float, BigInteger, Index, text, Engine
 from sqlalchemy.orm import Mapped
 from sqlalchemy.orm import mapped_column
 from sqlalchemy.orm import relationship
@@ -12,6 +12,9 @@ from sqlalchemy.inspection import inspect
 
 from .database import Base
 
+# MySQL 에서는 LONGTEXT, 그 외(SQLite 등)에서는 TEXT
+LongText = Text().with_variant(LONGTEXT(), "mysql", "mariadb")
+
 
 class RSS(Base):
     __tablename__ = "rss"
@@ -23,7 +26,7 @@ class RSS(Base):
     delay: Mapped[int] = mapped_column(server_default='60')
 
     title: Mapped[str] = mapped_column(String(1024), nullable=False)
-    description: Mapped[str] = mapped_column(LONGTEXT, nullable=False)
+    description: Mapped[str] = mapped_column(LongText, nullable=False)
     link: Mapped[str] = mapped_column(String(1024), nullable=False)
 
     # Optional
@@ -53,6 +56,7 @@ class RSS(Base):
     image: Mapped["RSSImage"] = relationship("RSSImage", back_populates="rss")
     items: Mapped[List["RSSItem"]] = relationship()
     responses: Mapped[List["ResponseRecord"]] = relationship(lazy=True)
+    health: Mapped[Optional["RSSHealth"]] = relationship(back_populates="rss", uselist=False)
 
 
 class RSSImage(Base):
@@ -74,8 +78,13 @@ class RSSItem(Base):
 
     id: Mapped[int] = mapped_column(primary_key=True)
     title: Mapped[str] = mapped_column(String(1024), nullable=False)
-    description: Mapped[str] = mapped_column(LONGTEXT, nullable=False)
+    description: Mapped[str] = mapped_column(LongText, nullable=False)
+    # description 의 tag 를 없앤 평문과 목록용 앞부분 (crawl.html_text)
+    body_text: Mapped[Optional[str]] = mapped_column(LongText)
+    snippet: Mapped[Optional[str]] = mapped_column(Text)
     link: Mapped[str] = mapped_column(String(768), nullable=False, index=True)
+    # 정규화한 link 의 64bit hash (crawl.canonical_link.link_hash)
+    link_hash: Mapped[Optional[int]] = mapped_column(BigInteger)
 
     # Optional
     author: Mapped[Optional[str]] = mapped_column(Text)
@@ -98,8 +107,21 @@ class RSSItem(Base):
     rss_id: Mapped[int] = mapped_column(ForeignKey("rss.id"))
     rss = relationship("RSS", back_populates="items")
 
+    __table_args__ = (
+        # rss 별 최신순 목록
+        Index("ix_rss_items_rss_id_id", "rss_id", "id"),
+        # 수집시 중복 확인
+        Index("ux_rss_items_rss_id_link_hash", "rss_id", "link_hash", unique=True),
+        # distinct 검색시 feed 간 중복 묶기
+        Index("ix_rss_items_link_hash", "link_hash"),
+    )
+
     @classmethod
     def create_fulltext_index(cls, engine: Engine):
+        # FULLTEXT 인덱스는 MySQL 에서만 지원
+        if engine.dialect.name not in ("mysql", "mariadb"):
+            return
+
         index_name = 'title_fulltext_index'
         inspector = inspect(engine)
         with engine.connect() as conn:
@@ -109,6 +131,36 @@ class RSSItem(Base):
                 conn.execute(index_query)
 
 
+def create_missing_columns(engine: Engine):
+    """create_all 은 이미 있는 테이블에 컬럼을 추가하지 않으므로 빠진 nullable 컬럼만 추가한다."""
+    inspector = inspect(engine)
+    with engine.connect() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            column_names = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in column_names or not column.nullable:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+        conn.commit()
+
+
+def create_missing_indexes(engine: Engine):
+    """create_all 은 이미 있는 테이블에 인덱스를 추가하지 않으므로 빠진 인덱스만 만든다."""
+    inspector = inspect(engine)
+    with engine.connect() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            index_names = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in index_names:
+                    index.create(bind=conn)
+        conn.commit()
+
+
 class ResponseEncoding(Base):
     __tablename__ = "response_encodings"
 
@@ -123,9 +175,166 @@ class ResponseRecord(Base):
     id: Mapped[int] = mapped_column(primary_key=True)
     link: Mapped[str] = mapped_column(String(768), nullable=False, index=True)
     status_code: Mapped[int] = mapped_column(server_default="200")
-    body: Mapped[str] = mapped_column(LONGTEXT)
+    body: Mapped[str] = mapped_column(LongText)
 
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
 
     rss_id: Mapped[int] = mapped_column(ForeignKey("rss.id"))
     rss = relationship("RSS", back_populates="responses", lazy=True)
+
+    __table_args__ = (
+        Index("ix_response_records_rss_id_id", "rss_id", "id"),
+    )
+
+
+class RSSHealth(Base):
+    __tablename__ = "rss_health"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    fail_count: Mapped[int] = mapped_column(default=0, server_default="0")
+    last_error: Mapped[Optional[str]] = mapped_column(Text)
+    last_status_code: Mapped[Optional[int]] = mapped_column()
+    last_success_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+    last_failure_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+    next_retry_at: Mapped[Optional[datetime]] = mapped_column(DateTime, index=True)
+    poll_count: Mapped[int] = mapped_column(default=0, server_default="0")
+    yield_avg: Mapped[Optional[float]] = mapped_column(Float)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=func.now(), onupdate=func.now(), server_default=func.now())
+
+    rss_id: Mapped[int] = mapped_column(ForeignKey("rss.id"), unique=True, index=True)
+    rss: Mapped["RSS"] = relationship(back_populates="health")
+
+
+class WebSubSubscription(Base):
+    __tablename__ = "websub_subscriptions"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    hub: Mapped[str] = mapped_column(String(1024), nullable=False)
+    topic: Mapped[str] = mapped_column(String(1024), nullable=False)
+    secret: Mapped[str] = mapped_column(String(128), nullable=False)
+    # pending, active, denied, unsubscribed
+    state: Mapped[str] = mapped_column(String(16), default="pending", server_default="pending")
+    # hub 에 보낸 뒤 아직 확인받지 않은 요청(subscribe, unsubscribe). 이 mode 의 확인 요청만 받는다.
+    pending_mode: Mapped[Optional[str]] = mapped_column(String(16))
+    lease_seconds: Mapped[Optional[int]] = mapped_column()
+    expires_at: Mapped[Optional[datetime]] = mapped_column(DateTime, index=True)
+    verified_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+    last_push_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=func.now(), server_default=func.now())
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=func.now(), onupdate=func.now(), server_default=func.now())
+
+    rss_id: Mapped[int] = mapped_column(ForeignKey("rss.id"), unique=True, index=True)
+    rss: Mapped["RSS"] = relationship()
+
+
+class RSSItemRollup(Base):
+    """rss 별 시간(hour) 단위 item 수. publish_datetime 기준"""
+    __tablename__ = "rss_item_rollups"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    bucket: Mapped[datetime] = mapped_column(DateTime, nullable=False, index=True)
+    count: Mapped[int] = mapped_column(default=0, server_default="0")
+
+    rss_id: Mapped[int] = mapped_column(ForeignKey("rss.id"))
+
+    __table_args__ = (
+        Index("ux_rss_item_rollups_rss_id_bucket", "rss_id", "bucket", unique=True),
+    )
+
+
+class SavedSearch(Base):
+    """수집시 새 item 과 비교하는 저장 검색"""
+    __tablename__ = "saved_searches"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    name: Mapped[str] = mapped_column(String(256), nullable=False)
+    query: Mapped[str] = mapped_column(String(1024), nullable=False)
+    # 쉼표로 구분한 rss_id 목록
+    white_rss_id: Mapped[Optional[str]] = mapped_column(Text)
+    black_rss_id: Mapped[Optional[str]] = mapped_column(Text)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=func.now(), server_default=func.now())
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=func.now(), onupdate=func.now(), server_default=func.now())
+
+    matches: Mapped[List["SavedSearchMatch"]] = relationship(back_populates="saved_search", cascade="all, delete-orphan")
+
+
+class SavedSearchMatch(Base):
+    __tablename__ = "saved_search_matches"
+
+    # 새 일치 결과 조회의 cursor
+    id: Mapped[int] = mapped_column(primary_key=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=func.now(), server_default=func.now())
+
+    saved_search_id: Mapped[int] = mapped_column(ForeignKey("saved_searches.id"))
+    saved_search: Mapped["SavedSearch"] = relationship(back_populates="matches")
+    rss_item_id: Mapped[int] = mapped_column(ForeignKey("rss_items.id"))
+    rss_item: Mapped["RSSItem"] = relationship()
+
+    __table_args__ = (
+        Index("ix_saved_search_matches_saved_search_id_id", "saved_search_id", "id"),
+    )
+
+
+class RSSItemIdRange(Base):
+    """publish_datetime 시간(hour) 별 item id 범위. 날짜 조건을 id 범위 조건으로 바꿀 때 사용한다."""
+    __tablename__ = "rss_item_id_ranges"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    bucket: Mapped[datetime] = mapped_column(DateTime, nullable=False, unique=True, index=True)
+    min_id: Mapped[int] = mapped_column(nullable=False)
+    max_id: Mapped[int] = mapped_column(nullable=False)
+
+
+class LateRSSItem(Base):
+    """수집 시각과 publish_datetime 이 크게 다른 item. rss_item_id_ranges 에는 포함하지 않는다."""
+    __tablename__ = "late_rss_items"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    publish_datetime: Mapped[datetime] = mapped_column(DateTime, nullable=False, index=True)
+
+    rss_item_id: Mapped[int] = mapped_column(ForeignKey("rss_items.id"), unique=True)
+
+
+class RSSItemJson(Base):
+    """직렬화한 item JSON(rss 제외). ITEM_JSON_PERSIST 가 켜져 있을 때만 저장한다."""
+    __tablename__ = "rss_item_json"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    # description 을 포함한 JSON
+    body: Mapped[str] = mapped_column(LongText, nullable=False)
+    # 목록용(description 제외) JSON
+    summary: Mapped[Optional[str]] = mapped_column(LongText)
+
+    rss_item_id: Mapped[int] = mapped_column(ForeignKey("rss_items.id"), unique=True)
+
+
+class RSSItemJsonInvalidation(Base):
+    """commands 가 고친 item. 실행 중인 서버가 item JSON cache 에서 뺀다(logics.item_json.sync_invalidations)."""
+    __tablename__ = "rss_item_json_invalidations"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    # archive 로 옮겨 지워질 수 있으므로 FK 를 두지 않는다.
+    rss_item_id: Mapped[int] = mapped_column(nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=func.now(), server_default=func.now(), index=True)
+
+
+class ArchiveSegment(Base):
+    """
+    archive 로 옮긴 rss_items 한 달치 segment 파일(logics.archive).
+    rss_items 에는 max(max_id) 보다 큰 id 만 남는다.
+    """
+    __tablename__ = "archive_segments"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    month: Mapped[str] = mapped_column(String(7), nullable=False, index=True)
+    path: Mapped[str] = mapped_column(String(255), nullable=False, unique=True)
+    item_count: Mapped[int] = mapped_column(nullable=False)
+    min_id: Mapped[int] = mapped_column(nullable=False)
+    max_id: Mapped[int] = mapped_column(nullable=False, index=True)
+    min_publish_datetime: Mapped[Optional[datetime]] = mapped_column(DateTime)
+    max_publish_datetime: Mapped[Optional[datetime]] = mapped_column(DateTime)
+    # rss_id 별 item 수 JSON({"1": 10, ...})
+    rss_counts: Mapped[Optional[str]] = mapped_column(Text)
+    # link 가 같은 item 중 archive 전체에서 id 가 가장 큰 것이 이 segment 에 있는 수. 합하면 archive 의 distinct 수
+    distinct_count: Mapped[Optional[int]] = mapped_column()
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=func.now(), server_default=func.now())
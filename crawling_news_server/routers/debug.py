@@ -0,0 +1,77 @@
+from typing import Literal, Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
+
+from crawling_news_server.logics import profiler
+
+# main.py 에서 DEBUG_ENDPOINTS=TRUE 일 때만 붙인다.
+router = APIRouter(
+    prefix="/debug",
+)
+
+StatisticKey = Literal["lineno", "filename", "traceback"]
+
+
+@router.get("/profile", response_class=PlainTextResponse)
+async def get_profile(
+        seconds: float = Query(10, gt=0, le=profiler.PROFILE_MAX_SECONDS),
+        interval: float = Query(0.01, ge=profiler.PROFILE_MIN_INTERVAL, le=1),
+        idle: bool = False):
+    """seconds 동안 모든 thread 를 sampling 한 collapsed stack. flamegraph.pl, speedscope 로 본다."""
+    try:
+        result = await run_in_threadpool(profiler.profiler.run, seconds, interval, idle)
+    except profiler.ProfilerBusy:
+        raise HTTPException(status_code=409, detail="profile already running")
+    return PlainTextResponse(profiler.SamplingProfiler.collapsed(result), headers={
+        "X-Profile-Samples": f"{result['samples']}",
+        "X-Profile-Seconds": f"{result['seconds']}",
+    })
+
+
+@router.get("/memory")
+async def get_memory_status():
+    return profiler.memory.status()
+
+
+@router.post("/memory/start")
+async def start_memory_trace(frames: int = Query(profiler.TRACEMALLOC_FRAMES, ge=1, le=100)):
+    """tracemalloc 을 켠다. 켜져 있는 동안 할당이 느려지고 메모리를 더 쓴다."""
+    return profiler.memory.start(frames)
+
+
+@router.post("/memory/stop")
+async def stop_memory_trace():
+    return profiler.memory.stop()
+
+
+@router.post("/memory/snapshots")
+async def take_memory_snapshot(key: StatisticKey = "lineno", limit: int = Query(20, ge=1, le=500)):
+    """snapshot 을 찍고 할당이 많은 곳과 직전 snapshot 대비 늘어난 곳을 돌려준다."""
+    snapshot_id = await run_in_threadpool(profiler.memory.take)
+    previous_id = profiler.memory.previous_id(snapshot_id)
+    return {
+        "id": snapshot_id,
+        "previous_id": previous_id,
+        "top": await run_in_threadpool(profiler.memory.top, snapshot_id, key, limit),
+        "diff": await run_in_threadpool(profiler.memory.diff, previous_id, snapshot_id, key, limit)
+        if previous_id else None,
+    }
+
+
+@router.get("/memory/diff")
+async def get_memory_diff(
+        target: int,
+        base: Optional[int] = None,
+        key: StatisticKey = "lineno",
+        limit: int = Query(20, ge=1, le=500)):
+    """base 가 없으면 target 바로 앞의 snapshot 과 비교한다."""
+    base = base or profiler.memory.previous_id(target)
+    if base is None:
+        raise HTTPException(status_code=404, detail="no snapshot to compare")
+    try:
+        data = await run_in_threadpool(profiler.memory.diff, base, target, key, limit)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=f"snapshot {e} not found")
+    return {"base": base, "target": target, "data": data}
@@ -8,16 +8,22 @@ from dotenv import load_dotenv
 import logging
 
 from fastapi import FastAPI, Depends, HTTPException, Body, Query
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from fastapi.middleware.cors import CORSMiddleware
 
-from crawling_news_server import crud, models, schemas, crawl
-from crawling_news_server.database import get_db, Base, engine, get_context_db
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from crawling_news_server import crud, crud_async, models, schemas, crawl
+from crawling_news_server.database import get_db, get_async_read_db, Base, engine, get_context_db
 
 import urllib3
 
-from crawling_news_server.jobs import add_job_rss_crawling, scheduler
+from crawling_news_server.jobs import add_job_rss_crawling, crawl_once, scheduler
+from crawling_news_server.crawl.canonical_link import canonicalize_link
 from crawling_news_server.crawl.extract_rss_data import extract_rss_urls
+from crawling_news_server.logics import discovery
+from crawling_news_server.logics.read_your_writes import stick_to_primary
 import requests
 
 logger = logging.getLogger(__name__)
@@ -29,7 +35,7 @@ router = APIRouter(
 
 
 @router.get('/', response_model=schemas.RssResponse)
-async def read_rss(q: Optional[str] = None, offset: int = 1, limit: int = 50, db: Session = Depends(get_db)):
+async def read_rss(q: Optional[str] = None, offset: int = 1, limit: int = 50, db: AsyncSession = Depends(get_async_read_db)):
     """
 
     :param q: title과 description에서 해당 텍스트를 검색한다.
@@ -39,16 +45,16 @@ async def read_rss(q: Optional[str] = None, offset: int = 1, limit: int = 50, db
     :return: RSS 객체
     """
     if q:
-        return crud.get_all_rss_search(db, q, offset, limit)
+        return await crud_async.get_all_rss_search(db, q, offset, limit)
 
     else:
-        return crud.get_all_rss(db, offset, limit)
+        return await crud_async.get_all_rss(db, offset, limit)
 
 
 @router.get('/items', response_model=schemas.RssItemListResponse)
 async def read_rss_items(
         q: Optional[str] = None, start_dt: Optional[str] = None, end_dt: Optional[str] = None,
-        offset: int = 1, limit: int = 50, distinct: bool = True, db: Session = Depends(get_db)):
+        offset: int = 1, limit: int = 50, distinct: bool = True, db: AsyncSession = Depends(get_async_read_db)):
 
     if start_dt:
         try:
@@ -64,25 +70,25 @@ async def read_rss_items(
 
     logger.info(f"{start_dt}, {end_dt}")
 
-    return crud.find_rss_item_by_title(db, q, offset, limit, distinct, start_dt, end_dt)
+    return await crud_async.find_rss_item_by_title(db, q, offset, limit, distinct, start_dt, end_dt)
 
 
 @router.get("/{rss_id}", response_model=schemas.RssResponseDto)
-async def read_user(rss_id: int, db: Session = Depends(get_db)):
-    db_rss = crud.get_rss(db, rss_id)
+async def read_user(rss_id: int, db: AsyncSession = Depends(get_async_read_db)):
+    db_rss = await crud_async.get_rss(db, rss_id)
     if db_rss is None:
         raise HTTPException(status_code=404, detail="RSS not found")
     return db_rss
 
 
 @router.get("/{rss_id}/items", response_model=List[schemas.RssItemResponseDto])
-async def read_rss_item_by_rss_id(rss_id: int, offset: int = 1, limit: int = 50, db: Session = Depends(get_db)):
-    return crud.get_rss_items(db, rss_id, offset, limit)['data']
+async def read_rss_item_by_rss_id(rss_id: int, offset: int = 1, limit: int = 50, db: AsyncSession = Depends(get_async_read_db)):
+    return (await crud_async.get_rss_items(db, rss_id, offset, limit))['data']
 
 
 @router.get("/{rss_id}/responses", response_model=List[schemas.ResponseRecordDto])
-async def read_rss_item_by_rss_id(rss_id: int, offset: int = 1, limit: int = 50, db: Session = Depends(get_db)):
-    return crud.get_rss_responses(db, rss_id, offset, limit)['data']
+async def read_rss_item_by_rss_id(rss_id: int, offset: int = 1, limit: int = 50, db: AsyncSession = Depends(get_async_read_db)):
+    return (await crud_async.get_rss_responses(db, rss_id, offset, limit))['data']
 
 
 @router.post("/", response_model=schemas.RssDto)
@@ -112,6 +118,7 @@ async def create_rss(rss: Annotated[
         raise HTTPException(status_code=400, detail="Can't add RSS")
 
     add_job_rss_crawling(db_rss)
+    stick_to_primary()
     return db_rss
 
 
@@ -120,39 +127,64 @@ async def crawl_from(url: str, db: Session = Depends(get_db)):
     data = await extract_rss_urls(url)
     logger.info(data)
     return data
-    pass
 
 
-@router.post("/{rss_id}/crawl")
-async def crawl_at(rss_id: int, db: Session = Depends(get_db)):
-    add_count = 0
-    rss = crud.get_rss(db, rss_id)
+@router.post("/discover", response_model=schemas.FeedDiscoveryResponse)
+async def discover_feeds(request: schemas.FeedDiscoveryRequest, db: Session = Depends(get_db)):
+    """
+    여러 site 에서 rss 를 찾아 실제로 읽히는 feed 만 점수 순으로 돌려준다.
+    data[].rss 는 POST /api/v2/rss 에 그대로 보낼 수 있다. 이미 등록된 feed 는 registered=true
+    """
+    if len(request.urls) > discovery.DISCOVERY_MAX_SITES:
+        raise HTTPException(status_code=400, detail=f"too many urls (max {discovery.DISCOVERY_MAX_SITES})")
 
-    response = requests.get(rss.url, headers=crawl.util.get_header(), verify=False)
+    sites, feeds = await discovery.discover(request.urls)
+    registered = await run_in_threadpool(crud.get_registered_rss_links, db, [feed.url for feed in feeds])
+    for feed in feeds:
+        feed.registered = canonicalize_link(feed.url) in registered
 
-    text = crawl.response_to_text.response_to_text(rss.url, response)
-    rss_obj = crawl.rss_fixer.fix_rss(rss.url, response.text)
+    return {
+        "total_count": len(feeds),
+        "data": [feed.to_dict() for feed in feeds],
+        "sites": [site.to_dict() for site in sites],
+    }
 
-    crud.update_rss_from_rss_dict(db, rss_id, rss_obj.get("feed", {}))
-    rt = []
 
-    for item in rss_obj.entries:
-        if crud.get_rss_item_by_rss_id_and_link(db, rss_id, item.link) is not None:
-            continue
+@router.post("/{rss_id}/crawl")
+async def crawl_at(rss_id: int, db: Session = Depends(get_db)):
+    rss = crud.get_rss(db, rss_id)
+    if rss is None:
+        raise HTTPException(status_code=404, detail="RSS not found")
+
+    try:
+        result = await run_in_threadpool(crawl_once, db, rss_id, rss.url)
+
+    except requests.exceptions.HTTPError as http_error:
+        error_response: requests.Response = http_error.response
+        return {
+            "total_count": 0,
+            "data": [],
+            "response": {
+                "status": error_response.status_code,
+                "body": crawl.response_to_text.response_to_text(rss.url, error_response)
+            }
+        }
 
-        if item := crud.create_rss_item_from_rss_item_obj(db, rss_id, item):
-            rt.append(item)
-            add_count += 1
+    except requests.exceptions.RequestException as e:
+        raise HTTPException(status_code=502, detail=f"{type(e).__name__}: {e}")
 
-    crud.create_rss_response_record(db, rss_id, rss.url, ("" if add_count else "<!-- ENTRY ZERO -->") + text, response.status_code)
+    if not result.add_count and result.entry_count:
+        # 수동 crawling 은 새 item 이 없어도 응답을 남긴다. 새 item 이 있거나 entry 가 없으면 fetch_and_ingest 가 남겼다.
+        crud.create_rss_response_record(db, rss_id, rss.url, "<!-- ENTRY ZERO -->" + result.text, result.status_code)
 
-    logger.info(rt)
+    logger.info(result.item_ids)
+    stick_to_primary()
 
     return {
-        "total_count": add_count,
-        "data": [row.id for row in rt],
+        "total_count": result.add_count,
+        "data": result.item_ids,
         "response": {
-            "status": response.status_code,
-            "body": text
+            "status": result.status_code,
+            "body": result.text
         }
     }
@@ -1,30 +1,43 @@
-from typing import Optional
+from typing import AsyncIterator, Optional
+import os
+import asyncio
 import datetime
 from fastapi import APIRouter, Query
 import logging
 
-from fastapi import FastAPI, Depends, HTTPException, Body, Query
-from sqlalchemy.orm import Session
+from fastapi import FastAPI, Depends, HTTPException, Body, Header, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from crawling_news_server import crud, models, schemas
-from crawling_news_server.database import get_db, Base, engine, get_context_db
+from crawling_news_server import crud_async, models, schemas
+from crawling_news_server.database import get_async_read_db, AsyncSessionLocal, Base, engine, get_context_db
+from crawling_news_server.logics import item_json
+from crawling_news_server.logics.broadcast import broadcaster
+from crawling_news_server.logics.hot_window import window
+from crawling_news_server.logics.facet_cache import facet_cache, normalize_key
 
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+SSE_KEEPALIVE_SECONDS = int(os.environ.get("SSE_KEEPALIVE_SECONDS", "15"))
+# 재연결시 Last-Event-ID 이후 DB 에서 다시 보내는 최대 item 수
+SSE_RESUME_LIMIT = int(os.environ.get("SSE_RESUME_LIMIT", "1000"))
+
 router = APIRouter(
     prefix="/api/v2/items",
 )
 
 
-@router.get('/', response_model=schemas.RssItemListResponse)
-def read_rss_items(
+@router.get('/', response_model=schemas.RssItemFacetListResponse)
+async def read_rss_items(
         q: Optional[str] = None, start_dt: Optional[str] = None, end_dt: Optional[str] = None,
         offset: int = 1, limit: int = 50, distinct: bool = True,
         white_rss_id: Optional[str] = Query(None, description="include rss_id list", example='1,2,3'),
         black_rss_id: Optional[str] = Query(None, description="exclude rss_id list", example='4,5,6'),
-        db: Session = Depends(get_db)):
+        facets: Optional[str] = Query(None, description="grouped counts: rss_id, publish_date", example='rss_id'),
+        description: bool = Query(False, description="include full description instead of snippet only"),
+        db: AsyncSession = Depends(get_async_read_db)):
 
     if white_rss_id and black_rss_id:
         raise HTTPException(400, "white and black")
@@ -51,4 +64,139 @@ def read_rss_items(
         except ValueError:
             raise HTTPException(400, "end_dt is error")
 
-    return crud.find_rss_item_by_title(db, q, offset, limit, distinct, start_dt, end_dt, white_rss_id, black_rss_id)
+    if facets:
+        facets: list[str] = [facet.strip() for facet in facets.split(",") if facet.strip()]
+        if unknown := set(facets) - set(crud_async.FACET_COLUMNS):
+            raise HTTPException(400, f"unknown facets: {','.join(sorted(unknown))}")
+
+    found = None
+    if not q:
+        found = window.find_items(
+            offset, limit, distinct,
+            datetime.datetime.fromisoformat(start_dt) if start_dt else None,
+            datetime.datetime.fromisoformat(end_dt) if end_dt else None,
+            white_rss_id, black_rss_id)
+    if found is None:
+        found = await crud_async.find_rss_item_by_title(
+            db, q, offset, limit, distinct, start_dt, end_dt, white_rss_id, black_rss_id)
+
+    if facets:
+        found["facets"] = await read_facets(db, facets, q, distinct, start_dt, end_dt, white_rss_id, black_rss_id)
+    return await item_json.list_response(
+        db, found["data"], found["total_count"], full=description, facets=found.get("facets"))
+
+
+async def read_facets(
+        db: AsyncSession, facets: list[str], q: Optional[str], distinct: bool,
+        start_dt: Optional[str], end_dt: Optional[str],
+        white_rss_id: Optional[list[int]], black_rss_id: Optional[list[int]]) -> dict[str, dict[str, int]]:
+    key = normalize_key(facets, q, distinct, start_dt, end_dt, white_rss_id, black_rss_id)
+    if (cached := facet_cache.get(key)) is not None:
+        return cached
+
+    version = facet_cache.version
+    result = await crud_async.get_rss_item_facets(
+        db, sorted(set(facets)), q, distinct, start_dt, end_dt, white_rss_id, black_rss_id)
+    facet_cache.set(key, result, version)
+    return result
+
+
+def format_event(data: str, event_id: Optional[int] = None, event: Optional[str] = None) -> str:
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {data}")
+    return "\n".join(lines) + "\n\n"
+
+
+async def item_event_stream(
+        request: Request, last_event_id: Optional[int],
+        white_rss_id: Optional[list[int]], black_rss_id: Optional[list[int]]) -> AsyncIterator[str]:
+    # 응답을 보내기 시작할 때 구독한다. handler 에서 구독하면 generator 가 시작되지 않은 채 끝날 때 해제되지 않는다.
+    subscriber = broadcaster.subscribe(white_rss_id, black_rss_id)
+    sent_id = last_event_id
+    try:
+        yield "retry: 3000\n\n"
+
+        if last_event_id is not None:
+            # 구독을 먼저 시작했으므로 조회 중 저장된 item 은 queue 에 남는다.
+            async with AsyncSessionLocal() as db:
+                db_rss_items = await crud_async.get_rss_items_after(
+                    db, last_event_id, SSE_RESUME_LIMIT, white_rss_id, black_rss_id)
+            for db_rss_item in db_rss_items:
+                data = schemas.RssItemEventDto.model_validate(db_rss_item, from_attributes=True).model_dump_json()
+                yield format_event(data, db_rss_item.id)
+                sent_id = db_rss_item.id
+            if len(db_rss_items) >= SSE_RESUME_LIMIT:
+                # 놓친 item 이 너무 많으면 목록 API 로 다시 읽도록 알린다.
+                yield format_event(f'{{"last_id": {sent_id}}}', event="reset")
+
+        while True:
+            if subscriber.dropped:
+                yield format_event(f'{{"last_id": {sent_id}}}', event="overflow")
+                break
+
+            try:
+                item_id, data = await asyncio.wait_for(subscriber.queue.get(), SSE_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    break
+                yield ": keepalive\n\n"
+                continue
+
+            if sent_id is not None and item_id <= sent_id:
+                continue
+            sent_id = item_id
+            yield format_event(data, item_id)
+    finally:
+        broadcaster.unsubscribe(subscriber)
+
+
+@router.get('/stream')
+async def stream_rss_items(
+        request: Request,
+        white_rss_id: Optional[str] = Query(None, description="include rss_id list", example='1,2,3'),
+        black_rss_id: Optional[str] = Query(None, description="exclude rss_id list", example='4,5,6'),
+        last_event_id: Optional[int] = Header(None),
+        after_id: Optional[int] = Query(None, description="Last-Event-ID 를 보낼 수 없을 때 사용")):
+    """
+    새로 저장된 item 을 server-sent events 로 보낸다. event id 는 item id.
+    처리가 느려 buffer 가 넘친 client 에게는 overflow event 를 보내고 연결을 끊는다.
+    """
+    if white_rss_id and black_rss_id:
+        raise HTTPException(400, "white and black")
+
+    white_rss_id = list(map(int, white_rss_id.split(","))) if white_rss_id else None
+    black_rss_id = list(map(int, black_rss_id.split(","))) if black_rss_id else None
+
+    resume_id = last_event_id if last_event_id is not None else after_id
+    return StreamingResponse(
+        item_event_stream(request, resume_id, white_rss_id, black_rss_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get('/stream/status')
+async def read_stream_status():
+    return broadcaster.status()
+
+
+@router.get('/json/status')
+async def read_item_json_cache_status():
+    return item_json.cache.status()
+
+
+@router.get('/facets/status')
+async def read_facet_cache_status():
+    return facet_cache.status()
+
+
+@router.get('/{rss_item_id}', response_model=schemas.RssItemDetailDto)
+async def read_rss_item(rss_item_id: int, db: AsyncSession = Depends(get_async_read_db)):
+    db_rss_item = await crud_async.get_rss_item_by_id(db, rss_item_id)
+    if db_rss_item is None:
+        raise HTTPException(status_code=404, detail="rss item not found")
+    return db_rss_item
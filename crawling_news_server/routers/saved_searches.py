@@ -0,0 +1,61 @@
+import logging
+from typing import List
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from crawling_news_server import crud, crud_async, schemas
+from crawling_news_server.database import get_db, get_async_read_db
+from crawling_news_server.logics.read_your_writes import stick_to_primary
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+router = APIRouter(
+    prefix="/api/v2/searches",
+)
+
+
+@router.get('/', response_model=List[schemas.SavedSearchDto])
+async def read_saved_searches(db: AsyncSession = Depends(get_async_read_db)):
+    return await crud_async.get_saved_search_all(db)
+
+
+@router.post('/', response_model=schemas.SavedSearchDto)
+def create_saved_search(saved_search: schemas.SavedSearchCreateDto, db: Session = Depends(get_db)):
+    """이후 수집되는 item 의 title 과 비교한다. 이미 저장된 item 은 대상이 아니다."""
+    if not saved_search.q.split():
+        raise HTTPException(400, "q is empty")
+    if saved_search.white_rss_id and saved_search.black_rss_id:
+        raise HTTPException(400, "white and black")
+
+    db_saved_search = crud.create_saved_search(db, saved_search)
+    stick_to_primary()
+    return db_saved_search
+
+
+@router.delete('/{saved_search_id}')
+def delete_saved_search(saved_search_id: int, db: Session = Depends(get_db)):
+    db_saved_search = crud.get_saved_search(db, saved_search_id)
+    if db_saved_search is None:
+        raise HTTPException(status_code=404, detail="saved search not found")
+
+    crud.delete_saved_search(db, db_saved_search)
+    stick_to_primary()
+    return {"id": saved_search_id}
+
+
+@router.get('/{saved_search_id}/matches', response_model=schemas.SavedSearchMatchResponse)
+async def read_saved_search_matches(
+        saved_search_id: int, cursor: int = 0, limit: int = 50,
+        db: AsyncSession = Depends(get_async_read_db)):
+    """cursor 이후 새로 일치한 item. 응답의 cursor 를 다음 요청에 그대로 넘긴다."""
+    if await crud_async.get_saved_search(db, saved_search_id) is None:
+        raise HTTPException(status_code=404, detail="saved search not found")
+
+    db_matches = await crud_async.get_saved_search_matches(db, saved_search_id, cursor, min(limit, 500))
+    return {
+        "cursor": db_matches[-1].id if db_matches else cursor,
+        "data": [row.rss_item for row in db_matches],
+    }
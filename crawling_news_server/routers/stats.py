@@ -0,0 +1,73 @@
+import datetime
+import logging
+from collections import defaultdict
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from crawling_news_server import crud_async, schemas
+from crawling_news_server.crud import hour_bucket
+from crawling_news_server.database import get_async_read_db
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+router = APIRouter(
+    prefix="/api/v2/stats",
+)
+
+
+def to_interval_bucket(bucket: datetime.datetime, interval: str) -> datetime.datetime:
+    if interval == "day":
+        return bucket.replace(hour=0)
+    return bucket
+
+
+def to_points(counter: dict[datetime.datetime, int]) -> list[schemas.TimeseriesPointDto]:
+    return [schemas.TimeseriesPointDto(bucket=bucket, count=count) for bucket, count in sorted(counter.items())]
+
+
+@router.get('/timeseries', response_model=schemas.TimeseriesResponse)
+async def read_timeseries(
+        start_dt: Optional[str] = None, end_dt: Optional[str] = None,
+        interval: Literal["hour", "day"] = "hour",
+        rss_id: Optional[str] = Query(None, description="rss_id list", example='1,2,3'),
+        per_feed: bool = True,
+        db: AsyncSession = Depends(get_async_read_db)):
+    """
+    publish_datetime 기준 item 수. [start_dt, end_dt) 범위, 기본은 최근 7일
+    item 이 없는 구간은 포함하지 않는다.
+    """
+    try:
+        end = datetime.datetime.fromisoformat(end_dt) if end_dt else datetime.datetime.now()
+        start = datetime.datetime.fromisoformat(start_dt) if start_dt else end - datetime.timedelta(days=7)
+    except ValueError:
+        raise HTTPException(400, "start_dt or end_dt is error")
+
+    try:
+        rss_ids = list(map(int, rss_id.split(","))) if rss_id else None
+    except ValueError:
+        raise HTTPException(400, "rss_id is error")
+
+    start = to_interval_bucket(hour_bucket(start), interval)
+    end = end.replace(tzinfo=None)
+    if start >= end:
+        raise HTTPException(400, "start_dt must be before end_dt")
+
+    total = defaultdict(int)
+    series = defaultdict(lambda: defaultdict(int))
+    for row_rss_id, bucket, count in await crud_async.get_rss_item_rollups(db, start, end, rss_ids, per_feed):
+        bucket = to_interval_bucket(bucket, interval)
+        total[bucket] += count
+        if per_feed:
+            series[row_rss_id][bucket] += count
+
+    return schemas.TimeseriesResponse(
+        interval=interval,
+        start_dt=start,
+        end_dt=end,
+        total_count=sum(total.values()),
+        total=to_points(total),
+        series={key: to_points(counter) for key, counter in series.items()},
+    )
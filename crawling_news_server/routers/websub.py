@@ -0,0 +1,60 @@
+import logging
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, Response
+from sqlalchemy.orm import Session
+
+from crawling_news_server import crud
+from crawling_news_server.database import get_db
+from crawling_news_server.logics import websub
+from crawling_news_server.logics.ingest import ingest_rss
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+router = APIRouter(
+    prefix="/api/v2/websub",
+)
+
+
+@router.get("/{rss_id}", response_class=PlainTextResponse)
+async def verify_websub_intent(
+        rss_id: int,
+        mode: str = Query(alias="hub.mode"),
+        topic: str = Query(alias="hub.topic"),
+        challenge: str = Query("", alias="hub.challenge"),
+        lease_seconds: Optional[int] = Query(None, alias="hub.lease_seconds"),
+        db: Session = Depends(get_db)):
+    """hub 의 구독 확인 요청"""
+    rt = websub.verify_intent(db, rss_id, mode, topic, challenge, lease_seconds)
+    if rt is None:
+        raise HTTPException(status_code=404, detail="subscription not found")
+    return rt
+
+
+@router.post("/{rss_id}")
+async def receive_websub_content(rss_id: int, request: Request, db: Session = Depends(get_db)):
+    """hub 가 push 한 rss 본문을 polling 과 같은 fix/parse/저장 과정으로 처리한다."""
+    db_subscription = crud.get_websub_subscription(db, rss_id)
+    if db_subscription is None or db_subscription.state != "active":
+        raise HTTPException(status_code=404, detail="subscription not found")
+
+    body = await request.body()
+    signature = request.headers.get("X-Hub-Signature-256") or request.headers.get("X-Hub-Signature")
+    if not websub.verify_signature(db_subscription.secret, body, signature):
+        # 서명이 맞지 않아도 2xx 로 응답하고 내용은 무시한다(WebSub 3.2.2 권고).
+        logger.warning(f"[{rss_id:<10}]: WebSub signature mismatch, ignore content")
+        return Response(status_code=202)
+
+    url = db_subscription.rss.url
+    text = websub.body_to_text(body, request.headers.get("Content-Type"))
+    rss_obj, db_rss_items = await run_in_threadpool(ingest_rss, db, rss_id, url, text)
+    websub.record_push(db, db_subscription)
+    logger.info(f"[{rss_id:<10}]({url:<55}): WebSub push, Add {len(db_rss_items)} items")
+
+    return {
+        "total_count": len(db_rss_items),
+        "data": [row.id for row in db_rss_items],
+    }
@@ -1,4 +1,4 @@
-from typing import Optional, List, Any
+from typing import Optional, List, Any, Dict
 import datetime
 from pydantic import BaseModel, Field
 
@@ -64,12 +64,27 @@ class RssItemCreateDto(RssItemDto):
 
 
 class RssItemResponseDto(RssItemDto):
+    # 목록에서는 description 대신 snippet 을 보낸다.
+    description: Optional[str] = Field(default=None)
     id: int
     rss_id: int
+    snippet: Optional[str] = Field(default=None)
     rss: RssResponseDto
     pass
 
 
+class RssItemDetailDto(RssItemResponseDto):
+    """item 하나. description 과 tag 를 없앤 평문을 함께 보낸다."""
+    body_text: Optional[str] = Field(default=None)
+
+
+class RssItemEventDto(RssItemDto):
+    """stream 으로 보내는 item. rss 정보는 rss_id 로 따로 조회한다."""
+    id: int
+    rss_id: int
+    snippet: Optional[str] = Field(default=None)
+
+
 class ResponseRecordDto(BaseModel):
     id: int
     link: str
@@ -79,6 +94,18 @@ class ResponseRecordDto(BaseModel):
     rss_id: int
 
 
+class RssHealthDto(BaseModel):
+    rss_id: int
+    is_active: int
+    fail_count: int
+    last_error: Optional[str] = Field(default=None)
+    last_status_code: Optional[int] = Field(default=None)
+    last_success_at: Optional[datetime.datetime] = Field(default=None)
+    last_failure_at: Optional[datetime.datetime] = Field(default=None)
+    next_retry_at: Optional[datetime.datetime] = Field(default=None)
+    next_run_time: Optional[datetime.datetime] = Field(default=None)
+
+
 class PaginationResponse(BaseModel):
     total_count: int
     data: List[Any]
@@ -88,9 +115,79 @@ class RssItemListResponse(PaginationResponse):
     data: List[RssItemResponseDto]
 
 
+class RssItemFacetListResponse(RssItemListResponse):
+    # facet 이름 -> 값 -> item 수. facets 를 요청한 경우만
+    facets: Optional[Dict[str, Dict[str, int]]] = Field(default=None)
+
+
 class RssResponse(PaginationResponse):
     data: List[RssResponseDto]
 
 
 class RssRecordResponse(PaginationResponse):
     data: List[ResponseRecordDto]
+
+
+class TimeseriesPointDto(BaseModel):
+    bucket: datetime.datetime
+    count: int
+
+
+class TimeseriesResponse(BaseModel):
+    interval: str
+    start_dt: datetime.datetime
+    end_dt: datetime.datetime
+    total_count: int
+    total: List[TimeseriesPointDto]
+    series: Dict[int, List[TimeseriesPointDto]] = Field(default_factory=dict)
+
+
+class SavedSearchCreateDto(BaseModel):
+    name: str
+    q: str = Field(description="+단어 는 필수, -단어 는 제외, 그 외는 하나 이상 포함")
+    white_rss_id: List[int] = Field(default_factory=list)
+    black_rss_id: List[int] = Field(default_factory=list)
+
+
+class SavedSearchDto(BaseModel):
+    id: int
+    name: str
+    query: str
+    white_rss_id: Optional[str] = Field(default=None)
+    black_rss_id: Optional[str] = Field(default=None)
+    created_at: datetime.datetime
+
+
+class SavedSearchMatchResponse(BaseModel):
+    # 다음 요청의 cursor. 새 결과가 없으면 요청한 cursor 그대로
+    cursor: int
+    data: List[RssItemResponseDto]
+
+
+class FeedDiscoveryRequest(BaseModel):
+    urls: List[str] = Field(description="rss 를 찾을 site url")
+
+
+class DiscoveredFeedDto(BaseModel):
+    url: str
+    site: str
+    source: str = Field(description="link: <link rel=alternate>, body: site 본문 링크, index: rss 안내 page 의 링크")
+    score: float
+    format: str
+    entry_count: int
+    latest_entry_at: Optional[datetime.datetime] = Field(default=None)
+    bozo: bool
+    registered: bool
+    rss: RssCreateDto
+
+
+class DiscoveredSiteDto(BaseModel):
+    url: str
+    error: Optional[str] = Field(default=None)
+    candidate_count: int
+    feed_count: int
+
+
+class FeedDiscoveryResponse(PaginationResponse):
+    data: List[DiscoveredFeedDto]
+    sites: List[DiscoveredSiteDto]
@@ -3,17 +3,28 @@ from typing import Annotated, Type, List, Optional
 from dotenv import load_dotenv
 import logging
 
-from fastapi import FastAPI, Depends, HTTPException, Body, Query
+from fastapi import FastAPI, Depends, HTTPException, Body, Query, Response
 from sqlalchemy.orm import Session
 from fastapi.middleware.cors import CORSMiddleware
 
-from crawling_news_server import crud, models, schemas, __version__, __description__
-from crawling_news_server.database import get_db, Base, engine, get_context_db
-from crawling_news_server.routers import rss, rss_items
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from crawling_news_server import crud, crud_async, models, schemas, crawl, __version__, __description__
+from crawling_news_server.database import (
+    get_db, get_async_read_db, pool_status, Base, engine, get_context_db,
+    async_engine, async_replica_engine, replica_engine,
+)
+from crawling_news_server.routers import debug, rss, rss_items, saved_searches, stats, websub
+from crawling_news_server.logics import health, hot_window, item_json, metrics, profiler, sql_trace
+from crawling_news_server.logics.read_your_writes import ReadYourWritesMiddleware, stick_to_primary
+from crawling_news_server.commands import rebuild_rollups
 
 import urllib3
 
-from crawling_news_server.jobs import add_job_rss_crawling, scheduler
+from crawling_news_server.jobs import (
+    add_job_rss_crawling, add_job_health_probe, add_job_hot_window_refresh, add_job_websub_renew, start_dispatcher,
+    scheduler, dispatcher,
+)
 
 load_dotenv()
 logging.basicConfig(level=logging.INFO)
@@ -28,7 +39,8 @@ app = FastAPI(
     version=__version__,
     title="뉴스 수집 및 검색",
     summary="개인용 뉴스 수집 및 검색 서비스 제공",
-    description=__description__
+    description=__description__,
+    default_response_class=item_json.FastJSONResponse,
 )
 app.add_middleware(
     CORSMiddleware,
@@ -36,16 +48,30 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-DB-Statements"],
 )
+if sql_trace.SQL_TRACE:
+    sql_trace.install({async_engine.sync_engine: engine, async_replica_engine.sync_engine: replica_engine})
+    app.add_middleware(sql_trace.SQLTraceMiddleware)
+app.add_middleware(ReadYourWritesMiddleware)
 app.include_router(rss.router)
 app.include_router(rss_items.router)
+app.include_router(websub.router)
+app.include_router(stats.router)
+app.include_router(saved_searches.router)
+if profiler.DEBUG_ENDPOINTS:
+    app.include_router(debug.router)
 
 
 @app.on_event('startup')
 async def init_data():
     Base.metadata.create_all(engine)
     models.RSSItem.create_fulltext_index(engine)
+    models.create_missing_columns(engine)
+    models.create_missing_indexes(engine)
+    rebuild_rollups.ensure_id_ranges(engine)
     db = get_db().__next__()
+    health.seed_disabled(db)
 
     db_rss_all = crud.get_rss_all(db)
     if os.environ.get("JOB_EXECUTE") == "TRUE":
@@ -56,11 +82,18 @@ async def init_data():
             if not scheduler.get_job(f"{db_rss.id}"):
                 add_job_rss_crawling(db_rss)
 
+        # 수집하는 프로세스만 최근 item 을 메모리에 유지할 수 있다.
+        hot_window.window.load(db)
+        add_job_hot_window_refresh()
+
+        add_job_health_probe()
+        add_job_websub_renew()
+        start_dispatcher()
         scheduler.start()
 
 
 @app.get('/rss', response_model=schemas.RssResponse)
-async def read_rss(q: Optional[str] = None, offset: int = 1, limit: int = 50, db: Session = Depends(get_db)):
+async def read_rss(q: Optional[str] = None, offset: int = 1, limit: int = 50, db: AsyncSession = Depends(get_async_read_db)):
     """
 
     :param q: title과 description에서 해당 텍스트를 검색한다.
@@ -70,43 +103,60 @@ async def read_rss(q: Optional[str] = None, offset: int = 1, limit: int = 50, db
     :return: RSS 객체
     """
     if q:
-        return crud.get_all_rss_search(db, q, offset, limit)
+        return await crud_async.get_all_rss_search(db, q, offset, limit)
 
     else:
-        return crud.get_all_rss(db, offset, limit)
+        return await crud_async.get_all_rss(db, offset, limit)
 
 
 @app.get("/rss/item", response_model=schemas.RssItemListResponse)
-async def read_rss_item(q: str, offset: int = 1, limit: int = 50, distinct: bool = True, db: Session = Depends(get_db)):
-    return crud.find_rss_item_by_title(db, q, offset, limit, distinct)
+async def read_rss_item(q: str, offset: int = 1, limit: int = 50, distinct: bool = True, description: bool = False, db: AsyncSession = Depends(get_async_read_db)):
+    found = await crud_async.find_rss_item_by_title(db, q, offset, limit, distinct)
+    return await item_json.list_response(db, found['data'], found['total_count'], full=description)
 
 
-@app.get('/rss/job')
+@app.get('/rss/job', response_model=List[schemas.RssHealthDto])
 async def read_rss_job(db: Session = Depends(get_db)):
-    pass
+    data = []
+    for db_health in crud.get_rss_health_all(db):
+        job = scheduler.get_job(f"{db_health.rss_id}")
+        data.append(schemas.RssHealthDto(
+            rss_id=db_health.rss_id,
+            is_active=db_health.rss.is_active,
+            fail_count=db_health.fail_count,
+            last_error=db_health.last_error,
+            last_status_code=db_health.last_status_code,
+            last_success_at=db_health.last_success_at,
+            last_failure_at=db_health.last_failure_at,
+            next_retry_at=db_health.next_retry_at,
+            next_run_time=job.next_run_time if job else None,
+        ))
+    return data
 
 
 @app.get('/rss/responses', response_model=schemas.RssRecordResponse)
-async def read_rss(offset: int = 1, limit: int = 50, db: Session = Depends(get_db)):
-    return crud.get_all_rss_responses(db, offset, limit)
+async def read_rss(offset: int = 1, limit: int = 50, db: AsyncSession = Depends(get_async_read_db)):
+    return await crud_async.get_all_rss_responses(db, offset, limit)
 
 
 @app.get("/rss/{rss_id}", response_model=schemas.RssResponseDto)
-async def read_user(rss_id: int, db: Session = Depends(get_db)):
-    db_rss = crud.get_rss(db, rss_id)
+async def read_user(rss_id: int, db: AsyncSession = Depends(get_async_read_db)):
+    db_rss = await crud_async.get_rss(db, rss_id)
     if db_rss is None:
         raise HTTPException(status_code=404, detail="RSS not found")
     return db_rss
 
 
 @app.get("/rss/{rss_id}/items", response_model=List[schemas.RssItemResponseDto])
-async def read_rss_item_by_rss_id(rss_id: int, offset: int = 1, limit: int = 50, db: Session = Depends(get_db)):
-    return crud.get_rss_items(db, rss_id, offset, limit)['data']
+async def read_rss_item_by_rss_id(rss_id: int, offset: int = 1, limit: int = 50, description: bool = False, db: AsyncSession = Depends(get_async_read_db)):
+    if (found := hot_window.window.find_rss_items(rss_id, offset, limit)) is None:
+        found = await crud_async.get_rss_items(db, rss_id, offset, limit)
+    return await item_json.list_response(db, found['data'], full=description)
 
 
 @app.get("/rss/{rss_id}/responses", response_model=List[schemas.ResponseRecordDto])
-async def read_rss_item_by_rss_id(rss_id: int, offset: int = 1, limit: int = 50, db: Session = Depends(get_db)):
-    return crud.get_rss_responses(db, rss_id, offset, limit)['data']
+async def read_rss_item_by_rss_id(rss_id: int, offset: int = 1, limit: int = 50, db: AsyncSession = Depends(get_async_read_db)):
+    return (await crud_async.get_rss_responses(db, rss_id, offset, limit))['data']
 
 
 @app.post("/rss", response_model=schemas.RssDto)
@@ -136,18 +186,53 @@ async def create_rss(rss: Annotated[
         raise HTTPException(status_code=400, detail="Can't add RSS")
 
     add_job_rss_crawling(db_rss)
+    stick_to_primary()
     return db_rss
 
 
+@app.get("/db/pools")
+async def get_db_pools():
+    return pool_status()
+
+
+@app.get("/db/slow-queries")
+async def get_slow_queries():
+    return sql_trace.slow_log.status()
+
+
+@app.get("/db/hot-window")
+async def get_hot_window_status():
+    return hot_window.window.status()
+
+
 @app.get("/jobs")
 async def get_jobs():
     jobs = scheduler.get_jobs()
     return [{
         "id": job.id,
         "name": job.name,
-        "next": f"{job.next_run_time}"
+        "next": f"{job.next_run_time}",
+        **metrics.job_runs.describe(job.id),
     } for job in jobs]
-    pass
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus text 형식"""
+    return Response(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/jobs/dispatcher")
+async def get_dispatcher_status():
+    return dispatcher.status()
+
+
+@app.get("/jobs/fetches")
+async def get_in_flight_fetches():
+    return {
+        "cancelled_count": crawl.fetcher.watchdog.cancelled_count,
+        "data": crawl.fetcher.watchdog.in_flight(),
+    }
 
 
 @app.post("/jobs")
@@ -166,6 +251,7 @@ async def delete_job(job_id: int, db: Session = Depends(get_db)):
         "next": f"{job.next_run_time}"
     }
     scheduler.remove_job(f"{job_id}")
+    metrics.job_runs.remove(f"{job_id}")
     return job_data
 
 
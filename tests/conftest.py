@@ -0,0 +1,34 @@
+"""
+테스트는 임시 SQLite DB 를 쓴다. database 모듈이 import 될 때 DB_PATH 를 읽으므로 먼저 정한다.
+MySQL 이 필요한 테스트는 TEST_MYSQL_URL 이 있을 때만 실행한다.
+"""
+import os
+import tempfile
+
+import pytest
+
+_db_dir = tempfile.mkdtemp(prefix="crawling-news-test-")
+os.environ["DB_PATH"] = f"sqlite:///{_db_dir}/test.db"
+os.environ.pop("ASYNC_DB_PATH", None)
+os.environ.pop("DB_REPLICA_PATH", None)
+os.environ.pop("ASYNC_DB_REPLICA_PATH", None)
+os.environ.pop("JOB_EXECUTE", None)
+os.environ.setdefault("NO_PROXY", "*")
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    from main import app
+
+    # startup 에서 테이블을 만든다. JOB_EXECUTE 가 없으므로 scheduler 는 시작하지 않는다.
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def db(client):
+    from crawling_news_server.database import SessionLocal
+
+    with SessionLocal() as session:
+        yield session
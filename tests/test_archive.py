@@ -0,0 +1,123 @@
+"""
+archive 개수는 저장한 segment 별 수로 세고, page 가 archive 에 닿을 때만 segment index 를 읽는다.
+archive 의 item 은 id 로 조회할 수 있고 다시 수집하지 않는다.
+"""
+import asyncio
+import datetime
+import json
+
+import pytest
+
+from crawling_news_server import crud, crud_async, schemas
+from crawling_news_server.crawl.canonical_link import link_hash
+from crawling_news_server.logics import archive, ingest
+
+# (id, rss_id, link_hash). 두 segment 에 같은 link(10)가 있다.
+SEGMENT_ROWS = {
+    "2020-01": [(3, 1, 10), (2, 2, 20), (1, 1, 30)],
+    "2020-02": [(6, 2, 10), (5, 1, 40), (4, 2, None)],
+}
+
+
+@pytest.fixture
+def segments(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "ARCHIVE_DIR", str(tmp_path))
+    monkeypatch.setattr(archive, "_index_cache", type(archive._index_cache)())
+    segments = []
+    for month, rows in SEGMENT_ROWS.items():
+        writer = archive.SegmentWriter(month, str(tmp_path), block_size=2)
+        for item_id, rss_id, hash_value in rows:
+            publish_datetime = datetime.datetime.fromisoformat(f"{month}-0{item_id}")
+            writer.add({"id": item_id, "rss_id": rss_id, "link_hash": hash_value, "title": f"title {item_id}",
+                        "description": "", "link": f"https://example.com/{item_id}",
+                        "publish_datetime": publish_datetime, "created_at": publish_datetime})
+        segments.append(writer.close())
+
+    counts = archive.segment_counts([segment.path for segment in segments])
+    for segment in segments:
+        segment.rss_counts = json.dumps(counts[segment.path][0])
+        segment.distinct_count = counts[segment.path][1]
+    return segments
+
+
+def test_distinct_is_counted_in_newest_segment(segments):
+    assert [segment.distinct_count for segment in segments] == [2, 3]
+    assert archive.summarize(segments)["distinct_count"] == 5
+
+
+@pytest.mark.parametrize("distinct, rss_filter", [
+    (False, {}), (False, {"white_rss_id": [1]}), (False, {"black_rss_id": [1]}), (True, {}),
+])
+def test_stored_count_matches_index(segments, distinct, rss_filter):
+    archive_filter = archive.ArchiveFilter.create(**rss_filter)
+    expected = len(archive._matches(segments, archive_filter, distinct))
+    assert archive.stored_count(segments, archive_filter, distinct) == expected
+
+
+def test_row_conditions_need_index(segments):
+    assert archive.stored_count(segments, archive.ArchiveFilter.create(title="title"), False) is None
+    assert archive.stored_count(segments, archive.ArchiveFilter.create(start_dt="2020-01-02"), False) is None
+    assert archive.stored_count(segments, archive.ArchiveFilter.create(white_rss_id=[1]), True) is None
+
+
+def test_live_page_does_not_read_index(segments, monkeypatch):
+    def read_index(path):
+        raise AssertionError("index read")
+
+    monkeypatch.setattr(archive, "read_index", read_index)
+    found = {"total_count": 60, "data": list(range(50))}
+    found = asyncio.run(crud_async._merge_archive(
+        None, found, segments, archive.ArchiveFilter.create(), False, 1, 50))
+    assert found["total_count"] == 66
+    assert len(found["data"]) == 50
+
+
+def test_find_item_by_id(segments):
+    assert archive.find_item(segments, 5)["title"] == "title 5"
+    assert archive.find_item(segments, 7) is None
+
+
+@pytest.fixture
+def registered(db, tmp_path, monkeypatch):
+    """DB 에 등록한 segment. 다른 test 의 목록을 가리지 않도록 끝나면 지운다."""
+    monkeypatch.setattr(archive, "ARCHIVE_DIR", str(tmp_path))
+    monkeypatch.setattr(archive, "_index_cache", type(archive._index_cache)())
+    rss_id = crud.create_rss(db, schemas.RssCreateDto(
+        name="archived", url=f"{tmp_path.as_uri()}/archived.xml", title="archived", description="",
+        link="https://example.com/", delay=60, category="")).id
+    item_id = 10 ** 9
+    link = "https://example.com/archived/1"
+    writer = archive.SegmentWriter("2001-01", str(tmp_path))
+    publish_datetime = datetime.datetime(2001, 1, 1)
+    writer.add({"id": item_id, "rss_id": rss_id, "link_hash": link_hash(link), "title": "archived",
+                "description": "<p>archived body</p>", "body_text": "archived body", "link": link,
+                "publish_datetime": publish_datetime, "created_at": publish_datetime})
+    segment = writer.close()
+    counts = archive.segment_counts([segment.path])
+    segment.rss_counts = json.dumps(counts[segment.path][0])
+    segment.distinct_count = counts[segment.path][1]
+    db.add(segment)
+    db.commit()
+    yield rss_id, item_id, link
+    db.delete(segment)
+    db.commit()
+
+
+def test_read_archived_item(client, registered):
+    _, item_id, _ = registered
+    response = client.get(f"/api/v2/items/{item_id}")
+    assert response.status_code == 200
+    assert response.json()["description"] == "<p>archived body</p>"
+    assert response.json()["body_text"] == "archived body"
+    assert client.get(f"/api/v2/items/{item_id + 1}").status_code == 404
+
+
+def test_archived_item_is_not_ingested_again(db, registered):
+    rss_id, _, link = registered
+    text = f"""<?xml version="1.0" encoding="utf-8"?>
+<rss version="2.0"><channel><title>archived</title><link>https://example.com/</link><description>d</description>
+<item><title>archived</title><link>{link}</link><description>body</description></item>
+<item><title>new</title><link>https://example.com/archived/2</link><description>body</description></item>
+</channel></rss>"""
+    _, db_rss_items = ingest.ingest_rss(db, rss_id, "https://example.com/archived.xml", text)
+    assert [db_rss_item.link for db_rss_item in db_rss_items] == ["https://example.com/archived/2"]
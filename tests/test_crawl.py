@@ -0,0 +1,115 @@
+"""수동 crawling 의 응답 기록과 health. 로컬 서버가 feed 와 오류 응답을 보낸다."""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from crawling_news_server import crud, models, schemas, jobs
+from crawling_news_server.logics import ingest
+
+FEED = """<?xml version="1.0" encoding="utf-8"?>
+<rss version="2.0"><channel><title>crawl test</title><link>https://example.com/</link><description>d</description>
+<item><title>first</title><link>https://example.com/crawl/{n}/1</link><description>body</description></item>
+<item><title>second</title><link>https://example.com/crawl/{n}/2</link><description>body</description></item>
+</channel></rss>"""
+
+
+class FeedHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.startswith("/feed/"):
+            status, body = 200, FEED.format(n=self.path.rsplit("/", 1)[1]).encode()
+        else:
+            status, body = 500, b"server error"
+        self.send_response(status)
+        self.send_header("Content-Type", "application/rss+xml" if status == 200 else "text/plain")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture(scope="module")
+def server():
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), FeedHandler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{srv.server_address[1]}"
+    srv.shutdown()
+    srv.server_close()
+
+
+@pytest.fixture(autouse=True)
+def no_shared_result(monkeypatch):
+    # 연달아 보내는 수동 crawling 이 앞의 결과를 공유하지 않게 한다.
+    monkeypatch.setattr(jobs.crawl_flight, "ttl", 0)
+
+
+def create_rss(db, url: str) -> int:
+    n = len(crud.get_rss_all(db)) + 1
+    return crud.create_rss(db, schemas.RssCreateDto(
+        name=f"crawl {n}", url=url, title="crawl", description="", link="https://example.com/", delay=60,
+        category="")).id
+
+
+def records(db, rss_id: int) -> list[models.ResponseRecord]:
+    db.expire_all()
+    return db.query(models.ResponseRecord).filter(models.ResponseRecord.rss_id == rss_id) \
+        .order_by(models.ResponseRecord.id).all()
+
+
+def test_manual_crawl_records_every_response(client, db, server):
+    rss_id = create_rss(db, f"{server}/feed/{len(crud.get_rss_all(db))}")
+
+    response = client.post(f"/api/v2/rss/{rss_id}/crawl")
+    assert response.status_code == 200
+    assert response.json()["total_count"] == 2
+    assert len(records(db, rss_id)) == 1
+
+    # 새 item 이 없어도 응답을 남긴다.
+    response = client.post(f"/api/v2/rss/{rss_id}/crawl")
+    assert response.json()["total_count"] == 0
+    db_records = records(db, rss_id)
+    assert len(db_records) == 2
+    assert db_records[-1].body.startswith("<!-- ENTRY ZERO -->")
+    assert crud.get_rss_health(db, rss_id).fail_count == 0
+
+
+def test_manual_crawl_error_is_recorded_in_health(client, db, server):
+    rss_id = create_rss(db, f"{server}/error/{len(crud.get_rss_all(db))}")
+
+    response = client.post(f"/api/v2/rss/{rss_id}/crawl")
+    assert response.status_code == 200
+    assert response.json()["response"]["status"] == 500
+
+    db_records = records(db, rss_id)
+    assert len(db_records) == 1
+    assert db_records[0].status_code == 500
+    db_health = crud.get_rss_health(db, rss_id)
+    assert db_health.fail_count == 1
+    assert db_health.last_status_code == 500
+
+
+def test_item_without_link_hash_is_not_ingested_again(db, server):
+    n = len(crud.get_rss_all(db))
+    rss_id = create_rss(db, f"{server}/feed/{n}")
+    # backfill_link_hash 전에 저장된 item
+    db.add(models.RSSItem(rss_id=rss_id, title="first", description="", link=f"https://example.com/crawl/{n}/1"))
+    db.commit()
+
+    _, db_rss_items = ingest.ingest_rss(db, rss_id, f"{server}/feed/{n}", FEED.format(n=n))
+    assert [db_rss_item.link for db_rss_item in db_rss_items] == [f"https://example.com/crawl/{n}/2"]
+
+
+def test_failed_item_is_not_saved_by_next_commit(db, monkeypatch):
+    rss_id = create_rss(db, "https://example.com/failing.xml")
+
+    def fail(db, db_rss_item):
+        raise RuntimeError("id range")
+
+    # flush 뒤의 단계가 실패한 경우
+    monkeypatch.setattr(crud, "record_rss_item_id_range", fail)
+    link = f"https://example.com/crawl/failing/{rss_id}"
+    assert crud.create_rss_item_from_rss_item_obj(db, rss_id, {"title": "failing", "link": link}) is None
+    db.commit()
+    assert db.query(models.RSSItem).filter(models.RSSItem.link == link).count() == 0
@@ -0,0 +1,113 @@
+"""rss 찾기. 로컬 server 의 site 에서 찾고, 점수 순 정렬과 중복 합치기, 본문을 읽지 못한 후보를 확인한다."""
+import asyncio
+import datetime
+import itertools
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from crawling_news_server import crud, schemas
+from crawling_news_server.logics import discovery
+
+_counter = itertools.count()
+
+RSS = """<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0"><channel><title>{title}</title><link>https://example.com/</link><description></description>
+<item><title>a</title><link>https://example.com/{title}/a</link></item>
+</channel></rss>"""
+
+PAGES = {
+    "/": ('<html><head>'
+          '<link rel="alternate" type="application/rss+xml" href="/rss.xml">'
+          '<link rel="alternate" type="application/rss+xml" href="/broken.xml">'
+          '</head><body></body></html>', "text/html"),
+    "/rss.xml": (RSS.format(title="news"), "application/rss+xml"),
+    "/broken.xml": (RSS.format(title="broken"), "application/rss+xml"),
+}
+
+
+class SiteHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body, content_type = PAGES.get(self.path, ("", "text/plain"))
+        self.send_response(200 if self.path in PAGES else 404)
+        self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+        self.send_header("Content-Length", str(len(body.encode())))
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def site():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SiteHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def broken(monkeypatch):
+    """path 로 끝나는 url 의 본문은 읽다가 UnicodeDecodeError 가 난다."""
+    paths = []
+    read_response = discovery.read_response
+
+    def read_or_fail(candidate, response, source):
+        if any(candidate.url.endswith(path) for path in paths):
+            raise UnicodeDecodeError("utf-8", b"\xff", 0, 1, "invalid start byte")
+        return read_response(candidate, response, source)
+
+    monkeypatch.setattr(discovery, "read_response", read_or_fail)
+    return paths
+
+
+def make_feed(url: str, source: str = "link", entry_count: int = 10, fingerprint: tuple = ()) -> discovery.DiscoveredFeed:
+    return discovery.DiscoveredFeed(
+        url=url, site="https://example.com/", source=source, format="rss20", title=url, description="",
+        link="https://example.com/", category="", entry_count=entry_count,
+        latest_entry_at=datetime.datetime.now(), bozo=False, fingerprint=fingerprint)
+
+
+def test_rank_orders_by_score():
+    body = make_feed("https://example.com/body.xml", source="body")
+    link = make_feed("https://example.com/link.xml")
+    other_site = make_feed("https://other.com/link.xml")
+    assert discovery.rank([body, other_site, link]) == [link, other_site, body]
+
+
+def test_rank_merges_same_url_and_same_content():
+    link = make_feed("https://www.example.com/rss.xml")
+    same_url = make_feed("http://example.com/rss.xml/", source="body")
+    fingerprint = ("example.com", ("example.com/a", "example.com/b"))
+    first = make_feed("https://example.com/a.xml", fingerprint=fingerprint)
+    same_content = make_feed("https://example.com/b.xml", source="index", fingerprint=fingerprint)
+    assert discovery.rank([same_url, same_content, link, first]) == [link, first]
+
+
+def test_broken_candidate_keeps_other_feeds(site, broken):
+    broken.append("/broken.xml")
+    sites, feeds = asyncio.run(discovery.discover([site]))
+    assert sites[0].error is None
+    assert [feed.url for feed in feeds] == [site + "rss.xml"]
+
+
+def test_broken_site_is_reported(site, broken):
+    broken.append(site)
+    sites, feeds = asyncio.run(discovery.discover([site]))
+    assert sites[0].error.startswith("UnicodeDecodeError")
+    assert feeds == []
+
+
+def test_registered_feed_matches_canonical_url(client, db, site):
+    n = f"discovery-{next(_counter)}"
+    crud.create_rss(db, schemas.RssCreateDto(
+        name=n, url=site + "rss.xml?utm_source=" + n, title=n, description="", link=site, delay=60, category=""))
+
+    response = client.post("/api/v2/rss/discover", json={"urls": [site]})
+    assert response.status_code == 200
+    registered = {feed["url"]: feed["registered"] for feed in response.json()["data"]}
+    assert registered == {site + "rss.xml": True, site + "broken.xml": False}
@@ -0,0 +1,41 @@
+"""facet cache 는 새 item 이 들어갈 수 있는 조건의 결과만 버린다."""
+import datetime
+
+from crawling_news_server.logics.facet_cache import FacetCache, normalize_key
+
+
+def key(start_dt=None, end_dt=None, white_rss_id=None, black_rss_id=None):
+    return normalize_key(["rss_id"], None, False, start_dt, end_dt, white_rss_id, black_rss_id)
+
+
+def test_invalidate_only_affected():
+    cache = FacetCache()
+    keys = {
+        "all": key(),
+        "white": key(white_rss_id=[2]),
+        "black": key(black_rss_id=[1]),
+        "old": key("2020-01-01T00:00:00", "2020-01-02T00:00:00"),
+        "today": key("2030-01-01T00:00:00"),
+    }
+    for name, cache_key in keys.items():
+        cache.set(cache_key, name, cache.version)
+
+    cache.invalidate(1, datetime.datetime(2030, 1, 1, 12))
+    assert {name for name, cache_key in keys.items() if cache.get(cache_key) is not None} == {"white", "black", "old"}
+
+    cache.invalidate()
+    assert all(cache.get(cache_key) is None for cache_key in keys.values())
+
+
+def test_set_drops_result_raced_by_affecting_item():
+    cache = FacetCache()
+    version = cache.version
+    # 계산 중 다른 rss 의 item 은 결과를 바꾸지 않는다.
+    cache.invalidate(2, datetime.datetime(2030, 1, 1))
+    cache.set(key(white_rss_id=[1]), "kept", version)
+    assert cache.get(key(white_rss_id=[1])) == "kept"
+
+    version = cache.version
+    cache.invalidate(1, datetime.datetime(2030, 1, 1))
+    cache.set(key(white_rss_id=[1]), "stale", version)
+    assert cache.get(key(white_rss_id=[1])) is None
@@ -0,0 +1,77 @@
+"""fetcher 의 전체 시간 예산과 최대 크기. 본문이나 헤더를 천천히 보내는 로컬 서버로 확인한다."""
+import time
+import threading
+import socketserver
+
+import pytest
+
+from crawling_news_server.crawl import fetcher
+
+TRICKLE_INTERVAL = 0.1
+
+
+class TrickleHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        request = b""
+        while b"\r\n\r\n" not in request:
+            if not (data := self.request.recv(4096)):
+                return
+            request += data
+        path = request.split(b" ", 2)[1].decode()
+
+        try:
+            if path == "/ok":
+                self.request.sendall(b"HTTP/1.1 200 OK\r\nContent-Length: 5\r\nConnection: close\r\n\r\nhello")
+            elif path == "/large":
+                self.request.sendall(b"HTTP/1.1 200 OK\r\nConnection: close\r\n\r\n" + b"x" * 4096)
+            elif path == "/trickle-body":
+                self.request.sendall(b"HTTP/1.1 200 OK\r\nContent-Length: 100000\r\nConnection: close\r\n\r\n")
+                self._trickle(b"x" * 100000)
+            elif path == "/trickle-headers":
+                self.request.sendall(b"HTTP/1.1 200 OK\r\n")
+                self._trickle(b"X-Slow: " + b"a" * 100000)
+        except OSError:
+            pass
+
+    def _trickle(self, data: bytes):
+        # 읽기 타임아웃보다 짧은 간격으로 1 byte 씩 보낸다.
+        for byte in data:
+            self.request.sendall(bytes([byte]))
+            time.sleep(TRICKLE_INTERVAL)
+
+
+@pytest.fixture(scope="module")
+def server():
+    socketserver.ThreadingTCPServer.daemon_threads = True
+    with socketserver.ThreadingTCPServer(("127.0.0.1", 0), TrickleHandler) as srv:
+        threading.Thread(target=srv.serve_forever, daemon=True).start()
+        yield f"http://127.0.0.1:{srv.server_address[1]}"
+        srv.shutdown()
+
+
+@pytest.fixture(autouse=True)
+def fast_watchdog(monkeypatch):
+    monkeypatch.setattr(fetcher.watchdog, "interval", 0.1)
+    monkeypatch.setenv("NO_PROXY", "*")
+
+
+def test_fetch_reads_body(server):
+    response = fetcher.fetch(f"{server}/ok", budget=5)
+    assert response.status_code == 200
+    assert response.content == b"hello"
+
+
+def test_fetch_too_large(server):
+    with pytest.raises(fetcher.FetchTooLarge):
+        fetcher.fetch(f"{server}/large", budget=5, max_bytes=1024)
+
+
+@pytest.mark.parametrize("path", ["/trickle-body", "/trickle-headers"])
+def test_fetch_budget_cuts_trickling_server(server, path):
+    started = time.monotonic()
+    with pytest.raises(fetcher.FetchTimeout):
+        fetcher.fetch(f"{server}{path}", budget=1)
+    elapsed = time.monotonic() - started
+    # 예산 + watchdog 주기 + 한 번의 trickle 간격 안에 끝나야 한다.
+    assert elapsed < 1 + 0.1 + TRICKLE_INTERVAL + 0.5
+    assert not fetcher.watchdog.in_flight()
@@ -0,0 +1,48 @@
+"""실패한 rss 의 backoff 와 비활성화된 rss 의 probe 대상"""
+import datetime
+import itertools
+
+from crawling_news_server import crud, schemas
+from crawling_news_server.logics import health
+
+_counter = itertools.count()
+
+
+def create_rss(db, delay: int = 60) -> int:
+    n = f"health-{next(_counter)}"
+    return crud.create_rss(db, schemas.RssCreateDto(
+        name=n, url=f"https://example.com/{n}.xml", title=n, description="", link="https://example.com/",
+        delay=delay, category="")).id
+
+
+def test_backoff_starts_at_rss_delay():
+    assert health.backoff_seconds(1) == health.HEALTH_BACKOFF_BASE
+    assert health.backoff_seconds(1, health.HEALTH_BACKOFF_BASE * 3) == health.HEALTH_BACKOFF_BASE * 3
+    assert health.backoff_seconds(2, health.HEALTH_BACKOFF_BASE * 3) == health.HEALTH_BACKOFF_BASE * 6
+    assert health.backoff_seconds(100, health.HEALTH_BACKOFF_BASE * 3) == health.HEALTH_BACKOFF_CAP
+
+
+def test_first_failure_waits_at_least_rss_delay(db):
+    delay = health.HEALTH_BACKOFF_BASE * 4
+    rss_id = create_rss(db, delay)
+    db_health = health.record_failure(db, rss_id, "ConnectionError")
+    assert db_health.next_retry_at - db_health.last_failure_at == datetime.timedelta(seconds=delay)
+
+
+def test_inactive_rss_without_health_is_probed(db):
+    # rss_health 이전에 비활성화된 rss
+    disabled = create_rss(db)
+    crud.update_rss_active(db, disabled, False)
+    # 오래된 item 만 있어 비활성화된 rss 는 성공 상태가 있으므로 probe 하지 않는다.
+    stale = create_rss(db)
+    health.record_success(db, stale, 200)
+    crud.update_rss_active(db, stale, False)
+
+    health.seed_disabled(db)
+    health.seed_disabled(db)
+
+    due = crud.get_rss_health_due_for_probe(
+        db, datetime.datetime.utcnow(), health.HEALTH_DISABLE_AFTER, 1000)
+    rss_ids = [db_health.rss_id for db_health in due]
+    assert rss_ids.count(disabled) == 1
+    assert stale not in rss_ids
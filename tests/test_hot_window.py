@@ -0,0 +1,64 @@
+"""최근 item window 의 만료와 window 밖 요약."""
+import datetime
+import itertools
+
+import pytest
+
+from crawling_news_server import crud, models, schemas
+from crawling_news_server.crawl.canonical_link import link_hash
+from crawling_news_server.logics.hot_window import HotWindow
+
+_counter = itertools.count()
+
+
+@pytest.fixture
+def db_rss(db):
+    n = f"window-{next(_counter)}"
+    return crud.create_rss(db, schemas.RssCreateDto(
+        name=n, url=f"https://example.com/{n}.xml", title=n, description="", link="https://example.com/",
+        delay=60, category=""))
+
+
+def add_item(db, db_rss: models.RSS, created_at: datetime.datetime, link: str = None) -> models.RSSItem:
+    link = link or f"https://example.com/window/{next(_counter)}"
+    db_rss_item = models.RSSItem(rss_id=db_rss.id, title="item", description="", link=link, link_hash=link_hash(link),
+                                 publish_datetime=created_at, created_at=created_at)
+    db.add(db_rss_item)
+    db.commit()
+    db.refresh(db_rss_item)
+    return db_rss_item
+
+
+def test_expire_by_created_at(db, db_rss):
+    window = HotWindow(capacity=10, window_seconds=3600)
+    window.load(db)
+    started = datetime.datetime(2030, 1, 1)
+    old = add_item(db, db_rss, started)
+    window.add(old)
+    assert len(window) == 1
+
+    # window 에 들어온 시각이 아니라 DB 에 저장된 시각으로 뺀다.
+    window.add(add_item(db, db_rss, started + datetime.timedelta(hours=2)))
+    assert len(window) == 1
+    assert window.floor_id >= old.id
+
+
+def test_distinct_in_window_and_refresh(db, db_rss):
+    window = HotWindow(capacity=10, window_seconds=3600)
+    window.load(db)
+    total, distinct = window.total_count, window.distinct_count
+
+    created_at = datetime.datetime(2030, 2, 1)
+    link = f"https://example.com/window/{next(_counter)}"
+    window.add(add_item(db, db_rss, created_at, link))
+    other = crud.create_rss(db, schemas.RssCreateDto(
+        name=f"window-{next(_counter)}", url=f"https://example.com/window-other-{next(_counter)}.xml", title="o",
+        description="", link="https://example.com/", delay=60, category=""))
+    window.add(add_item(db, other, created_at, link))
+    assert (window.total_count, window.distinct_count) == (total + 2, distinct + 1)
+
+    # 다른 프로세스(reingest 등)가 넣은 item 은 refresh 에서 반영된다.
+    add_item(db, db_rss, datetime.datetime(2000, 1, 1))
+    window.refresh_counts(db)
+    assert (window.total_count, window.distinct_count) == (total + 3, distinct + 2)
+    assert window.rss_counts[db_rss.id] == 2
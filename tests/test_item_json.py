@@ -0,0 +1,54 @@
+"""item JSON 은 item 과 같은 transaction 에 저장하고, 다른 process 가 고친 item 은 cache 에서 뺀다."""
+import itertools
+
+import pytest
+
+from crawling_news_server import crud, models, schemas
+from crawling_news_server.logics import item_json
+from crawling_news_server.logics.hot_window import window
+
+_counter = itertools.count()
+
+
+@pytest.fixture
+def rss_id(db):
+    n = f"item-json-{next(_counter)}"
+    return crud.create_rss(db, schemas.RssCreateDto(
+        name=n, url=f"https://example.com/{n}.xml", title=n, description="", link="https://example.com/",
+        delay=60, category="")).id
+
+
+def create_item(db, rss_id: int, title: str) -> models.RSSItem:
+    return crud.create_rss_item(db, rss_id, schemas.RssItemCreateDto(
+        title=title, description="body", link=f"https://example.com/item-json/{next(_counter)}"))
+
+
+def test_persisted_with_item(db, rss_id, monkeypatch):
+    monkeypatch.setattr(item_json, "ITEM_JSON_PERSIST", True)
+    db_rss_item = create_item(db, rss_id, "persisted")
+
+    db_item_json = db.query(models.RSSItemJson).filter(models.RSSItemJson.rss_item_id == db_rss_item.id).one()
+    assert db_item_json.body == item_json.serialize_item(db_rss_item).decode("utf-8")
+    assert db_item_json.summary == item_json.serialize_item(db_rss_item, full=False).decode("utf-8")
+
+
+def test_item_changed_by_other_process(client, db, rss_id, monkeypatch):
+    monkeypatch.setattr(item_json, "ITEM_JSON_INVALIDATION_SECONDS", 0)
+    # 최근 item window 를 거치지 않고 DB 에서 읽게 한다.
+    monkeypatch.setattr(window, "find_items", lambda *args: None)
+    token = f"itemjson{next(_counter)}"
+    db_rss_item = create_item(db, rss_id, f"{token} old")
+
+    def titles():
+        response = client.get("/api/v2/items/", params={"white_rss_id": rss_id})
+        assert response.status_code == 200
+        return [item["title"] for item in response.json()["data"]]
+
+    assert titles() == [f"{token} old"]
+    assert (db_rss_item.id, False) in item_json.cache
+
+    # reingest 처럼 다른 process 가 고치고 기록만 남긴다.
+    db_rss_item.title = f"{token} new"
+    db.add(models.RSSItemJsonInvalidation(rss_item_id=db_rss_item.id))
+    db.commit()
+    assert titles() == [f"{token} new"]
@@ -0,0 +1,240 @@
+"""
+v2 API 가 쓰는 crud_async 쿼리의 실행계획. 전체 테이블 스캔이나 filesort 가 생기면 실패한다.
+기본은 임시 SQLite 파일에 합성 데이터를 넣고 `EXPLAIN QUERY PLAN` 을 본다.
+TEST_MYSQL_URL(예: mysql+pymysql://user:pw@localhost/news_test)이 있으면 MySQL/MariaDB 의 `EXPLAIN` 도 본다.
+오래된 item 일부는 archive segment 로 등록해 archive floor 조건이 붙게 한다.
+"""
+import os
+import re
+import json
+import random
+import asyncio
+import datetime
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+import pytest
+from sqlalchemy import Engine, delete, event, insert, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from crawling_news_server import crud_async, models
+from crawling_news_server.crawl.canonical_link import link_hash
+from crawling_news_server.commands import rebuild_rollups
+from crawling_news_server.database import Base, create_db_engine, to_async_url
+from crawling_news_server.logics import archive
+
+TEST_MYSQL_URL = os.environ.get("TEST_MYSQL_URL")
+
+# distinct 검색의 비교 대상은 crud.distinct_filter 의 alias 로 나온다.
+HOT_TABLES = ("rss_items", "newer_items", "response_records")
+SCAN = "full scan"
+FILESORT = "filesort"
+
+# (rss 수, item 수, response 수). SQLite 는 테스트 시간을 위해 작게 둔다.
+SIZES = {"sqlite": (100, 20000, 5000), "mysql": (500, 200000, 50000)}
+# 다른 rss 에 같은 link 로 다시 올라오는 item 비율
+DUPLICATE_RATE = 0.1
+# archive segment 로 등록하는 가장 오래된 item 수
+ARCHIVED_COUNT = 1000
+
+
+@dataclass
+class QueryCase:
+    name: str
+    run: Callable[[AsyncSession], Awaitable[object]]
+    forbid: tuple[str, ...] = (SCAN, FILESORT)
+    mysql_only: bool = False
+
+    def __str__(self):
+        return self.name
+
+
+def build_cases() -> list[QueryCase]:
+    rss_id = 10
+    white_rss_id = [rss_id, rss_id + 1]
+    start_dt = datetime.datetime(2023, 3, 1)
+    end_dt = datetime.datetime(2023, 3, 2)
+    cases = [
+        QueryCase("get_rss", lambda db: crud_async.get_rss(db, rss_id)),
+        QueryCase("get_rss_items", lambda db: crud_async.get_rss_items(db, rss_id, 2, 50)),
+        QueryCase("get_rss_items_after", lambda db: crud_async.get_rss_items_after(db, 100, 50)),
+        QueryCase("get_rss_responses", lambda db: crud_async.get_rss_responses(db, rss_id, 2, 50)),
+        QueryCase("get_rss_item_by_id", lambda db: crud_async.get_rss_item_by_id(db, ARCHIVED_COUNT + 1)),
+        # 최신순 전체 목록과 전체 count 는 PK / covering index 전체를 읽는 것이 정상
+        QueryCase("get_all_rss_responses", lambda db: crud_async.get_all_rss_responses(db, 2, 50), forbid=(FILESORT,)),
+        QueryCase("find_rss_item_by_title", lambda db: crud_async.find_rss_item_by_title(db, "", 2, 50, False),
+                  forbid=(FILESORT,)),
+        # 조건 없는 distinct 목록의 count 는 전체를 읽는다.
+        QueryCase("find_rss_item_by_title(distinct)",
+                  lambda db: crud_async.find_rss_item_by_title(db, "", 2, 50, True), forbid=(FILESORT,)),
+    ]
+    for distinct in (False, True):
+        suffix = ", distinct" if distinct else ""
+        cases += [
+            # 여러 rss 는 rss 별 (rss_id, id) index 범위를 읽어 합친 뒤 정렬한다. 그 rss 의 item 만 읽는다.
+            QueryCase(f"find_rss_item_by_title(white_rss_id{suffix})",
+                      lambda db, d=distinct: crud_async.find_rss_item_by_title(
+                          db, "", 1, 50, d, white_rss_id=white_rss_id), forbid=(SCAN,)),
+            # 날짜 조건은 rss_item_id_ranges 로 id 범위 조건이 붙어 PK 순서로 읽는다.
+            QueryCase(f"find_rss_item_by_title(date{suffix})",
+                      lambda db, d=distinct: crud_async.find_rss_item_by_title(db, "", 1, 50, d, start_dt, end_dt)),
+            QueryCase(f"find_rss_item_by_title(title{suffix})",
+                      lambda db, d=distinct: crud_async.find_rss_item_by_title(db, "title", 1, 50, d),
+                      mysql_only=True),
+            # group by 는 정렬이 아니므로 scan 만 본다.
+            QueryCase(f"get_rss_item_facets(white_rss_id{suffix})",
+                      lambda db, d=distinct: crud_async.get_rss_item_facets(
+                          db, ["rss_id"], "", d, white_rss_id=white_rss_id), forbid=(SCAN,)),
+        ]
+    return cases
+
+
+def seed(engine: Engine) -> None:
+    rss_count, item_count, response_count = SIZES["sqlite" if engine.dialect.name == "sqlite" else "mysql"]
+    with engine.begin() as conn:
+        if conn.execute(models.RSSItem.__table__.select().limit(1)).first():
+            return
+
+        conn.execute(insert(models.RSS), [{
+            "id": rss_id, "name": f"rss {rss_id}", "url": f"https://example.com/{rss_id}/rss",
+            "title": f"rss {rss_id}", "description": "", "link": f"https://example.com/{rss_id}",
+        } for rss_id in range(1, rss_count + 1)])
+
+        start = datetime.datetime(2020, 1, 1)
+        span = int((datetime.datetime(2024, 1, 1) - start).total_seconds())
+        ignore = insert(models.RSSItem).prefix_with("OR IGNORE" if engine.dialect.name == "sqlite" else "IGNORE")
+        batch = []
+        for item_id in range(1, item_count + 1):
+            link_id = random.randint(1, item_id - 1) if item_id > 1 and random.random() < DUPLICATE_RATE else item_id
+            created_at = start + datetime.timedelta(seconds=span * item_id // item_count)
+            batch.append({
+                "rss_id": random.randint(1, rss_count), "title": f"title {link_id}", "description": "",
+                "link": f"https://example.com/item/{link_id}",
+                "link_hash": link_hash(f"https://example.com/item/{link_id}"),
+                "publish_datetime": created_at, "created_at": created_at,
+            })
+            if len(batch) == 10000:
+                conn.execute(ignore, batch)
+                batch = []
+        if batch:
+            conn.execute(ignore, batch)
+
+        conn.execute(insert(models.ResponseRecord), [{
+            "rss_id": random.randint(1, rss_count), "link": "https://example.com/rss", "body": "", "status_code": 200,
+        } for _ in range(response_count)])
+
+    with engine.begin() as conn:
+        if engine.dialect.name == "sqlite":
+            conn.execute(text("ANALYZE"))
+        else:
+            for table in ("rss_items", "response_records", "rss"):
+                conn.execute(text(f"ANALYZE TABLE {table}"))
+
+
+def register_archive(engine: Engine) -> None:
+    """가장 오래된 item 을 segment 로 써서 등록한다. rss_items 에서는 지우지 않는다(purge 전과 같음)."""
+    with engine.begin() as conn:
+        conn.execute(delete(models.ArchiveSegment))
+        rows = conn.execute(select(models.RSSItem.__table__).order_by(models.RSSItem.id).limit(ARCHIVED_COUNT)).all()
+        writer = archive.SegmentWriter("2020-01", archive.ARCHIVE_DIR)
+        for row in reversed(rows):
+            writer.add(dict(row._mapping))
+        segment = writer.close()
+        rss_counts, distinct_count = archive.segment_counts([segment.path])[segment.path]
+        conn.execute(insert(models.ArchiveSegment), [{
+            "month": segment.month, "path": segment.path, "item_count": segment.item_count,
+            "min_id": segment.min_id, "max_id": segment.max_id,
+            "min_publish_datetime": segment.min_publish_datetime,
+            "max_publish_datetime": segment.max_publish_datetime,
+            "rss_counts": json.dumps(rss_counts), "distinct_count": distinct_count,
+        }])
+
+
+@pytest.fixture(scope="module", params=["sqlite", "mysql"])
+def engine(request, tmp_path_factory):
+    if request.param == "sqlite":
+        url = f"sqlite:///{tmp_path_factory.mktemp('query_plans')}/query_plans.db"
+    elif TEST_MYSQL_URL:
+        url = TEST_MYSQL_URL
+    else:
+        pytest.skip("TEST_MYSQL_URL 이 없음")
+
+    monkeypatch = pytest.MonkeyPatch()
+    monkeypatch.setattr(archive, "ARCHIVE_DIR", str(tmp_path_factory.mktemp("archive")))
+    monkeypatch.setattr(archive, "_index_cache", type(archive._index_cache)())
+    engine = create_db_engine(url, 5)
+    Base.metadata.create_all(engine)
+    models.RSSItem.create_fulltext_index(engine)
+    models.create_missing_columns(engine)
+    models.create_missing_indexes(engine)
+    seed(engine)
+    rebuild_rollups.ensure_id_ranges(engine)
+    register_archive(engine)
+    yield engine
+    engine.dispose()
+    monkeypatch.undo()
+
+
+def capture_statements(engine: Engine, case: QueryCase) -> list[tuple[str, object]]:
+    """crud_async 가 보낸 SELECT 문"""
+    captured: list[tuple[str, object]] = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            captured.append((statement, parameters))
+
+    async def run():
+        async_engine = create_async_engine(to_async_url(engine.url.render_as_string(hide_password=False)))
+        event.listen(async_engine.sync_engine, "before_cursor_execute", capture)
+        try:
+            async with async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)() as db:
+                await case.run(db)
+        finally:
+            await async_engine.dispose()
+
+    asyncio.run(run())
+    return captured
+
+
+def explain(conn, statement: str, parameters) -> tuple[list[str], list[str]]:
+    """(plan 설명, 위반 종류)"""
+    plan, found = [], []
+    if conn.dialect.name == "sqlite":
+        for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters):
+            detail = row[-1]
+            plan.append(detail)
+            # PK 범위나 index 로 찾으면 SEARCH 로 나온다.
+            if (m := re.match(r"SCAN (?:TABLE )?(\w+)", detail)) and m.group(1) in HOT_TABLES:
+                found.append(SCAN)
+            if "USE TEMP B-TREE FOR ORDER BY" in detail:
+                found.append(FILESORT)
+        return plan, found
+
+    result = conn.exec_driver_sql(f"EXPLAIN {statement}", parameters)
+    columns = list(result.keys())
+    for row in result:
+        row = dict(zip(columns, row))
+        plan.append(f"{row.get('table')}: type={row.get('type')} key={row.get('key')} extra={row.get('Extra')}")
+        if row.get("table") in HOT_TABLES and row.get("type") in ("ALL", "index"):
+            found.append(SCAN)
+        if "Using filesort" in (row.get("Extra") or ""):
+            found.append(FILESORT)
+    return plan, found
+
+
+@pytest.mark.parametrize("case", build_cases(), ids=str)
+def test_query_plan(engine, case: QueryCase):
+    if case.mysql_only and engine.dialect.name == "sqlite":
+        pytest.skip("SQLite 는 FULLTEXT 검색이 없음")
+
+    captured = capture_statements(engine, case)
+    assert captured
+
+    failures = []
+    with engine.connect() as conn:
+        for statement, parameters in captured:
+            plan, found = explain(conn, statement, parameters)
+            if violations := [violation for violation in found if violation in case.forbid]:
+                failures.append("\n".join([f"{', '.join(violations)}: {' '.join(statement.split())[:300]}",
+                                           *(f"  - {line}" for line in plan)]))
+    assert not failures, "\n".join(failures)
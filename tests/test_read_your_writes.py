@@ -0,0 +1,55 @@
+"""쓰기 후 READ_PRIMARY_SECONDS 동안의 읽기는 primary 로 간다. replica 는 아직 아무것도 복제하지 않은 빈 DB 로 둔다."""
+import time
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from crawling_news_server import database
+from crawling_news_server.logics import read_your_writes
+
+
+@pytest.fixture
+def lagging_replica(client, monkeypatch, tmp_path):
+    url = f"sqlite:///{tmp_path}/replica.db"
+    sync_engine = database.create_db_engine(url, 5)
+    database.Base.metadata.create_all(sync_engine)
+    sync_engine.dispose()
+
+    async_engine = create_async_engine(database.to_async_url(url))
+    monkeypatch.setattr(database, "AsyncReadSessionLocal", async_sessionmaker(
+        async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False))
+    client.cookies.clear()
+    yield
+    client.cookies.clear()
+
+
+def saved_search_ids(client) -> list[int]:
+    response = client.get("/api/v2/searches/")
+    assert response.status_code == 200
+    return [saved_search["id"] for saved_search in response.json()]
+
+
+def test_read_after_write_goes_to_primary(client, lagging_replica):
+    assert saved_search_ids(client) == []
+
+    response = client.post("/api/v2/searches/", json={"name": "ryw", "q": "+read"})
+    assert response.status_code == 200
+    assert read_your_writes.READ_PRIMARY_COOKIE in response.cookies
+    saved_search_id = response.json()["id"]
+
+    assert saved_search_id in saved_search_ids(client)
+
+    # 쿠키가 없는 다른 클라이언트는 replica 에서 읽는다.
+    client.cookies.clear()
+    assert saved_search_ids(client) == []
+
+
+def test_expired_cookie_reads_replica(client, lagging_replica):
+    client.post("/api/v2/searches/", json={"name": "ryw expired", "q": "+expired"})
+    client.cookies.set(read_your_writes.READ_PRIMARY_COOKIE, f"{time.time() - 1:.0f}")
+    assert saved_search_ids(client) == []
+
+
+def test_read_does_not_set_cookie(client, lagging_replica):
+    response = client.get("/api/v2/searches/")
+    assert read_your_writes.READ_PRIMARY_COOKIE not in response.cookies
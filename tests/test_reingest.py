@@ -0,0 +1,82 @@
+"""reingest 는 실제로 넣은 item 만 rollup 에 세고, 수집 때와 같이 id 범위와 저장 검색 결과를 남긴다."""
+import datetime
+import itertools
+
+import pytest
+
+from crawling_news_server import crud, models, schemas
+from crawling_news_server.commands import reingest
+
+_counter = itertools.count()
+PUB_DATE = "Mon, 05 Jan 2015 10:00:00 GMT"
+BUCKET = datetime.datetime(2015, 1, 5, 10)
+
+
+@pytest.fixture
+def rss_id(db):
+    n = f"reingest-{next(_counter)}"
+    return crud.create_rss(db, schemas.RssCreateDto(
+        name=n, url=f"https://example.com/{n}.xml", title=n, description="", link="https://example.com/",
+        delay=60, category="")).id
+
+
+def values(rss_id: int, title: str, link: str) -> dict:
+    return crud.rss_item_values(rss_id, schemas.RssItemCreateDto(
+        title=title, description="", link=link, pub_date=PUB_DATE))
+
+
+def rollup_count(db, rss_id: int) -> int:
+    db.expire_all()
+    return db.query(models.RSSItemRollup.count).filter(
+        models.RSSItemRollup.rss_id == rss_id, models.RSSItemRollup.bucket == BUCKET).scalar() or 0
+
+
+def test_only_inserted_items_are_applied(db, rss_id):
+    token = f"reingest{next(_counter)}"
+    saved_search_id = crud.create_saved_search(db, schemas.SavedSearchCreateDto(name=token, q=f"+{token}")).id
+    # diff 뒤에 다른 process 가 먼저 넣은 item
+    raced = crud.create_rss_item(db, rss_id, schemas.RssItemCreateDto(
+        title="raced", description="", link=f"https://example.com/reingest/{token}/1", pub_date=PUB_DATE))
+    assert rollup_count(db, rss_id) == 1
+
+    inserted = reingest.apply_changes(db, [
+        values(rss_id, "raced", raced.link),
+        values(rss_id, f"{token} missing", f"https://example.com/reingest/{token}/2"),
+    ], [])
+    db.commit()
+    assert inserted == 1
+    assert rollup_count(db, rss_id) == 2
+
+    db_rss_item = db.query(models.RSSItem).filter(models.RSSItem.title == f"{token} missing").one()
+    # 2015 년에 발행된 item 은 늦게 발행된 item 으로 남는다.
+    assert db.query(models.LateRSSItem).filter(models.LateRSSItem.rss_item_id == db_rss_item.id).count() == 1
+    assert [match.rss_item_id for match in db.query(models.SavedSearchMatch).filter(
+        models.SavedSearchMatch.saved_search_id == saved_search_id)] == [db_rss_item.id]
+
+
+def test_moved_publish_datetime_is_searchable_by_date(db, rss_id):
+    # 날짜 parse 를 고쳐 늦게 발행된 item 이 수집 시각 근처로 옮겨진 경우
+    db_rss_item = crud.create_rss_item(db, rss_id, schemas.RssItemCreateDto(
+        title="moved", description="", link=f"https://example.com/reingest/moved/{next(_counter)}",
+        pub_date=PUB_DATE))
+    publish_datetime = db_rss_item.created_at.replace(minute=0, second=0, microsecond=0)
+    row = db.query(models.RSSItem).filter(models.RSSItem.id == db_rss_item.id).with_entities(
+        models.RSSItem.id, models.RSSItem.rss_id, models.RSSItem.publish_datetime, models.RSSItem.created_at).one()
+    reingest.apply_changes(db, [], [(row, {"publish_datetime": publish_datetime})])
+    db.commit()
+
+    assert db.query(models.LateRSSItem).filter(models.LateRSSItem.rss_item_id == db_rss_item.id).count() == 0
+    found = crud.find_rss_item_by_title(db, "", 1, 50, False, publish_datetime,
+                                        publish_datetime + datetime.timedelta(hours=1), white_rss_id=[rss_id])
+    assert [item.id for item in found["data"]] == [db_rss_item.id]
+
+
+def test_item_without_link_hash_is_not_inserted_again(db, rss_id):
+    link = f"https://example.com/reingest/old/{next(_counter)}"
+    # backfill_link_hash 전에 저장된 item
+    db.add(models.RSSItem(rss_id=rss_id, title="old title", description="", link=link))
+    db.commit()
+
+    inserts, updates = reingest.diff_items(db, {(rss_id, item["link_hash"]): item for item in [values(rss_id, "new title", link)]}, set())
+    assert inserts == []
+    assert [changes["title"] for _, changes in updates] == ["new title"]
@@ -0,0 +1,107 @@
+"""검색. distinct 는 link 가 같은 item 중 조건에 맞는 가장 최신 것만 남기고, 날짜 조건은 id 범위로 좁힌다."""
+import datetime
+import itertools
+
+import pytest
+
+from crawling_news_server import crud, models, schemas
+from crawling_news_server.crawl.canonical_link import link_hash
+
+_counter = itertools.count()
+
+
+@pytest.fixture
+def feeds(db):
+    rss_ids = []
+    for _ in range(2):
+        n = f"search-{next(_counter)}"
+        rss_ids.append(crud.create_rss(db, schemas.RssCreateDto(
+            name=n, url=f"https://example.com/{n}.xml", title=n, description="", link="https://example.com/",
+            delay=60, category="")).id)
+    return rss_ids
+
+
+def add_item(db, rss_id: int, link: str) -> int:
+    db_rss_item = models.RSSItem(rss_id=rss_id, title="item", description="", link=link, link_hash=link_hash(link))
+    db.add(db_rss_item)
+    db.commit()
+    return db_rss_item.id
+
+
+def found_ids(db, distinct: bool, rss_ids: list[int]) -> list[int]:
+    found = crud.find_rss_item_by_title(db, "", 1, 50, distinct, white_rss_id=rss_ids)
+    return [db_rss_item.id for db_rss_item in found["data"]]
+
+
+def test_distinct_keeps_newest(db, feeds):
+    first, second = feeds
+    link = f"https://example.com/article/{next(_counter)}"
+    older = add_item(db, first, link)
+    newer = add_item(db, second, link + "?utm_source=rss")
+    other = add_item(db, first, f"https://example.com/article/{next(_counter)}")
+
+    assert found_ids(db, False, feeds) == [other, newer, older]
+    assert found_ids(db, True, feeds) == [other, newer]
+    assert crud.find_rss_item_by_title(db, "", 1, 50, True, white_rss_id=feeds)["total_count"] == 2
+
+
+def test_distinct_compares_only_matching_items(db, feeds):
+    first, second = feeds
+    link = f"https://example.com/article/{next(_counter)}"
+    older = add_item(db, first, link)
+    add_item(db, second, link)
+
+    # 더 새 item 이 조건 밖이면 조건에 맞는 item 을 보여준다.
+    assert found_ids(db, True, [first]) == [older]
+
+
+def test_distinct_facets_count_cross_feed_duplicate_once(client, db, feeds):
+    first, second = feeds
+    link = f"https://example.com/article/{next(_counter)}"
+    add_item(db, first, link)
+    add_item(db, second, link)
+    add_item(db, first, f"https://example.com/article/{next(_counter)}")
+
+    response = client.get("/api/v2/items/", params={
+        "white_rss_id": ",".join(map(str, feeds)), "facets": "rss_id,publish_date", "distinct": True})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["facets"]["rss_id"] == {str(first): 1, str(second): 1}
+    assert sum(body["facets"]["rss_id"].values()) == body["total_count"] == 2
+    assert sum(body["facets"]["publish_date"].values()) == 2
+
+
+def test_date_search_without_recorded_range(db, feeds):
+    # id 범위를 기록하기 전(rebuild_id_ranges 전)의 item 도 날짜로 찾는다.
+    publish_datetime = datetime.datetime(2001, 2, 3, 4, 5)
+    db_rss_item = models.RSSItem(rss_id=feeds[0], title="old", description="", link="https://example.com/old",
+                                 publish_datetime=publish_datetime)
+    db.add(db_rss_item)
+    db.commit()
+
+    found = crud.find_rss_item_by_title(db, "", 1, 50, False, datetime.datetime(2001, 2, 3),
+                                        datetime.datetime(2001, 2, 4))
+    assert [item.id for item in found["data"]] == [db_rss_item.id]
+
+
+def test_late_item_is_judged_by_created_at(db, feeds):
+    db_rss_item = crud.create_rss_item(db, feeds[0], schemas.RssItemCreateDto(
+        title="late", description="", link=f"https://example.com/late/{next(_counter)}",
+        pub_date="Mon, 05 Jan 2015 10:00:00 GMT"))
+    late = db.query(models.LateRSSItem).filter(models.LateRSSItem.rss_item_id == db_rss_item.id).one()
+    assert late.publish_datetime == datetime.datetime(2015, 1, 5, 10)
+
+
+def test_late_item_does_not_hide_unrecorded_items(db, feeds):
+    # bucket 이 없는 날짜에 늦게 발행된 item 만 있으면 id 를 좁히지 않는다.
+    pub_date = "Tue, 06 Jan 2015 10:00:00 GMT"
+    late = crud.create_rss_item(db, feeds[0], schemas.RssItemCreateDto(
+        title="late", description="", link=f"https://example.com/late/{next(_counter)}", pub_date=pub_date))
+    unrecorded = models.RSSItem(rss_id=feeds[0], title="old", description="", link="https://example.com/unrecorded",
+                                publish_datetime=datetime.datetime(2015, 1, 6, 11))
+    db.add(unrecorded)
+    db.commit()
+
+    found = crud.find_rss_item_by_title(db, "", 1, 50, False, datetime.datetime(2015, 1, 6),
+                                        datetime.datetime(2015, 1, 7), white_rss_id=[feeds[0]])
+    assert [item.id for item in found["data"]] == [unrecorded.id, late.id]
@@ -0,0 +1,31 @@
+"""요청별 SQL 추적. 실패한 statement 가 다음 statement 의 시간이나 connection 에 남지 않아야 한다."""
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+
+from crawling_news_server.logics import sql_trace
+
+
+@pytest.fixture
+def trace():
+    sql_trace.install()
+    trace = sql_trace.RequestTrace("/test")
+    token = sql_trace._current.set(trace)
+    yield trace
+    sql_trace._current.reset(token)
+    event.remove(Engine, "before_cursor_execute", sql_trace._before_cursor_execute)
+    event.remove(Engine, "after_cursor_execute", sql_trace._after_cursor_execute)
+
+
+def test_failed_statement_is_not_kept(trace):
+    engine = create_engine("sqlite://")
+    with engine.connect() as conn:
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                conn.exec_driver_sql("SELECT * FROM missing")
+        conn.exec_driver_sql("SELECT 1")
+
+        assert not conn.info.get("sql_trace_started")
+    assert trace.statement_count == 1
+    assert trace.slowest[0][1] == "SELECT 1"
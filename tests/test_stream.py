@@ -0,0 +1,34 @@
+"""item SSE 구독은 응답을 보내는 동안만 유지한다."""
+import asyncio
+
+from crawling_news_server.logics.broadcast import broadcaster
+from crawling_news_server.routers import rss_items
+
+
+def subscribers() -> int:
+    return broadcaster.status()["subscribers"]
+
+
+def open_stream():
+    return rss_items.stream_rss_items(request=None, white_rss_id=None, black_rss_id=None, last_event_id=None,
+                                      after_id=None)
+
+
+def test_unsent_stream_does_not_subscribe():
+    before = subscribers()
+    # client 가 응답 전에 끊으면 body 는 시작되지 않는다.
+    asyncio.run(open_stream())
+    assert subscribers() == before
+
+
+def test_closed_stream_unsubscribes():
+    before = subscribers()
+
+    async def run():
+        body = (await open_stream()).body_iterator
+        assert await anext(body) == "retry: 3000\n\n"
+        assert subscribers() == before + 1
+        await body.aclose()
+
+    asyncio.run(run())
+    assert subscribers() == before
@@ -0,0 +1,148 @@
+"""WebSub 구독 확인과 push. 로컬 stand-in hub 가 구독 요청을 받고, 테스트가 hub 대신 확인 요청을 보낸다."""
+import hmac
+import hashlib
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from crawling_news_server import crud, models, schemas
+from crawling_news_server.logics import websub
+
+FEED = """<?xml version="1.0" encoding="utf-8"?>
+<rss version="2.0"><channel><title>hub test</title><link>https://example.com/</link><description>d</description>
+<item><title>pushed</title><link>https://example.com/pushed/{n}</link><description>body</description></item>
+</channel></rss>"""
+
+
+class StandInHub(ThreadingHTTPServer):
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), HubHandler)
+        self.requests: list[dict[str, str]] = []
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/hub"
+
+
+class HubHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode()
+        self.server.requests.append(dict(urllib.parse.parse_qsl(body)))
+        self.send_response(202)
+        self.end_headers()
+
+
+@pytest.fixture
+def hub(monkeypatch):
+    monkeypatch.setattr(websub, "WEBSUB_CALLBACK_URL", "http://testserver")
+    server = StandInHub()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def rss_id(db):
+    n = len(crud.get_rss_all(db)) + 1
+    db_rss = crud.create_rss(db, schemas.RssCreateDto(
+        name=f"hub {n}", url=f"https://example.com/feed/{n}.xml", title="hub", description="",
+        link="https://example.com/", delay=60, category=""))
+    return db_rss.id
+
+
+def verify(client, request: dict, mode: str, challenge: str = "challenge-1", topic: str = None):
+    path = urllib.parse.urlsplit(request["hub.callback"]).path
+    return client.get(path, params={
+        "hub.mode": mode, "hub.topic": topic or request["hub.topic"],
+        "hub.challenge": challenge, "hub.lease_seconds": 3600,
+    })
+
+
+def subscription(db, rss_id: int) -> models.WebSubSubscription:
+    db.expire_all()
+    return crud.get_websub_subscription(db, rss_id)
+
+
+def test_subscribe_is_confirmed_only_once(client, db, hub, rss_id):
+    websub.request_subscription(db, rss_id, hub.url, f"https://example.com/topic/{rss_id}")
+    request = hub.requests[-1]
+    assert request["hub.mode"] == "subscribe"
+    assert request["hub.secret"]
+
+    response = verify(client, request, "subscribe")
+    assert response.status_code == 200
+    assert response.text == "challenge-1"
+    db_subscription = subscription(db, rss_id)
+    assert db_subscription.state == "active"
+    assert db_subscription.pending_mode is None
+    assert websub.is_push_active(db_subscription)
+
+    # 확인이 끝난 뒤 같은 요청을 다시 보내도 받지 않는다.
+    assert verify(client, request, "subscribe", "challenge-2").status_code == 404
+
+
+def test_unsolicited_intents_are_rejected(client, db, hub, rss_id):
+    websub.request_subscription(db, rss_id, hub.url, f"https://example.com/topic/{rss_id}")
+    request = hub.requests[-1]
+    assert verify(client, request, "subscribe").status_code == 200
+
+    # feed url 을 아는 누구나 보낼 수 있는 요청
+    assert verify(client, request, "unsubscribe").status_code == 404
+    assert verify(client, request, "denied").status_code == 404
+    assert verify(client, request, "subscribe", topic="https://evil.example.com/").status_code == 404
+    assert subscription(db, rss_id).state == "active"
+
+
+def test_unverified_subscription_stays_pending(client, db, hub, rss_id):
+    # hub 에 요청하지 않은 rss 는 확인 요청을 받을 구독이 없다.
+    path = f"/api/v2/websub/{rss_id}"
+    response = client.get(path, params={"hub.mode": "subscribe", "hub.topic": "https://example.com/",
+                                        "hub.challenge": "x"})
+    assert response.status_code == 404
+    assert subscription(db, rss_id) is None
+
+
+def test_unsubscribe_after_request(client, db, hub, rss_id):
+    topic = f"https://example.com/topic/{rss_id}"
+    websub.request_subscription(db, rss_id, hub.url, topic)
+    assert verify(client, hub.requests[-1], "subscribe").status_code == 200
+
+    websub.request_subscription(db, rss_id, hub.url, topic, mode="unsubscribe")
+    request = hub.requests[-1]
+    assert request["hub.mode"] == "unsubscribe"
+    response = verify(client, request, "unsubscribe", "bye")
+    assert response.status_code == 200
+    assert response.text == "bye"
+    assert subscription(db, rss_id).state == "unsubscribed"
+
+
+def test_denied_does_not_echo_challenge(client, db, hub, rss_id):
+    websub.request_subscription(db, rss_id, hub.url, f"https://example.com/topic/{rss_id}")
+    response = verify(client, hub.requests[-1], "denied", "should-not-echo")
+    assert response.status_code == 200
+    assert response.text == ""
+    assert subscription(db, rss_id).state == "denied"
+
+
+def test_push_requires_signature(client, db, hub, rss_id):
+    websub.request_subscription(db, rss_id, hub.url, f"https://example.com/topic/{rss_id}")
+    request = hub.requests[-1]
+    assert verify(client, request, "subscribe").status_code == 200
+    path = urllib.parse.urlsplit(request["hub.callback"]).path
+
+    body = FEED.format(n=rss_id).encode()
+    response = client.post(path, content=body, headers={"X-Hub-Signature": "sha256=0000"})
+    assert response.status_code == 202
+
+    signature = hmac.new(request["hub.secret"].encode(), body, hashlib.sha256).hexdigest()
+    response = client.post(path, content=body, headers={
+        "X-Hub-Signature": f"sha256={signature}", "Content-Type": "application/rss+xml"})
+    assert response.status_code == 200
+    assert response.json()["total_count"] == 1
+    assert subscription(db, rss_id).last_push_at is not None